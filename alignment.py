@@ -0,0 +1,234 @@
+import numpy as np
+import pandas as pd
+
+# Time alignment of time-stamped tables (weather, intervals, race control,
+# positions) onto other tables, session by session.
+#
+# A TimeSeries sorts its table once by (group keys, time) and encodes every
+# row as group * stride + rank of its time among all rows, which is then a
+# single sorted int64 array. Any batch of query times, in any order and from
+# any number of sessions, is matched with two np.searchsorted calls on that
+# array: there is no per-session loop and the queries are never sorted, and a
+# match can never come from another session.
+
+WEATHER_CHANNELS = ['air_temperature', 'track_temperature', 'humidity', 'pressure', 'wind_speed']
+WEATHER_TOLERANCE = '5min'  # weather is sampled every minute; older samples mean the feed dropped out
+
+
+def _as_ns(values):
+    """Return datetimes as int64 nanoseconds and a mask of the missing ones."""
+    index = pd.DatetimeIndex(values)
+    if index.tz is not None:
+        index = index.tz_convert("UTC")
+    missing = index.isna()
+    return index.as_unit("ns").asi8, missing
+
+
+def _as_timedelta_ns(value):
+    return None if value is None else pd.Timedelta(value).value
+
+
+class TimeSeries:
+    """A time-stamped table, sorted and indexed once per group (by default per session)."""
+
+    def __init__(self, df, on='date', by=('session_key',)):
+        self.on = on
+        self.by = list(by)
+        df = df.dropna(subset=[on] + self.by)
+        times, _ = _as_ns(df[on])
+        keys = [df[col].astype('int64').to_numpy() for col in self.by]
+        order = np.lexsort([times] + keys[::-1])
+
+        self.df = df.iloc[order].reset_index(drop=True)
+        self.times = times[order]
+        keys = [key[order] for key in keys]
+
+        n = len(self.df)
+        if n:
+            changed = np.zeros(n, dtype=bool)
+            changed[0] = True
+            for key in keys:
+                changed[1:] |= key[1:] != key[:-1]
+            starts = np.flatnonzero(changed)
+        else:
+            starts = np.array([], dtype=np.int64)
+        group_keys = pd.DataFrame({col: key[starts] for col, key in zip(self.by, keys)})
+        self.groups = (pd.Index(group_keys[self.by[0]]) if len(self.by) == 1
+                       else pd.MultiIndex.from_frame(group_keys))
+        self.offsets = np.append(starts, n)
+        group_ids = np.repeat(np.arange(len(starts)), np.diff(self.offsets))
+
+        # Sorted codes: group first, then time rank among all rows
+        self._stride = n + 1
+        self._sorted_times = np.sort(self.times)
+        self._codes = group_ids * self._stride + np.searchsorted(self._sorted_times, self.times, 'left')
+
+    def __len__(self):
+        return len(self.df)
+
+    def session(self, key):
+        """Return the rows of one group, e.g. ts.session(9531)."""
+        g = self.groups.get_loc(key)
+        return self.df.iloc[self.offsets[g]:self.offsets[g + 1]]
+
+    def _group_ids(self, left):
+        keys = left[self.by]
+        known = keys.notna().all(axis=1).to_numpy()
+        keys = keys.astype('float64').fillna(-1).astype('int64')
+        if len(self.by) == 1:
+            ids = self.groups.get_indexer(keys[self.by[0]])
+        else:
+            ids = self.groups.get_indexer(pd.MultiIndex.from_frame(keys))
+        return np.where(known, ids, -1)
+
+    def indexer(self, left, left_on, direction='backward', tolerance=None):
+        """Return, for every row of left, the position in self.df of its match or -1.
+
+        direction is 'backward' (last row at or before the time), 'forward'
+        (first row at or after) or 'nearest'. Matches further away than
+        tolerance (a Timedelta or string like '2min') are dropped.
+        """
+        if not len(self.df):
+            return np.full(len(left), -1)
+        groups = self._group_ids(left)
+        times, missing = _as_ns(left[left_on])
+        valid = (groups >= 0) & ~missing
+        g = np.where(valid, groups, 0)
+        lo, hi = self.offsets[g], self.offsets[g + 1]
+        base = g * self._stride
+
+        backward = forward = None
+        if direction in ('backward', 'nearest'):
+            query = base + np.searchsorted(self._sorted_times, times, 'right')
+            backward = np.searchsorted(self._codes, query, 'left') - 1
+            backward = np.where(backward >= lo, backward, -1)
+        if direction in ('forward', 'nearest'):
+            query = base + np.searchsorted(self._sorted_times, times, 'left')
+            forward = np.searchsorted(self._codes, query, 'left')
+            forward = np.where(forward < hi, forward, -1)
+
+        if direction == 'backward':
+            idx = backward
+        elif direction == 'forward':
+            idx = forward
+        elif direction == 'nearest':
+            back_dist = np.where(backward >= 0, times - self.times[backward], np.iinfo(np.int64).max)
+            fwd_dist = np.where(forward >= 0, self.times[forward] - times, np.iinfo(np.int64).max)
+            idx = np.where(fwd_dist < back_dist, forward, backward)
+        else:
+            raise ValueError(f"Unknown direction {direction!r}")
+
+        idx = np.where(valid, idx, -1)
+        tolerance = _as_timedelta_ns(tolerance)
+        if tolerance is not None:
+            idx = np.where((idx >= 0) & (np.abs(times - self.times[idx]) > tolerance), -1, idx)
+        return idx
+
+    def take(self, idx, columns, index=None):
+        """Return the given columns at row positions idx, missing where idx is -1."""
+        matched = pd.Series(idx >= 0)
+        rows = self.df[columns].iloc[np.where(idx >= 0, idx, 0)].reset_index(drop=True)
+        rows = rows.where(matched, axis=0) if len(rows) else rows
+        if index is not None:
+            rows.index = index
+        return rows
+
+    def asof(self, left, left_on, columns=None, direction='backward', tolerance=None, suffix='_right'):
+        """Return left with the matching row's columns attached, in left's row order.
+
+        columns defaults to every column except the group keys; names that
+        already exist in left get suffix appended.
+        """
+        if columns is None:
+            columns = [col for col in self.df.columns if col not in self.by]
+        idx = self.indexer(left, left_on, direction, tolerance)
+        matched = self.take(idx, columns, left.index)
+        matched.columns = [f"{col}{suffix}" if col in left.columns else col for col in columns]
+        return pd.concat([left, matched], axis=1)
+
+    def interpolate(self, left, left_on, columns, max_gap=None):
+        """Linearly interpolate numeric columns at the times of left, within each group.
+
+        Times outside a group's first and last sample, or between two samples
+        more than max_gap apart, get missing values.
+        """
+        if not len(self.df):
+            return pd.DataFrame({col: np.nan for col in columns}, index=left.index)
+        times, _ = _as_ns(left[left_on])
+        backward = self.indexer(left, left_on, 'backward')
+        forward = self.indexer(left, left_on, 'forward')
+        valid = (backward >= 0) & (forward >= 0)
+        back, fwd = np.where(valid, backward, 0), np.where(valid, forward, 0)
+
+        t0, t1 = self.times[back], self.times[fwd]
+        span = t1 - t0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.where(span > 0, (times - t0) / span, 0.0)
+        max_gap = _as_timedelta_ns(max_gap)
+        if max_gap is not None:
+            valid &= span <= max_gap
+
+        result = {}
+        for col in columns:
+            values = self.df[col].to_numpy(dtype='float64', na_value=np.nan)
+            v0, v1 = values[back], values[fwd]
+            result[col] = np.where(valid, v0 + weight * (v1 - v0), np.nan)
+        return pd.DataFrame(result, index=left.index)
+
+    def resample(self, freq, columns, how='interpolate'):
+        """Put numeric columns of every group on a common time grid in one pass.
+
+        Grid points are multiples of freq since the epoch, so groups line up.
+        how is 'interpolate' (linear, at the grid points), 'last' (last sample
+        at or before each point) or 'mean' (mean of the samples in
+        [point, point + freq)).
+        """
+        step = pd.Timedelta(freq).value
+        first, last = self.times[self.offsets[:-1]], self.times[self.offsets[1:] - 1]
+        if how == 'mean':
+            start = first // step * step
+        else:
+            start = -(-first // step) * step
+        counts = np.maximum((last - start) // step + 1, 0)
+        group_ids = np.repeat(np.arange(len(counts)), counts)
+        grid_offsets = np.concatenate([[0], np.cumsum(counts)])
+        position = np.arange(grid_offsets[-1]) - grid_offsets[group_ids]
+        grid_times = start[group_ids] + position * step
+
+        grid = self.groups.take(group_ids).to_frame(index=False)
+        grid[self.on] = pd.to_datetime(grid_times, utc=True)
+
+        if how == 'interpolate':
+            values = self.interpolate(grid, self.on, columns)
+        elif how == 'last':
+            values = self.take(self.indexer(grid, self.on, 'backward'), columns)
+        elif how == 'mean':
+            row_groups = np.repeat(np.arange(len(counts)), np.diff(self.offsets))
+            slot = grid_offsets[row_groups] + (self.times - start[row_groups]) // step
+            values = {}
+            for col in columns:
+                data = self.df[col].to_numpy(dtype='float64', na_value=np.nan)
+                present = ~np.isnan(data)
+                sums = np.bincount(slot[present], weights=data[present], minlength=len(grid))
+                n = np.bincount(slot[present], minlength=len(grid))
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    values[col] = np.where(n > 0, sums / n, np.nan)
+            values = pd.DataFrame(values)
+        else:
+            raise ValueError(f"Unknown resampling method {how!r}")
+        return pd.concat([grid, values.reset_index(drop=True)], axis=1)
+
+
+def attach_weather(left, left_on, weather, tolerance=WEATHER_TOLERANCE):
+    """Return left with the weather of its session at left_on.
+
+    weather is a TimeSeries of the weather table. Every column comes from the
+    last sample within tolerance, then the continuous channels are replaced
+    by their linear interpolation between the surrounding samples.
+    """
+    joined = weather.asof(left, left_on, tolerance=tolerance)
+    channels = [col for col in WEATHER_CHANNELS if col in weather.df.columns]
+    interpolated = weather.interpolate(left, left_on, channels, max_gap=tolerance)
+    for col in channels:
+        joined[col] = interpolated[col].fillna(joined[col].astype('float64'))
+    return joined
@@ -0,0 +1,238 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from cli import ANALYSES, figures_for
+from data_loader import CACHE_DIR, TABLE_FILES, load_table
+from degradation import degradation_laps, fit_degradation
+from incident_windows import incident_laps, incident_windows
+from interval_stream import aggregate_intervals
+from lap_merge import iter_sessions, merge_laps, write_merged
+from minisectors import MiniSectors
+from pipeline import DRIVER_KEYS, TableStore
+from pit_strategy import undercuts
+from position_timeline import PositionTimeline
+from race_control_events import parse_race_control
+from race_time import race_starts, reconstruct_race_time, validate_gaps
+from stint_laps import assign_stints
+from synthetic import write_dataset
+
+# Scaling benchmark for every analysis stage.
+#
+# For each size, a synthetic dataset with that many races is generated and
+# every stage is run on it: it is timed on its own, then run once more under
+# tracemalloc for its peak allocation. Results are written as JSON so runs
+# can be compared with --compare. The analysis stages check that their
+# per-driver and per-lap tables have one row per session and driver (or per
+# lap), so a join across sessions fails the stage instead of being timed.
+# Rendering is timed on one session's tables, since a figure shows one race.
+
+SIZES = [1, 10, 100, 1000]
+# Derived tables with one row per session and driver, and with one row per lap
+PER_DRIVER = ["avg_lap_times", "driver_performance", "performance_comparison", "pit_stop_analysis"]
+PER_LAP = ["laps_with_names", "laps_with_pit_stops"]
+
+
+def _stage_parse(data_dir, tables):
+    for name in TABLE_FILES:
+        load_table(name, data_dir, use_cache=False)
+
+
+def _stage_build_cache(data_dir, tables):
+    shutil.rmtree(os.path.join(data_dir, CACHE_DIR), ignore_errors=True)
+    for name in TABLE_FILES:
+        load_table(name, data_dir)
+
+
+def _stage_load_cache(data_dir, tables):
+    for name in TABLE_FILES:
+        tables[name] = load_table(name, data_dir)
+
+
+def _check_rows(store):
+    # A join that pairs drivers across sessions shows up as extra rows; time nothing that did that
+    for name in PER_DRIVER + PER_LAP:
+        if name not in store.tables:
+            continue
+        table = store.tables[name]
+        if name in PER_DRIVER and table.duplicated(DRIVER_KEYS).any():
+            raise AssertionError(f"{name} has several rows per session and driver")
+        if name in PER_LAP and len(table) != len(store.tables["laps"]):
+            raise AssertionError(f"{name} has {len(table)} rows for {len(store.tables['laps'])} laps")
+
+
+def _analysis_stage(analysis):
+    def stage(data_dir, tables):
+        # Source tables are already loaded; derived ones are always built, never read back
+        store = TableStore(data_dir, tables, cache=False)
+        store.build(ANALYSES[analysis][1])
+        _check_rows(store)
+    return stage
+
+
+def _render_stage(analysis):
+    def stage(data_dir, tables):
+        from figures import render_figure
+        # A figure shows one race, so time the figures of the first session
+        _, session = next(iter_sessions(tables))
+        store = TableStore(data_dir, session, cache=False)
+        out_dir = os.path.join(data_dir, "figures")
+        os.makedirs(out_dir, exist_ok=True)
+        for figure, module, function in figures_for([analysis]):
+            render_figure(figure, module, function, data_dir, out_dir, tables=store)
+    return stage
+
+
+def _stage_merge_laps(data_dir, tables):
+    for _, session_tables in iter_sessions(tables):
+        merge_laps(session_tables)
+
+
+def _stage_write_merged(data_dir, tables):
+    write_merged([data_dir], os.path.join(data_dir, "merged.parquet"))
+
+
+def _stage_stream_intervals(data_dir, tables):
+    aggregate_intervals(data_dir, tables["laps"])
+
+
+STAGES = [
+    ("parse_csv", _stage_parse),
+    ("build_cache", _stage_build_cache),
+    ("load_cache", _stage_load_cache),
+    ("assign_stints", lambda data_dir, tables: assign_stints(tables["laps"], tables["stints"])),
+    ("position_timeline", lambda data_dir, tables: PositionTimeline(tables["ranking"])),
+    ("minisectors", lambda data_dir, tables: MiniSectors.from_laps(tables["laps"])),
+    ("degradation", lambda data_dir, tables: fit_degradation(
+        degradation_laps(tables["laps"], tables["stints"], tables["pit"]))),
+    ("race_control_events", lambda data_dir, tables: parse_race_control(tables["race_control"])),
+    ("incident_laps", lambda data_dir, tables: incident_laps(
+        tables["laps"], incident_windows(parse_race_control(tables["race_control"])), tables["pit"])),
+    ("race_time", lambda data_dir, tables: validate_gaps(reconstruct_race_time(
+        tables["laps"], race_starts(tables["laps"], tables["race_control"])), tables["intervals"])),
+    ("undercuts", lambda data_dir, tables: undercuts(tables["pit"], reconstruct_race_time(
+        tables["laps"], race_starts(tables["laps"], tables["race_control"])), tables["intervals"])),
+    *((f"analysis:{name}", _analysis_stage(name)) for name in ANALYSES),
+    ("merge_laps", _stage_merge_laps),
+    ("write_merged", _stage_write_merged),
+    ("stream_intervals", _stage_stream_intervals),
+]
+
+
+def run_stage(stage, data_dir, tables, memory=True):
+    """Run one stage and return its wall time and peak traced allocation."""
+    result = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            stage(data_dir, tables)
+            result["seconds"] = round(time.perf_counter() - start, 4)
+            if memory:
+                tracemalloc.start()
+                try:
+                    stage(data_dir, tables)
+                    result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 2)
+                finally:
+                    tracemalloc.stop()
+    except Exception as exc:
+        # Keep going: a stage failing (e.g. MemoryError) at a large size is itself a result
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    return result
+
+
+def benchmark_size(races, work_dir, seed=0, interval_step=4.0, memory=True, render=False):
+    data_dir = os.path.join(work_dir, f"races_{races}")
+    start = time.perf_counter()
+    rows = write_dataset(data_dir, races, seed=seed, interval_step=interval_step)
+    run = {"races": races, "rows": rows, "generate_seconds": round(time.perf_counter() - start, 2), "stages": {}}
+    print(f"{races} races: generated {sum(rows.values())} rows in {run['generate_seconds']}s", flush=True)
+
+    stages = STAGES + ([(f"render:{name}", _render_stage(name)) for name in ANALYSES] if render else [])
+    tables = {}
+    for name, stage in stages:
+        result = run_stage(stage, data_dir, tables, memory)
+        run["stages"][name] = result
+        if "error" in result:
+            print(f"  {name:<32} FAILED {result['error']}", flush=True)
+        else:
+            peak = f"{result['peak_mb']:>10.1f} MB" if "peak_mb" in result else ""
+            print(f"  {name:<32} {result['seconds']:>9.3f}s{peak}", flush=True)
+    shutil.rmtree(data_dir, ignore_errors=True)
+    return run
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def compare(results, baseline):
+    """Print the time ratio of every stage against a baseline results file."""
+    base_runs = {run["races"]: run for run in baseline["runs"]}
+    for run in results["runs"]:
+        base = base_runs.get(run["races"])
+        if base is None:
+            continue
+        print(f"{run['races']} races vs baseline:")
+        for name, result in run["stages"].items():
+            before = base["stages"].get(name, {})
+            if "seconds" in result and before.get("seconds"):
+                ratio = result["seconds"] / before["seconds"]
+                flag = "  <- slower" if ratio > 1.2 else ""
+                print(f"  {name:<32} {before['seconds']:>9.3f}s -> {result['seconds']:>9.3f}s ({ratio:.2f}x){flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and memory-profile every stage on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="numbers of races to benchmark")
+    parser.add_argument("--out", default="benchmark.json")
+    parser.add_argument("--work-dir", default=None, help="where to generate the datasets (default: a temp dir)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--interval-step", type=float, default=4.0, help="seconds between interval samples")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the tracemalloc pass")
+    parser.add_argument("--render", action="store_true", help="also time rendering each analysis' figures")
+    parser.add_argument("--compare", metavar="BASELINE", help="a previous results file to compare against")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="f1_benchmark_")
+    results = {
+        "created": pd.Timestamp.now(tz="UTC").isoformat(),
+        "environment": environment(),
+        "config": {"seed": args.seed, "interval_step": args.interval_step, "memory": args.memory},
+        "runs": [],
+    }
+    try:
+        for races in args.sizes:
+            results["runs"].append(benchmark_size(races, work_dir, args.seed, args.interval_step,
+                                                  args.memory, args.render))
+            # Write after every size so a run killed at a large size keeps the smaller ones
+            with open(args.out, "w") as f:
+                json.dump(results, f, indent=2)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"Results saved to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+
+from data_loader import DATA_DIR
+from instrument import add_arguments, configure_from_args, span
+from pipeline import NODES, TableStore, plan
+from race_time import gap_errors
+from table_cache import DERIVED_BUDGET, DerivedCache
+
+# One entry point for all analyses.
+#
+# The selected analyses are planned together: the tables they need are
+# resolved into one dependency order and built once in a shared TableStore.
+# Without --render only the numeric summaries are printed and the plotting
+# stack (matplotlib, seaborn) is never imported. Derived tables come from the
+# disk cache when nothing upstream of them changed; --param changes a
+# builder's arguments for a what-if run, and only the tables downstream of it
+# are rebuilt.
+
+
+def summarize_driver_performance(tables):
+    driver_performance = tables["driver_performance"]
+    print(driver_performance.sort_values('final_position').to_string(index=False))
+    correlation = driver_performance['avg_lap_duration'].corr(driver_performance['final_position'])
+    print(f"Correlation between average lap times and final race positions: {correlation}")
+
+
+def summarize_qualifying(tables):
+    performance_comparison = tables["performance_comparison"]
+    columns = ['full_name', 'starting_position', 'final_position', 'position_change']
+    print(performance_comparison[columns].sort_values('position_change', ascending=False).to_string(index=False))
+
+
+def summarize_pit_stops(tables):
+    pit_stop_analysis = tables["pit_stop_analysis"]
+    columns = ['full_name', 'team_name', 'num_pit_stops', 'avg_pit_duration', 'final_position']
+    print(pit_stop_analysis[columns].sort_values('final_position').to_string(index=False))
+    losses = tables["pit_losses"]
+    print("Time lost per stop against the surrounding stint pace, or under a neutralisation against the cars that "
+          "did not stop (seconds):")
+    columns = ['session_key', 'driver_number', 'lap_number', 'pit_duration', 'reference_pace', 'field_in_lap',
+               'field_out_lap', 'pit_loss', 'neutralised']
+    print(losses[columns].to_string(index=False))
+    print("Median time lost per stop, green flag and neutralised:")
+    print(losses.groupby(losses['neutralised'].notna())['pit_loss'].median()
+          .rename(index={False: 'green flag', True: 'neutralised'}).to_string())
+    attempts = tables["undercuts"]
+    print("Undercut and overcut attempts between adjacent cars (neutralised: a stop under SC, VSC or red flag):")
+    print(attempts.to_string(index=False))
+
+
+def summarize_tire_strategy(tables):
+    stints = tables["stints_with_names"]
+    print("Stints per compound:")
+    print(stints['compound'].value_counts().to_string())
+    detailed_laps = tables["detailed_laps"]
+    print("Average lap duration per compound:")
+    print(detailed_laps.groupby('compound', observed=True)['lap_duration'].mean().to_string())
+    fits = tables["degradation_fits"].dropna(subset=['slope'])
+    print("Tyre degradation per compound (seconds per lap of tyre age, fuel corrected):")
+    print(fits.groupby('compound', observed=True)['slope'].describe()[['count', 'mean', '50%', 'std']].to_string())
+
+
+def summarize_weather(tables):
+    laps_with_weather = tables["laps_with_weather"]
+    channels = ['track_temperature', 'air_temperature', 'humidity', 'wind_speed']
+    print(laps_with_weather[channels].describe().to_string())
+    print("Correlation of lap duration with weather:")
+    print(laps_with_weather[channels].corrwith(laps_with_weather['lap_duration']).to_string())
+
+
+def summarize_incidents(tables):
+    race_control = tables["race_control"]
+    print("Race control messages per category:")
+    print(race_control['category'].value_counts().to_string())
+    events = tables["race_control_events"]
+    print("Race control events per type:")
+    print(events['event_type'].value_counts().loc[lambda counts: counts > 0].to_string())
+    print("Deleted laps, investigations and penalties per driver:")
+    per_driver = events[events['event_type'].isin(['lap_deleted', 'stewards', 'penalty'])]
+    print(per_driver.pivot_table(index='acronym', columns='event_type', values='date', aggfunc='count',
+                                 observed=True, fill_value=0).to_string())
+    windows = tables["time_lost_by_window"]
+    columns = ['session_key', 'kind', 'sector', 'start', 'duration', 'drivers', 'time_lost_per_driver']
+    print("Safety car, VSC, red and yellow flag windows (time lost per driver against green-flag pace, seconds):")
+    print(windows[columns].to_string(index=False))
+    print("Time lost per driver (seconds; total is safety car, VSC and red flag, yellows are matched on time "
+          "alone and shown apart):")
+    print(tables["time_lost_by_driver"].sort_values(['session_key', 'total']).to_string(index=False))
+
+
+def summarize_race_gaps(tables):
+    race_times = tables["race_times"].dropna(subset=['race_time'])
+    last_line = race_times.groupby(['session_key', 'driver_number'], observed=True).tail(1)
+    last_line = last_line.sort_values(['session_key', 'lap_number', 'race_time'], ascending=[True, False, True])
+    columns = ['session_key', 'driver_number', 'lap_number', 'race_time', 'gap_to_leader']
+    print(last_line[columns].to_string(index=False))
+    print("Reconstructed gaps against interval_data at each lap line (seconds):")
+    print(gap_errors(tables["gap_check"]).to_string(index=False))
+
+
+# name -> (analysis module or None without figures, tables it reports on, summary function)
+ANALYSES = {
+    "driver_performance": ("driver_performance_analysis", ["driver_performance"], summarize_driver_performance),
+    "qualifying": ("qualifying_vs_race_performance", ["performance_comparison"], summarize_qualifying),
+    "pit_stops": ("pit_stop_strategy_analysis", ["pit_stop_analysis", "pit_losses", "undercuts"],
+                  summarize_pit_stops),
+    "tire_strategy": ("tire_strategy_analysis", ["stints_with_names", "detailed_laps", "degradation_fits"],
+                      summarize_tire_strategy),
+    "weather": ("weather_impact_analysis", ["laps_with_weather"], summarize_weather),
+    "incidents": ("incident_analysis", ["race_control", "race_control_events", "time_lost_by_window",
+                                         "time_lost_by_driver"], summarize_incidents),
+    "race_gaps": (None, ["race_times", "gap_check"], summarize_race_gaps),
+}
+
+
+def figures_for(analyses):
+    from figures import FIGURES
+    modules = {ANALYSES[name][0] for name in analyses}
+    return [figure for figure in FIGURES if figure[1] in modules]
+
+
+def parse_params(items):
+    """Turn ["degradation_laps.fuel_effect=0.05", ...] into {"degradation_laps": {"fuel_effect": 0.05}}."""
+    params = {}
+    for item in items:
+        target, _, value = item.partition("=")
+        table, _, argument = target.partition(".")
+        if not (table and argument and value):
+            raise ValueError(f"expected TABLE.ARGUMENT=VALUE, got {item!r}")
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass  # a plain string
+        params.setdefault(table, {})[argument] = value
+    return params
+
+
+def run(analyses, data_dir=DATA_DIR, render=False, out_dir="Results", formats=("png",), params=None, cache=True):
+    tables = TableStore(data_dir, params=params, cache=cache)
+    needed = [table for name in analyses for table in ANALYSES[name][1]]
+
+    with span("build:plan", tables=len(plan(needed))):
+        tables.build(needed)
+
+    for name in analyses:
+        print(f"\n== {name} ==")
+        with span(f"summary:{name}"):
+            ANALYSES[name][2](tables)
+
+    if render:
+        # Only now pull in matplotlib and the analysis modules
+        from figures import render_figure
+        os.makedirs(out_dir, exist_ok=True)
+        for figure, module, function in figures_for(analyses):
+            paths = render_figure(figure, module, function, data_dir, out_dir, formats, tables=tables)
+            print(f"Saved {figure}: {', '.join(paths)}")
+    return tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the F1 race analyses.")
+    parser.add_argument("analyses", nargs="*", help=f"analyses to run, any of {', '.join(ANALYSES)} (default: all)")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--render", action="store_true", help="also render the analyses' figures")
+    parser.add_argument("--out-dir", default="Results")
+    parser.add_argument("--format", dest="formats", nargs="+", default=["png"], choices=["png", "svg", "pdf"])
+    parser.add_argument("--plan", action="store_true", help="print the table build order and exit")
+    parser.add_argument("--timings", action="store_true", help="print every span as it finishes")
+    parser.add_argument("--param", dest="params", action="append", default=[], metavar="TABLE.ARGUMENT=VALUE",
+                        help="builder argument for a what-if run, e.g. degradation_laps.fuel_effect=0.05")
+    parser.add_argument("--no-cache", action="store_true", help="build every derived table, ignoring the disk cache")
+    parser.add_argument("--cache-budget", type=float, default=DERIVED_BUDGET / 1024 ** 2,
+                        help="disk space for cached derived tables, in MB")
+    parser.add_argument("--clear-cache", action="store_true", help="delete the cached derived tables first")
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args, echo=args.timings)
+
+    analyses = args.analyses or list(ANALYSES)
+    unknown = [name for name in analyses if name not in ANALYSES]
+    if unknown:
+        parser.error(f"unknown analyses: {', '.join(unknown)}")
+    try:
+        params = parse_params(args.params)
+    except ValueError as e:
+        parser.error(str(e))
+    unknown = [name for name in params if name not in NODES or NODES[name][1] is None]
+    if unknown:
+        parser.error(f"not derived tables: {', '.join(unknown)}")
+    if args.plan:
+        needed = [table for name in analyses for table in ANALYSES[name][1]]
+        print("\n".join(plan(needed)))
+        return
+
+    cache = DerivedCache.for_data_dir(args.data_dir, int(args.cache_budget * 1024 ** 2))
+    if args.clear_cache:
+        print(f"Removed {cache.clear()} cached tables.")
+    run(analyses, args.data_dir, args.render, args.out_dir, tuple(args.formats), params,
+        False if args.no_cache else cache)
+
+
+if __name__ == "__main__":
+    main()
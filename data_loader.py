@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from instrument import span
+from schemas import SCHEMAS, cast_column
+
+# Shared loader for the OpenF1 CSV exports in data/.
+#
+# The exports are space-padded, so every table needs its column names and
+# values stripped and its columns converted to the types declared in
+# schemas.py before use. This module does that once per file and keeps the
+# typed result in a columnar cache (one .npy file per column) next to the CSVs.
+# The cache is keyed on the source file's mtime and size, and later loads
+# read the arrays back instead of parsing the CSV again. Frames are writable
+# either way; mmap=True memory-maps the arrays instead, which gives read-only
+# frames and is for callers that only read them. The manifest also
+# records a hash of the file's contents, which the derived tables built from
+# it are cached under (see table_cache.py).
+
+DATA_DIR = "data"
+CACHE_DIR = ".cache"
+CACHE_VERSION = 3
+
+TABLE_FILES = {
+    "drivers": "driver_data.csv",
+    "intervals": "interval_data.csv",
+    "laps": "lap_data.csv",
+    "pit": "pit_stop_data.csv",
+    "race_control": "race_control_data.csv",
+    "ranking": "ranking_data.csv",
+    "stints": "stints_data.csv",
+    "weather": "weather_data.csv",
+}
+
+DATE_COLUMNS = {"date", "date_start"}
+
+
+def table_path(name, data_dir=DATA_DIR):
+    return os.path.join(data_dir, TABLE_FILES[name])
+
+
+def _convert_column(values, name, schema):
+    # values is a stripped string column where missing entries are NaN
+    if name in schema:
+        return cast_column(values, schema[name])
+    if name in DATE_COLUMNS:
+        return pd.to_datetime(values, errors='coerce', format='ISO8601')
+    present = values.notna()
+    if present.any() and values[present].isin(['True', 'False']).all():
+        return values.map({'True': True, 'False': False})
+    numeric = pd.to_numeric(values, errors='coerce')
+    if numeric.notna().sum() == present.sum():
+        return numeric
+    return values
+
+
+def clean_frame(df, schema=None):
+    """Strip the padding from a raw string frame and convert its columns."""
+    schema = schema or {}
+    df.columns = df.columns.str.strip()
+    cleaned = {}
+    for col in df.columns:
+        values = df[col].str.strip()
+        values = values.where(values != '')
+        cleaned[col] = _convert_column(values, col, schema)
+    return pd.DataFrame(cleaned, index=df.index)
+
+
+def parse_csv(path, schema=None):
+    """Parse one OpenF1 CSV export into a typed DataFrame."""
+    with span(f"parse:{os.path.basename(path)}") as s:
+        raw = pd.read_csv(path, dtype=str, keep_default_na=False)
+        return s.output(clean_frame(raw, schema))
+
+
+def _source_key(path):
+    stat = os.stat(path)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_dir(path):
+    data_dir, filename = os.path.split(path)
+    return os.path.join(data_dir, CACHE_DIR, os.path.splitext(filename)[0])
+
+
+def _write_cache(df, cache_dir, source, digest=None):
+    os.makedirs(cache_dir, exist_ok=True)
+    columns = []
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        entry = {"name": col, "file": f"{i}.npy"}
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            entry["kind"] = "datetime"
+            entry["tz"] = str(series.dtype.tz)
+            array = series.dt.tz_convert(None).to_numpy()
+        elif pd.api.types.is_datetime64_dtype(series.dtype):
+            entry["kind"] = "datetime"
+            entry["tz"] = None
+            array = series.to_numpy()
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            entry["kind"] = "category"
+            entry["categories"] = series.cat.categories.tolist()
+            array = series.cat.codes.to_numpy()
+        elif isinstance(series.dtype, pd.api.extensions.ExtensionDtype) and series.dtype.kind in "biuf":
+            # Nullable integers and booleans: values plus a separate missing mask
+            entry["kind"] = "masked"
+            entry["dtype"] = str(series.dtype)
+            entry["mask"] = f"{i}.mask.npy"
+            array = series.to_numpy(dtype=series.dtype.numpy_dtype, na_value=0)
+            np.save(os.path.join(cache_dir, entry["mask"]), series.isna().to_numpy())
+        elif pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_numeric_dtype(series.dtype):
+            entry["kind"] = "numeric"
+            array = series.to_numpy()
+        else:
+            # Strings are stored fixed-width so they can be memory-mapped too;
+            # an empty string marks a missing value.
+            entry["kind"] = "string"
+            array = series.fillna('').to_numpy(dtype=str)
+        np.save(os.path.join(cache_dir, entry["file"]), array)
+        columns.append(entry)
+
+    # The manifest is written last and atomically, so a half-written cache is
+    # never picked up by a later run.
+    manifest = {"version": CACHE_VERSION, "source": source, "digest": digest, "rows": len(df), "columns": columns}
+    tmp_path = os.path.join(cache_dir, "manifest.json.tmp")
+    with open(tmp_path, "w") as file:
+        json.dump(manifest, file)
+    os.replace(tmp_path, os.path.join(cache_dir, "manifest.json"))
+
+
+def _read_manifest(cache_dir, source):
+    try:
+        with open(os.path.join(cache_dir, "manifest.json")) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != CACHE_VERSION or manifest.get("source") != source:
+        return None
+    return manifest
+
+
+def _read_cache(cache_dir, manifest, mmap=False):
+    mmap_mode = 'r' if mmap else None
+    data = {}
+    for entry in manifest["columns"]:
+        array = np.load(os.path.join(cache_dir, entry["file"]), mmap_mode=mmap_mode)
+        if entry["kind"] == "datetime":
+            values = pd.DatetimeIndex(np.asarray(array))
+            if entry["tz"]:
+                values = values.tz_localize("UTC").tz_convert(entry["tz"])
+            data[entry["name"]] = values
+        elif entry["kind"] == "category":
+            data[entry["name"]] = pd.Categorical.from_codes(np.asarray(array), entry["categories"])
+        elif entry["kind"] == "masked":
+            mask = np.load(os.path.join(cache_dir, entry["mask"]), mmap_mode=mmap_mode)
+            if entry["dtype"] == "boolean":
+                data[entry["name"]] = pd.arrays.BooleanArray(np.asarray(array), np.asarray(mask))
+            else:
+                data[entry["name"]] = pd.arrays.IntegerArray(np.asarray(array), np.asarray(mask))
+        elif entry["kind"] == "string":
+            values = pd.Series(np.asarray(array))
+            data[entry["name"]] = values.where(values != '')
+        else:
+            data[entry["name"]] = np.asarray(array)
+    return pd.DataFrame(data, copy=False)
+
+
+def load_csv(path, schema=None, use_cache=True, mmap=False):
+    """Load a typed OpenF1 table, going through the columnar cache.
+
+    mmap=True memory-maps a cached table, and the frame is then read-only.
+    """
+    if not use_cache:
+        return parse_csv(path, schema)
+    source = _source_key(path)
+    cache_dir = _cache_dir(path)
+    manifest = _read_manifest(cache_dir, source)
+    if manifest is None:
+        df = parse_csv(path, schema)
+        try:
+            with span(f"cache:write:{os.path.basename(path)}", rows_in=df):
+                _write_cache(df, cache_dir, source, _file_digest(path))
+        except OSError as e:
+            print(f"Could not write cache for {path}: {e}")
+        return df
+    with span(f"cache:read:{os.path.basename(path)}") as s:
+        return s.output(_read_cache(cache_dir, manifest, mmap=mmap))
+
+
+def load_table(name, data_dir=DATA_DIR, use_cache=True, mmap=False):
+    """Load one of the tables in TABLE_FILES by name, e.g. load_table("laps")."""
+    with span(f"load:{name}", data_dir=data_dir) as s:
+        return s.output(load_csv(table_path(name, data_dir), SCHEMAS.get(name), use_cache=use_cache, mmap=mmap))
+
+
+def ensure_cache(name, data_dir=DATA_DIR):
+    """Build the columnar cache of a table if it is missing or stale, without reading a fresh one."""
+    path = table_path(name, data_dir)
+    if _read_manifest(_cache_dir(path), _source_key(path)) is None:
+        load_table(name, data_dir)
+
+
+def warm_cache(names, data_dirs):
+    """Build the caches of names in each of data_dirs up front, so pool workers only ever read them."""
+    with span("cache:warm"):
+        for data_dir in data_dirs:
+            for name in names:
+                if os.path.exists(table_path(name, data_dir)):
+                    ensure_cache(name, data_dir)
+
+
+def table_digest(name, data_dir=DATA_DIR):
+    """Return a hash of the contents of a table's CSV.
+
+    It is kept in the cache manifest, so the file is only read again when its
+    mtime or size changed.
+    """
+    path = table_path(name, data_dir)
+    manifest = _read_manifest(_cache_dir(path), _source_key(path))
+    if manifest is not None and manifest.get("digest"):
+        return manifest["digest"]
+    return _file_digest(path)
+
+
+def iter_table_chunks(name, data_dir=DATA_DIR, chunksize=100_000):
+    """Yield a table as typed chunks of at most chunksize rows, bypassing the cache."""
+    reader = pd.read_csv(table_path(name, data_dir), dtype=str, keep_default_na=False, chunksize=chunksize)
+    for raw in reader:
+        yield clean_frame(raw, SCHEMAS.get(name))
+
+
+def memory_report(tables):
+    """Return the row count and in-memory size of each table in a {name: DataFrame} dict."""
+    rows = [{"table": name, "rows": len(df), "columns": df.shape[1],
+             "memory_mb": df.memory_usage(deep=True).sum() / 1e6}
+            for name, df in tables.items()]
+    return pd.DataFrame(rows, columns=["table", "rows", "columns", "memory_mb"])
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+from instrument import span
+from stint_laps import assign_stints
+
+# Tyre degradation per stint.
+#
+# Lap time is modelled as intercept + slope * tyre_age for every (driver,
+# stint, compound) of every session. All stints are fitted at once: the laps
+# are numbered by stint with one groupby, and the per-stint sums of the
+# least-squares normal equations come from np.bincount over those numbers, so
+# the cost is a few passes over the laps whatever the number of stints. x is
+# centred on each stint's mean tyre age before the products are summed, which
+# keeps the solution accurate for long stints.
+#
+# Before fitting, pit in-laps (the laps listed in the pit table) and out-laps
+# (is_pit_out_lap) are dropped, as are laps much slower than the rest of
+# their stint (safety car, yellow flags, traffic). Lap times can be corrected
+# for the fuel still on board, so the slope is the tyre's share of the change.
+
+STINT_KEYS = ['session_key', 'driver_number', 'stint_number', 'compound']
+FUEL_EFFECT = 0.06  # seconds per lap of fuel still on board
+MAX_SLOWDOWN = 1.07  # laps slower than this times the stint's median lap are not green-flag laps
+MIN_LAPS = 3
+
+
+def drop_pit_laps(laps, pit=None):
+    """Return laps without out-laps (is_pit_out_lap) and in-laps (the laps listed in pit)."""
+    if 'is_pit_out_lap' in laps.columns:
+        laps = laps[~laps['is_pit_out_lap'].fillna(False).astype(bool)]
+    if pit is not None and len(pit):
+        keys = [col for col in ('session_key', 'driver_number', 'lap_number') if col in pit.columns]
+        in_laps = pd.MultiIndex.from_frame(pit[keys].dropna().astype('int64'))
+        laps = laps[~pd.MultiIndex.from_frame(laps[keys].astype('int64')).isin(in_laps)]
+    return laps
+
+
+def degradation_laps(laps, stints, pit=None, fuel_effect=FUEL_EFFECT, max_slowdown=MAX_SLOWDOWN):
+    """Return the timed green-flag laps with their stint, tyre_age and fuel-corrected lap time.
+
+    fuel_effect is the lap time cost of one lap of fuel in seconds; each lap
+    is corrected to an empty tank using the laps left to the session's last
+    lap. Pass 0 to fit raw lap times, and max_slowdown=None to keep slow laps.
+    """
+    laps = drop_pit_laps(laps.dropna(subset=['lap_duration']), pit)
+    laps = assign_stints(laps, stints).dropna(subset=['compound', 'stint_number', 'tyre_age'])
+    laps = laps.reset_index(drop=True)
+
+    last_lap = laps.groupby('session_key', observed=True)['lap_number'].transform('max')
+    laps_left = (last_lap - laps['lap_number']).astype('float64')
+    laps['fuel_corrected'] = laps['lap_duration'].astype('float64') - fuel_effect * laps_left
+
+    if max_slowdown is not None:
+        median = laps.groupby(STINT_KEYS, observed=True)['lap_duration'].transform('median')
+        laps = laps[laps['lap_duration'] <= max_slowdown * median].reset_index(drop=True)
+    return laps
+
+
+def fit_degradation(laps, x='tyre_age', y='fuel_corrected', by=STINT_KEYS, min_laps=MIN_LAPS):
+    """Fit y = intercept + slope * x for every group of by in one batched solve.
+
+    Returns one row per group with n_laps, slope (seconds per lap of tyre
+    age), intercept (the lap time on new tyres), its standard error, rmse
+    and r2. Groups with fewer than min_laps laps or a single distinct x get
+    missing fits.
+    """
+    with span("fit:degradation", rows_in=laps) as s:
+        grouped = laps.groupby(by, observed=True, sort=True)
+        ids = grouped.ngroup().to_numpy()
+        groups = grouped.size().index.to_frame(index=False)
+        n_groups = len(groups)
+        xs = laps[x].to_numpy(dtype='float64')
+        ys = laps[y].to_numpy(dtype='float64')
+
+        n = np.bincount(ids, minlength=n_groups).astype('float64')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            x_mean = np.bincount(ids, xs, n_groups) / n
+            y_mean = np.bincount(ids, ys, n_groups) / n
+            dx = xs - x_mean[ids]
+            dy = ys - y_mean[ids]
+            sxx = np.bincount(ids, dx * dx, n_groups)
+            sxy = np.bincount(ids, dx * dy, n_groups)
+            syy = np.bincount(ids, dy * dy, n_groups)
+
+            slope = sxy / sxx
+            intercept = y_mean - slope * x_mean
+            sse = np.maximum(syy - slope * sxy, 0.0)
+            dof = n - 2
+            rmse = np.sqrt(sse / dof)
+            slope_se = rmse / np.sqrt(sxx)
+            r2 = 1 - sse / syy
+
+        fitted = (n >= min_laps) & (sxx > 0)
+        fits = groups.assign(n_laps=n.astype('int64'))
+        for name, values in [('slope', slope), ('intercept', intercept), ('slope_se', slope_se),
+                             ('rmse', rmse), ('r2', r2)]:
+            fits[name] = np.where(fitted, values, np.nan)
+        return s.output(fits)
+
+
+def degradation_residuals(laps, fits, x='tyre_age', y='fuel_corrected', by=STINT_KEYS):
+    """Return every fitted lap with its predicted lap time and residual."""
+    columns = [col for col in by + ['lap_number', x, y] if col in laps.columns]
+    residuals = laps[columns].merge(fits[by + ['slope', 'intercept']], on=by, how='inner')
+    residuals = residuals.dropna(subset=['slope'])
+    residuals['predicted'] = residuals['intercept'] + residuals['slope'] * residuals[x]
+    residuals['residual'] = residuals[y] - residuals['predicted']
+    return residuals.drop(columns=['slope', 'intercept']).reset_index(drop=True)
@@ -0,0 +1,136 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from importlib import import_module
+
+from data_loader import DATA_DIR, TABLE_FILES, warm_cache
+from instrument import TRACER, add_arguments, configure_from_args, init_worker, span
+from pipeline import TableStore
+
+# Headless batch rendering of every figure in Results/.
+#
+# Each figure is an independent job: a worker process switches matplotlib to
+# the Agg backend, imports the analysis module, calls its plot function with a
+# TableStore for the data directory and saves the returned figure under a
+# deterministic name. No windows are opened, so this runs on a machine without
+# a display.
+
+RESULTS_DIR = "Results"
+
+# (figure name, analysis module, plot function), in the order of Results/
+FIGURES = [
+    ("Figure_1", "driver_performance_analysis", "plot_driver_nationalities"),
+    ("Figure_2", "driver_performance_analysis", "plot_lap_times"),
+    ("Figure_3", "driver_performance_analysis", "plot_lap_time_vs_final_position"),
+    ("Figure_4", "qualifying_vs_race_performance", "plot_starting_vs_final_positions"),
+    ("Figure_5", "qualifying_vs_race_performance", "plot_position_changes"),
+    ("Figure_6", "pit_stop_strategy_analysis", "plot_pit_stops_per_driver"),
+    ("Figure_7", "pit_stop_strategy_analysis", "plot_avg_pit_duration_per_driver"),
+    ("Figure_8", "pit_stop_strategy_analysis", "plot_lap_times_with_pit_stops"),
+    ("Figure_9", "pit_stop_strategy_analysis", "plot_pit_stops_vs_final_position"),
+    ("Figure_10", "pit_stop_strategy_analysis", "plot_avg_pit_duration_vs_final_position"),
+    ("Figure_11", "tire_strategy_analysis", "plot_tire_compounds"),
+    ("Figure_12", "tire_strategy_analysis", "plot_tire_degradation"),
+    ("Figure_13", "weather_impact_analysis", "plot_weather_conditions"),
+    ("Figure_14", "weather_impact_analysis", "plot_incidents_vs_track_temperature"),
+    ("Figure_15", "weather_impact_analysis", "plot_incidents_vs_air_temperature"),
+    ("Figure_16", "weather_impact_analysis", "plot_incidents_vs_humidity"),
+    ("Figure_17", "incident_analysis", "plot_incidents_by_lap"),
+    ("Figure_18", "incident_analysis", "plot_incident_timing"),
+]
+
+
+def _use_agg():
+    import matplotlib
+    matplotlib.use("Agg")
+    # SVG ids (e.g. of clip paths) are random unless salted, so fix the salt for identical files
+    matplotlib.rcParams['svg.hashsalt'] = "f1-report"
+
+
+def _init_worker(trace):
+    _use_agg()
+    init_worker(trace)
+
+
+def render_figure(name, module, function, data_dir=DATA_DIR, out_dir=RESULTS_DIR, formats=("png",), dpi=100,
+                  tables=None):
+    """Build one figure and save it as out_dir/<name>.<format> for each format.
+
+    Pass tables (a TableStore) to share already built tables between figures
+    rendered in the same process.
+    """
+    _use_agg()
+    import matplotlib.pyplot as plt
+
+    with span(f"render:{name}", module=module, function=function):
+        tables = tables or TableStore(data_dir)
+        with span(f"plot:{function}"):
+            fig = getattr(import_module(module), function)(tables)
+        paths = []
+        try:
+            with span(f"save:{name}", formats=list(formats)):
+                for fmt in formats:
+                    path = os.path.join(out_dir, f"{name}.{fmt}")
+                    # Leave out the creation date so unchanged figures produce identical files
+                    metadata = {"Date": None} if fmt in ("svg", "pdf") else None
+                    fig.savefig(path, format=fmt, dpi=dpi, bbox_inches="tight", metadata=metadata)
+                    paths.append(path)
+        finally:
+            plt.close(fig)
+    return paths
+
+
+def unknown_figures(names):
+    """Return the names that are not figures of FIGURES."""
+    known = {name for name, _, _ in FIGURES}
+    return [name for name in names if name not in known]
+
+
+def _render_job(*args):
+    paths = render_figure(*args)
+    return paths, TRACER.drain()
+
+
+def render_all(data_dir=DATA_DIR, out_dir=RESULTS_DIR, formats=("png",), jobs=None, names=None, dpi=100):
+    """Render the selected figures (all by default) across a process pool."""
+    unknown = unknown_figures(names or [])
+    if unknown:
+        raise ValueError(f"Unknown figures: {', '.join(unknown)}")
+    selected = [fig for fig in FIGURES if names is None or fig[0] in names]
+    os.makedirs(out_dir, exist_ok=True)
+
+    warm_cache(TABLE_FILES, [data_dir])
+
+    paths = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(TRACER.enabled,)) as pool:
+        futures = [pool.submit(_render_job, name, module, function, data_dir, out_dir, formats, dpi)
+                   for name, module, function in selected]
+        for (name, _, _), future in zip(selected, futures):
+            saved, records = future.result()
+            for record in records:
+                TRACER.emit(record)
+            print(f"Saved {name}: {', '.join(saved)}")
+            paths.extend(saved)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render all analysis figures without a display.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--out-dir", default=RESULTS_DIR)
+    parser.add_argument("--format", dest="formats", nargs="+", default=["png"], choices=["png", "svg", "pdf"])
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--dpi", type=int, default=100)
+    parser.add_argument("figures", nargs="*", help="figure names to render, e.g. Figure_3 (default: all)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args, echo=False)
+    unknown = unknown_figures(args.figures)
+    if unknown:
+        parser.error(f"unknown figures: {', '.join(unknown)}")
+
+    render_all(args.data_dir, args.out_dir, tuple(args.formats), args.jobs, args.figures or None, args.dpi)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import numpy as np
+import pandas as pd
+
+from alignment import TimeSeries, _as_ns
+from degradation import drop_pit_laps
+from instrument import span
+
+# Safety car, VSC, red flag and yellow flag periods, and what they cost.
+#
+# Windows are built from the parsed race control events: each opening message
+# is matched to the next closing message of its session (and sector, for
+# yellow flags) with a forward as-of join. Flags raised again before the
+# sector is cleared extend the open window instead of starting a new one.
+# Windows left open end with the session's last message.
+#
+# IncidentWindows keeps the windows sorted by session and start, with an
+# IntervalIndex of their times. Laps are matched against all of them in one
+# pass: times are encoded as session * stride + rank of the time (as in
+# alignment.TimeSeries), so a searchsorted on the window starts finds the
+# windows that began before each lap ended, and only windows of the same
+# session that started within the longest window's length of the lap are
+# candidates. No lap is compared with every window.
+#
+# A lap's time lost is its duration minus the driver's green-flag pace at that
+# point of the race (the rolling median of their laps that overlap no window,
+# averaged between the green laps before and after it), split between the
+# windows it overlaps by overlap time. Pit in- and out-laps are left out.
+#
+# A yellow flag covers one marshal sector, and the lap timing (three timing
+# sectors) cannot place a car in it, so a lap is matched against a yellow on
+# time alone. Yellows are therefore kept apart: the safety car, VSC and red
+# flag windows share a lap's loss between them, yellows only take the loss of
+# laps that overlap none of those, and a driver's total leaves yellows out.
+
+# kind -> (opening event type, opening decisions, closing event type, closing decisions, per sector)
+WINDOW_KINDS = {
+    "safety_car": ("safety_car", ["DEPLOYED"], "track_status", ["TRACK CLEAR"], False),
+    "virtual_safety_car": ("virtual_safety_car", ["DEPLOYED"], "virtual_safety_car", ["ENDING"], False),
+    "red_flag": ("red_flag", ["RED FLAG"], "track_status", ["GREEN LIGHT - PIT EXIT OPEN"], False),
+    "yellow": ("sector_flag", ["YELLOW", "DOUBLE YELLOW"], "sector_flag", ["CLEAR"], True),
+}
+GREEN_LAPS = 5  # green-flag laps in the rolling median of a driver's pace
+
+
+def _events(events, event_type, decisions):
+    return events[(events['event_type'] == event_type) & events['decision'].isin(decisions)]
+
+
+def incident_windows(events):
+    """Return one row per incident window: session_key, kind, sector, double_yellow, start, end."""
+    with span("build:incident_windows", rows_in=events) as s:
+        session_end = events.groupby('session_key', observed=True)['date'].max()
+        windows = []
+        for kind, (open_type, open_decisions, close_type, close_decisions, per_sector) in WINDOW_KINDS.items():
+            by = ['session_key', 'sector'] if per_sector else ['session_key']
+            opens = _events(events, open_type, open_decisions).dropna(subset=by).reset_index(drop=True)
+            if not len(opens):
+                continue
+            closes = TimeSeries(_events(events, close_type, close_decisions), 'date', by)
+            close = closes.indexer(opens, 'date', 'forward')
+            end = pd.Series(closes.df['date'].to_numpy()[np.maximum(close, 0)] if len(closes) else pd.NaT,
+                            index=opens.index)
+            end = end.where(close >= 0, opens['session_key'].map(session_end))
+
+            # Flags shown again before the clear belong to the window already open
+            opened = pd.DataFrame({'session_key': opens['session_key'],
+                                   'sector': opens['sector'] if per_sector else pd.NA,
+                                   'double_yellow': opens['decision'] == 'DOUBLE YELLOW',
+                                   'start': opens['date'], 'end': end})
+            opened = opened.groupby(['session_key', 'sector', 'end'], observed=True, dropna=False, sort=False).agg(
+                double_yellow=('double_yellow', 'any'), start=('start', 'min'))
+            windows.append(opened.reset_index().assign(kind=kind))
+
+        columns = ['session_key', 'kind', 'sector', 'double_yellow', 'start', 'end']
+        if not windows:
+            return s.output(pd.DataFrame(columns=columns))
+        windows = pd.concat(windows, ignore_index=True)[columns]
+        windows['kind'] = pd.Categorical(windows['kind'], categories=list(WINDOW_KINDS))
+        windows['sector'] = windows['sector'].astype('Int16')
+        windows['duration'] = (windows['end'] - windows['start']).dt.total_seconds()
+        windows = windows.sort_values(['session_key', 'start'], kind='stable', ignore_index=True)
+        return s.output(windows.rename_axis('window').reset_index())
+
+
+class IncidentWindows:
+    """Incident windows indexed for overlap queries against many time spans at once."""
+
+    def __init__(self, windows):
+        self.windows = windows.sort_values(['session_key', 'start'], kind='stable', ignore_index=True)
+        starts, _ = _as_ns(self.windows['start'])
+        ends, _ = _as_ns(self.windows['end'])
+        # For lookups of single times, e.g. ts.index.contains(pd.Timestamp(...))
+        self.index = pd.IntervalIndex.from_arrays(self.windows['start'], self.windows['end'], closed='left')
+        self._starts, self._ends = starts, ends
+        self._sessions = pd.Index(self.windows['session_key'].astype('int64').unique())
+        self._session_ids = self._sessions.get_indexer(self.windows['session_key'].astype('int64'))
+        self._max_length = int((ends - starts).max()) if len(starts) else 0
+
+        self._times = np.sort(np.concatenate([starts, ends]))
+        self._stride = len(self._times) + 1
+        self._start_codes = self._session_ids * self._stride + np.searchsorted(self._times, starts, 'left')
+
+    def __len__(self):
+        return len(self.windows)
+
+    def overlaps(self, spans, start, end):
+        """Return (span, window, overlap) for every span of spans overlapping a window of its session.
+
+        span is the row position in spans, window the row position in
+        self.windows and overlap the shared time in seconds.
+        """
+        empty = pd.DataFrame({'span': np.array([], dtype=np.int64), 'window': np.array([], dtype=np.int64),
+                              'overlap': np.array([], dtype='float64')})
+        if not len(self.windows) or not len(spans):
+            return empty
+        span_starts, missing_start = _as_ns(spans[start])
+        span_ends, missing_end = _as_ns(spans[end])
+        sessions = self._sessions.get_indexer(spans['session_key'].astype('float64').fillna(-1).astype('int64'))
+        valid = (sessions >= 0) & ~missing_start & ~missing_end
+        base = np.where(valid, sessions, 0) * self._stride
+
+        # Candidates: windows of the session that started before the span ended,
+        # but not so long before its start that they must have ended already
+        hi = np.searchsorted(self._start_codes, base + np.searchsorted(self._times, span_ends, 'left'), 'left')
+        earliest = np.searchsorted(self._times, span_starts - self._max_length, 'left')
+        lo = np.searchsorted(self._start_codes, base + earliest, 'left')
+        counts = np.where(valid, np.maximum(hi - lo, 0), 0)
+
+        span_idx = np.repeat(np.arange(len(spans)), counts)
+        window_idx = np.repeat(lo, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+        overlap = (np.minimum(span_ends[span_idx], self._ends[window_idx])
+                   - np.maximum(span_starts[span_idx], self._starts[window_idx]))
+        keep = overlap > 0
+        if not keep.any():
+            return empty
+        return pd.DataFrame({'span': span_idx[keep], 'window': window_idx[keep], 'overlap': overlap[keep] / 1e9})
+
+
+def _green_pace(green, affected):
+    """Return the green-flag pace of every affected lap from the driver's green laps around it."""
+    by = ['session_key', 'driver_number']
+    green = green.sort_values(by + ['lap_number'], kind='stable')
+    rolling = green.groupby(by, observed=True, sort=True)['lap_duration'].rolling(
+        GREEN_LAPS, center=True, min_periods=1).median()
+    pace = green[by + ['lap_number']].assign(_pace=rolling.to_numpy(dtype='float64'))
+    pace['_lap'] = pace['lap_number'].astype('int64')
+    laps = affected[by + ['lap_number']].drop_duplicates()
+    laps = laps.assign(_lap=laps['lap_number'].astype('int64')).sort_values('_lap')
+    pace = pace.drop(columns='lap_number').sort_values('_lap')
+
+    before = pd.merge_asof(laps, pace, on='_lap', by=by, direction='backward', allow_exact_matches=False)
+    after = pd.merge_asof(laps, pace, on='_lap', by=by, direction='forward', allow_exact_matches=False)
+    laps['green_pace'] = pd.concat([before['_pace'], after['_pace']], axis=1).mean(axis=1).to_numpy()
+    return laps.drop(columns='_lap')
+
+
+def incident_laps(laps, windows, pit=None):
+    """Return every lap that overlaps an incident window, once per window, with the time it lost there.
+
+    Columns: session_key, driver_number, lap_number, window, kind,
+    overlap (seconds of the lap inside the window), lap_duration,
+    green_pace and time_lost. A yellow's time_lost is 0 on laps that also
+    overlap a safety car, VSC or red flag window.
+    """
+    with span("join:incident_laps", rows_in=[laps, windows]) as s:
+        timed = drop_pit_laps(laps.dropna(subset=['date_start', 'lap_duration']), pit).reset_index(drop=True)
+        timed['date_end'] = timed['date_start'] + pd.to_timedelta(timed['lap_duration'].astype('float64'), unit='s')
+
+        index = IncidentWindows(windows)
+        pairs = index.overlaps(timed, 'date_start', 'date_end')
+        affected = np.zeros(len(timed), dtype=bool)
+        affected[pairs['span'].to_numpy()] = True
+
+        green = _green_pace(timed[~affected], timed[affected])
+
+        lap_columns = ['session_key', 'driver_number', 'lap_number', 'lap_duration']
+        result = timed[lap_columns].iloc[pairs['span']].reset_index(drop=True)
+        result.insert(3, 'window', index.windows['window'].to_numpy()[pairs['window']])
+        result.insert(4, 'kind', index.windows['kind'].to_numpy()[pairs['window']])
+        result.insert(5, 'overlap', pairs['overlap'].to_numpy())
+        result = result.merge(green, on=['session_key', 'driver_number', 'lap_number'], how='left')
+
+        # Split each lap's loss between the windows it overlaps, yellows only among themselves
+        lap_keys = ['session_key', 'driver_number', 'lap_number']
+        yellow = (result['kind'] == 'yellow').to_numpy()
+        share = result['overlap'] / result.groupby(lap_keys + [yellow], observed=True)['overlap'].transform('sum')
+        neutralised = result.assign(_other=~yellow).groupby(lap_keys, observed=True)['_other'].transform('any')
+        share = share.where(~(yellow & neutralised), 0.0)
+        result['time_lost'] = (result['lap_duration'].astype('float64') - result['green_pace']) * share
+        return s.output(result)
+
+
+def time_lost_by_window(windows, incident_laps):
+    """Return every window with the number of drivers and laps it affected and the time they lost."""
+    lost = incident_laps.groupby('window', observed=True).agg(
+        drivers=('driver_number', 'nunique'), laps=('lap_number', 'size'), time_lost=('time_lost', 'sum'))
+    result = windows.merge(lost, left_on='window', right_index=True, how='left')
+    result[['drivers', 'laps']] = result[['drivers', 'laps']].fillna(0).astype('int64')
+    result['time_lost'] = result['time_lost'].fillna(0.0)
+    result['time_lost_per_driver'] = result['time_lost'] / result['drivers'].where(result['drivers'] > 0)
+    return result
+
+
+def time_lost_by_driver(incident_laps):
+    """Return the time each driver lost under each kind of window, one column per kind.
+
+    total is the safety car, VSC and red flag time; yellow is left out of it.
+    """
+    lost = incident_laps.pivot_table(index=['session_key', 'driver_number'], columns='kind', values='time_lost',
+                                     aggfunc='sum', observed=True, fill_value=0.0)
+    lost.columns = list(lost.columns)
+    lost['total'] = lost.drop(columns='yellow', errors='ignore').sum(axis=1)
+    return lost.reset_index()
@@ -0,0 +1,139 @@
+import argparse
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from data_loader import DATA_DIR, TABLE_FILES
+
+# Bulk download of OpenF1 datasets for many sessions.
+#
+# Every (session_key, dataset) pair is one download job. Jobs run on a bounded
+# thread pool that shares a single pooled requests.Session with retries and a
+# timeout. Files land in data/<session_key>/ under the same names the loader
+# expects, so any session directory can be passed as data_dir to the analyses.
+# Files that are already on disk are skipped; with refresh=True they are
+# revalidated with their stored ETag instead. Every write goes to a temporary
+# file that is renamed into place, so an interrupted run can simply be resumed.
+
+BASE_URL = "https://api.openf1.org/v1"
+
+# Loader table name -> OpenF1 endpoint
+ENDPOINTS = {
+    "ranking": "position",
+    "laps": "laps",
+    "stints": "stints",
+    "pit": "pit",
+    "intervals": "intervals",
+    "weather": "weather",
+    "race_control": "race_control",
+    "drivers": "drivers",
+}
+
+
+def make_session(concurrency=8, retries=3):
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=["GET"], respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def session_dir(session_key, data_dir=DATA_DIR):
+    return os.path.join(data_dir, str(session_key))
+
+
+def _atomic_write(path, chunks):
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def fetch_dataset(http, session_key, table, data_dir=DATA_DIR, base_url=BASE_URL, refresh=False, timeout=30):
+    """Download one dataset for one session and return its status string.
+
+    The status is "skipped", "not_modified", "downloaded" or "failed: <reason>".
+    """
+    directory = session_dir(session_key, data_dir)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, TABLE_FILES[table])
+    etag_path = path + ".etag"
+
+    if os.path.exists(path) and not refresh:
+        return "skipped"
+
+    headers = {}
+    if os.path.exists(path) and os.path.exists(etag_path):
+        with open(etag_path) as file:
+            headers["If-None-Match"] = file.read().strip()
+
+    url = f"{base_url}/{ENDPOINTS[table]}"
+    params = {"session_key": session_key, "csv": "true"}
+    try:
+        with http.get(url, params=params, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 304:
+                return "not_modified"
+            if response.status_code != 200:
+                return f"failed: HTTP {response.status_code}"
+            _atomic_write(path, response.iter_content(chunk_size=1 << 16))
+            etag = response.headers.get("ETag")
+    except requests.RequestException as e:
+        return f"failed: {e}"
+
+    if etag:
+        _atomic_write(etag_path, [etag.encode()])
+    return "downloaded"
+
+
+def ingest(session_keys, tables=None, data_dir=DATA_DIR, base_url=BASE_URL, concurrency=8, refresh=False, timeout=30):
+    """Fetch the given tables (all by default) for every session concurrently.
+
+    Returns a list of (session_key, table, status) tuples.
+    """
+    tables = list(tables or ENDPOINTS)
+    jobs = [(session_key, table) for session_key in session_keys for table in tables]
+
+    with make_session(concurrency) as http, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(fetch_dataset, http, session_key, table, data_dir, base_url, refresh, timeout)
+                   for session_key, table in jobs]
+        results = []
+        for (session_key, table), future in zip(jobs, futures):
+            status = future.result()
+            print(f"Session {session_key} {table}: {status}")
+            results.append((session_key, table, status))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download OpenF1 datasets into data/<session_key>/.")
+    parser.add_argument("session_keys", nargs="+", type=int)
+    parser.add_argument("--tables", nargs="+", choices=sorted(ENDPOINTS), default=None)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--base-url", default=BASE_URL, help="API root, e.g. a local stand-in server")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--refresh", action="store_true", help="revalidate files that already exist")
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    results = ingest(args.session_keys, args.tables, args.data_dir, args.base_url,
+                     args.concurrency, args.refresh, args.timeout)
+    failed = [r for r in results if r[2].startswith("failed")]
+    print(f"Fetched {len(results) - len(failed)} of {len(results)} datasets.")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
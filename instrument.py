@@ -0,0 +1,253 @@
+import atexit
+import cProfile
+import fnmatch
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Named spans around load, merge, aggregate and plot steps.
+#
+# Each span records wall time, CPU time, rows in and out, the growth of the
+# process's peak RSS and its RSS at the end. Finished spans can be echoed as
+# one line each, appended to a JSON lines file, or collected into a Chrome
+# trace (open it in chrome://tracing or https://ui.perfetto.dev). Spans whose
+# names match a pattern can also be run under cProfile, one .prof file each.
+#
+# Scripts pick the output up from the environment:
+#   F1_TRACE=trace.json         Chrome trace (any other extension than .jsonl)
+#   F1_TRACE=spans.jsonl        JSON lines, one span per line
+#   F1_PROFILE=profiles/        cProfile output directory
+#   F1_PROFILE_SPANS='plot:*'   which spans to profile (default: all)
+
+TRACE_ENV = "F1_TRACE"
+PROFILE_ENV = "F1_PROFILE"
+PROFILE_SPANS_ENV = "F1_PROFILE_SPANS"
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _rows(value):
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, (list, tuple)):
+        # Several inputs: their total size
+        return sum(_rows(item) or 0 for item in value)
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+class Span:
+    """A running span; set rows_in / rows_out or extra attributes while it is open."""
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.rows_in = None
+        self.rows_out = None
+
+    def output(self, result):
+        """Record the size of result as rows_out and return it unchanged."""
+        self.rows_out = _rows(result)
+        return result
+
+
+class Tracer:
+    """Times spans and sends the finished ones to the configured outputs."""
+
+    def __init__(self):
+        self.echo = False
+        self.collect = False
+        self.records = []
+        self.profile_dir = None
+        self.profile_spans = "*"
+        self._trace_path = None
+        self._jsonl = None
+        self._local = threading.local()
+        self._profiling = False
+        self._profiles = 0
+
+    @property
+    def enabled(self):
+        return self.echo or self.collect or self._jsonl is not None or self.profile_dir is not None
+
+    def configure(self, trace=None, profile_dir=None, profile_spans="*", echo=False, collect=False):
+        """Send spans to trace (.jsonl for JSON lines, otherwise a Chrome trace) and/or echo them.
+
+        With collect, finished spans are only kept in records, e.g. in a worker
+        process that hands them back to its parent.
+        """
+        self.close()
+        self.echo = echo
+        self.collect = collect
+        self.profile_dir = profile_dir
+        self.profile_spans = profile_spans
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+        if trace and trace.endswith(".jsonl"):
+            self._jsonl = open(trace, "w")
+        elif trace:
+            self._trace_path = trace
+            self.collect = True
+
+    def configure_from_env(self, echo=True):
+        self.configure(os.environ.get(TRACE_ENV), os.environ.get(PROFILE_ENV),
+                       os.environ.get(PROFILE_SPANS_ENV, "*"), echo)
+
+    def detach(self):
+        """Drop the outputs inherited from a parent process without writing to them."""
+        self._jsonl = None
+        self._trace_path = None
+        self.collect = False
+        self.records = []
+
+    def drain(self):
+        """Return the collected records and forget them."""
+        records, self.records = self.records, []
+        return records
+
+    def close(self):
+        """Flush the outputs; the Chrome trace is only written here."""
+        if self._jsonl is not None:
+            self._jsonl.close()
+            self._jsonl = None
+        if self._trace_path is not None:
+            with open(self._trace_path, "w") as f:
+                json.dump({"traceEvents": [self._chrome_event(record) for record in self.records],
+                           "displayTimeUnit": "ms"}, f)
+            self._trace_path = None
+            self.collect = False
+            self.records = []
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @staticmethod
+    def _chrome_event(record):
+        args = {key: value for key, value in record.items()
+                if key not in ("name", "start", "wall_s", "pid", "tid") and value is not None}
+        return {"name": record["name"], "cat": record["name"].split(":")[0], "ph": "X",
+                "ts": record["start"] * 1e6, "dur": record["wall_s"] * 1e6,
+                "pid": record["pid"], "tid": record["tid"], "args": args}
+
+    def emit(self, record):
+        if self.collect:
+            self.records.append(record)
+        if self._jsonl is not None:
+            self._jsonl.write(json.dumps(record) + "\n")
+            self._jsonl.flush()
+        if self.echo:
+            parts = [f"{'  ' * record['depth']}{record['name']}", f"{record['wall_s']:.3f}s wall",
+                     f"{record['cpu_s']:.3f}s cpu"]
+            if record["rows_out"] is not None:
+                parts.append(f"{record['rows_out']} rows")
+            if record["peak_rss_delta_mb"]:
+                parts.append(f"+{record['peak_rss_delta_mb']:.1f} MB peak RSS")
+            print("  ".join(parts), flush=True)
+
+    @contextmanager
+    def span(self, name, rows_in=None, **attrs):
+        """Time the enclosed block as a span called name."""
+        current = Span(name, attrs)
+        current.rows_in = _rows(rows_in)
+        stack = self._stack()
+        parent = stack[-1].name if stack else None
+        stack.append(current)
+
+        profiler = None
+        if self.profile_dir and not self._profiling and fnmatch.fnmatch(name, self.profile_spans):
+            # cProfile cannot nest, so only the outermost matching span is profiled
+            profiler = cProfile.Profile()
+            self._profiling = True
+            profiler.enable()
+
+        peak_before = _peak_rss_mb()
+        start = time.time()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield current
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+                self._profiles += 1
+                safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+                profiler.dump_stats(os.path.join(self.profile_dir,
+                                                 f"{safe_name}.{os.getpid()}.{self._profiles}.prof"))
+            stack.pop()
+            peak_after = _peak_rss_mb()
+            rss = _rss_mb()
+            if self.enabled:
+                self.emit({
+                    "name": name,
+                    "start": start,
+                    "wall_s": round(wall, 6),
+                    "cpu_s": round(cpu, 6),
+                    "rows_in": current.rows_in,
+                    "rows_out": current.rows_out,
+                    "peak_rss_delta_mb": None if peak_before is None else round(peak_after - peak_before, 2),
+                    "rss_mb": None if rss is None else round(rss, 2),
+                    "depth": len(stack),
+                    "parent": parent,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    **current.attrs,
+                })
+
+
+TRACER = Tracer()
+atexit.register(TRACER.close)
+span = TRACER.span
+configure = TRACER.configure
+configure_from_env = TRACER.configure_from_env
+
+
+def init_worker(trace):
+    """Set up tracing in a pool worker: collect spans for the parent if trace, write none."""
+    # A forked worker inherits the parent's trace outputs; only the parent writes them
+    TRACER.detach()
+    if trace:
+        # Keep the spans; the worker hands them back to the parent with its results
+        configure(collect=True)
+
+
+def add_arguments(parser):
+    """Add --trace, --profile and --profile-spans to a script's argument parser."""
+    parser.add_argument("--trace", default=os.environ.get(TRACE_ENV),
+                        help="write spans to this file: JSON lines if it ends in .jsonl, otherwise a Chrome trace")
+    parser.add_argument("--profile", default=os.environ.get(PROFILE_ENV), metavar="DIR",
+                        help="write a cProfile .prof file per span into DIR")
+    parser.add_argument("--profile-spans", default=os.environ.get(PROFILE_SPANS_ENV, "*"), metavar="PATTERN",
+                        help="only profile spans matching this pattern, e.g. 'plot:*'")
+
+
+def configure_from_args(args, echo=True):
+    configure(args.trace, args.profile, args.profile_spans, echo)
@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+from data_loader import DATA_DIR, iter_table_chunks, load_table
+from instrument import span
+
+# Streaming per-lap aggregates of interval_data.csv.
+#
+# interval_data is read in fixed-size chunks. Each chunk is assigned to laps
+# with an as-of join on the lap start times, reduced to per-lap partial
+# aggregates and folded into a running state keyed by
+# (session_key, driver_number, lap_number). The state grows with the number of
+# laps, never with the number of interval samples, so peak memory stays flat
+# however long the file is.
+#
+# Time spent within DRS range is the sum of the gaps between a sample with
+# interval <= DRS_WINDOW and the driver's next sample. The last sample of each
+# driver in a chunk is carried into the next chunk until that gap is known.
+
+KEYS = ['session_key', 'driver_number', 'lap_number']
+DRS_WINDOW = 1.0
+MAX_SAMPLE_GAP = 30.0  # seconds; longer gaps (e.g. red flags) are not counted as DRS time
+
+SUM_COLUMNS = ['gap_sum', 'gap_count', 'interval_sum', 'interval_count', 'samples', 'drs_samples', 'drs_time']
+MIN_COLUMNS = ['gap_min', 'interval_min']
+LAST_COLUMNS = ['gap_last', 'interval_last']
+
+
+def lap_starts(laps_df):
+    starts = laps_df.dropna(subset=['date_start'])[['session_key', 'driver_number', 'lap_number', 'date_start']]
+    return starts.sort_values('date_start')
+
+
+class IntervalAggregator:
+    def __init__(self, laps_df):
+        self.starts = lap_starts(laps_df)
+        self.state = None
+        self.carry = None
+
+    def _assign_laps(self, chunk):
+        chunk = chunk.dropna(subset=['date', 'session_key', 'driver_number']).sort_values('date')
+        chunk = pd.merge_asof(chunk, self.starts, left_on='date', right_on='date_start',
+                              by=['session_key', 'driver_number'], direction='backward')
+        # Lap 1 has no start time in OpenF1, so anything before lap 2 belongs to it
+        chunk['lap_number'] = chunk['lap_number'].fillna(1)
+        return chunk.drop(columns=['date_start'])
+
+    def update(self, chunk):
+        """Fold one chunk of typed interval rows into the running aggregates."""
+        samples = self._assign_laps(chunk)
+        samples['_counted'] = True
+        if self.carry is not None:
+            samples = pd.concat([self.carry, samples], ignore_index=True)
+        samples = samples.sort_values(['session_key', 'driver_number', 'date'], ignore_index=True)
+
+        next_date = samples.groupby(['session_key', 'driver_number'])['date'].shift(-1)
+        samples['_dt'] = (next_date - samples['date']).dt.total_seconds()
+        samples['_in_drs'] = samples['interval'] <= DRS_WINDOW
+
+        # The newest sample of each driver waits for the next chunk to learn its gap
+        pending = samples['_dt'].isna()
+        self.carry = samples.loc[pending].drop(columns=['_dt', '_in_drs']).assign(_counted=False)
+
+        counted = samples[samples['_counted']]
+        grouped = counted.groupby(KEYS)
+        stats = grouped.agg(
+            gap_min=('gap_to_leader', 'min'),
+            gap_sum=('gap_to_leader', 'sum'),
+            gap_count=('gap_to_leader', 'count'),
+            interval_min=('interval', 'min'),
+            interval_sum=('interval', 'sum'),
+            interval_count=('interval', 'count'),
+            samples=('date', 'size'),
+            drs_samples=('_in_drs', 'sum'),
+            last_date=('date', 'max'),
+        )
+        last = counted.groupby(KEYS)[['gap_to_leader', 'interval']].last()
+        stats[LAST_COLUMNS] = last.to_numpy()
+
+        timed = samples[samples['_in_drs'] & (samples['_dt'] <= MAX_SAMPLE_GAP)]
+        drs_time = timed.groupby(KEYS)['_dt'].sum().rename('drs_time')
+        stats = stats.join(drs_time, how='outer')
+        stats[SUM_COLUMNS] = stats[SUM_COLUMNS].fillna(0)
+
+        self.state = stats if self.state is None else self._combine(self.state, stats)
+
+    @staticmethod
+    def _combine(state, stats):
+        both = pd.concat([state, stats]).sort_values('last_date', na_position='first')
+        grouped = both.groupby(level=KEYS)
+        combined = grouped[SUM_COLUMNS].sum()
+        combined[MIN_COLUMNS] = grouped[MIN_COLUMNS].min()
+        combined[LAST_COLUMNS] = grouped[LAST_COLUMNS].last()
+        combined['last_date'] = grouped['last_date'].max()
+        return combined
+
+    def result(self):
+        """Return one row per (session_key, driver_number, lap_number) with the aggregates so far."""
+        if self.state is None:
+            return pd.DataFrame(columns=KEYS)
+        state = self.state
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = pd.DataFrame({
+                'gap_to_leader_min': state['gap_min'],
+                'gap_to_leader_mean': state['gap_sum'] / state['gap_count'],
+                'gap_to_leader_last': state['gap_last'],
+                'interval_min': state['interval_min'],
+                'interval_mean': state['interval_sum'] / state['interval_count'],
+                'interval_last': state['interval_last'],
+                'interval_samples': state['samples'].astype('int64'),
+                'drs_samples': state['drs_samples'].astype('int64'),
+                'drs_time': state['drs_time'],
+            })
+        result = result.reset_index()
+        result['lap_number'] = result['lap_number'].astype(self.starts['lap_number'].dtype)
+        return result
+
+
+def aggregate_intervals(data_dir=DATA_DIR, laps_df=None, chunksize=100_000):
+    """Stream interval_data.csv in chunks and return its per-lap aggregates."""
+    if laps_df is None:
+        laps_df = load_table("laps", data_dir)
+    with span("aggregate:intervals", chunksize=chunksize) as s:
+        aggregator = IntervalAggregator(laps_df)
+        s.rows_in = 0
+        for chunk in iter_table_chunks("intervals", data_dir, chunksize):
+            aggregator.update(chunk)
+            s.rows_in += len(chunk)
+        return s.output(aggregator.result())
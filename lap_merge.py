@@ -0,0 +1,146 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from alignment import TimeSeries, attach_weather
+from data_loader import DATA_DIR, TABLE_FILES, load_table, table_path
+from instrument import span
+from interval_stream import aggregate_intervals
+from stint_laps import assign_stints
+
+# Lap-level merge of all OpenF1 tables.
+#
+# Every table is aligned to laps on its natural key, so the result has exactly
+# one row per lap:
+#   drivers       on (session_key, driver_number)
+#   intervals     last sample at or before the end of the lap, within the lap,
+#                 or the streamed per-lap aggregates from interval_stream
+#   weather       last sample at or before the start of the lap
+#   pit           on (session_key, driver_number, lap_number)
+#   race control  driver messages counted and joined per lap
+#   stints        by lap range (see stint_laps.assign_stints)
+# Sessions are merged one at a time and appended to a Parquet file, so memory
+# use is bounded by the largest single session rather than the whole archive.
+
+SESSION_KEYS = ['session_key', 'meeting_key']
+
+
+def session_dirs(data_dir=DATA_DIR):
+    """Return data_dir if it holds the lap data, otherwise its session subdirectories."""
+    if os.path.exists(table_path("laps", data_dir)):
+        return [data_dir]
+    return sorted(os.path.join(data_dir, name) for name in os.listdir(data_dir)
+                  if os.path.exists(table_path("laps", os.path.join(data_dir, name))))
+
+
+def load_session_tables(data_dir=DATA_DIR, stream_intervals=False):
+    """Load every table in data_dir.
+
+    With stream_intervals, interval_data is not loaded whole; it is replaced by
+    its per-lap aggregates ("interval_stats"), computed chunk by chunk.
+    """
+    names = [name for name in TABLE_FILES if os.path.exists(table_path(name, data_dir))]
+    if stream_intervals and "intervals" in names:
+        names.remove("intervals")
+    tables = {name: load_table(name, data_dir) for name in names}
+    if stream_intervals and os.path.exists(table_path("intervals", data_dir)):
+        tables["interval_stats"] = aggregate_intervals(data_dir, tables["laps"])
+    return tables
+
+
+def iter_sessions(tables):
+    """Split a set of tables into one set per session_key.
+
+    Each table is grouped once, so the cost grows with the number of rows and
+    not with rows times sessions.
+    """
+    rows = {name: df.groupby('session_key', observed=True, sort=False).indices for name, df in tables.items()}
+    empty = np.array([], dtype=np.int64)
+    for session_key in tables["laps"]['session_key'].dropna().unique():
+        yield session_key, {name: df.iloc[rows[name].get(session_key, empty)] for name, df in tables.items()}
+
+
+def merge_laps(tables):
+    """Merge one session's tables into a DataFrame with one row per lap."""
+    laps = tables["laps"].reset_index(drop=True)
+    laps['date_end'] = laps['date_start'] + pd.to_timedelta(laps['lap_duration'], unit='s')
+    merged = laps
+
+    if "drivers" in tables:
+        drivers = tables["drivers"].drop_duplicates(subset=['session_key', 'driver_number'])
+        merged = merged.merge(drivers, on=['driver_number'] + SESSION_KEYS, how='left')
+
+    if "stints" in tables:
+        merged = assign_stints(merged, tables["stints"])
+
+    if "pit" in tables:
+        pit = tables["pit"][['driver_number', 'lap_number', 'pit_duration'] + SESSION_KEYS]
+        pit = pit.drop_duplicates(subset=['driver_number', 'lap_number', 'session_key'])
+        merged = merged.merge(pit, on=['driver_number', 'lap_number'] + SESSION_KEYS, how='left')
+
+    if "race_control" in tables:
+        messages = tables["race_control"].dropna(subset=['driver_number', 'lap_number'])
+        messages = messages.groupby(['session_key', 'driver_number', 'lap_number']).agg(
+            race_control_count=('message', 'size'),
+            race_control_messages=('message', ' | '.join),
+        ).reset_index()
+        for col in ['driver_number', 'lap_number']:
+            messages[col] = messages[col].astype(merged[col].dtype)
+        merged = merged.merge(messages, on=['session_key', 'driver_number', 'lap_number'], how='left')
+        merged['race_control_count'] = merged['race_control_count'].fillna(0).astype('int64')
+
+    if "intervals" in tables:
+        intervals = tables["intervals"][['date', 'driver_number', 'session_key', 'gap_to_leader', 'interval']]
+        intervals = intervals.rename(columns={'date': 'interval_date'})
+        merged = TimeSeries(intervals, 'interval_date', ['session_key', 'driver_number']).asof(merged, 'date_end')
+        # Only keep samples taken during the lap itself
+        outside = merged['interval_date'] < merged['date_start']
+        merged.loc[outside, ['gap_to_leader', 'interval', 'interval_date']] = None
+
+    if "interval_stats" in tables:
+        merged = merged.merge(tables["interval_stats"], on=['session_key', 'driver_number', 'lap_number'], how='left')
+
+    if "weather" in tables:
+        weather = tables["weather"].drop(columns=['meeting_key']).rename(columns={'date': 'weather_date'})
+        merged = attach_weather(merged, 'date_start', TimeSeries(weather, 'weather_date'))
+
+    return merged.reset_index(drop=True)
+
+
+def write_merged(data_dirs, out_path, prepare=None, stream_intervals=False, loaded=None):
+    """Merge every session under data_dirs and stream the rows into one Parquet file.
+
+    prepare, if given, is called on each session's tables before merging.
+    loaded, if given, is called with each data directory's tables once they
+    are loaded. Returns the number of rows written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    rows = 0
+    try:
+        for data_dir in data_dirs:
+            dir_tables = load_session_tables(data_dir, stream_intervals)
+            if loaded is not None:
+                loaded(dir_tables)
+            for session_key, tables in iter_sessions(dir_tables):
+                if prepare is not None:
+                    with span("clean:tables", rows_in=list(tables.values()), session_key=int(session_key)):
+                        tables = prepare(tables)
+                with span("merge:laps", rows_in=list(tables.values()), session_key=int(session_key)) as s:
+                    merged = s.output(merge_laps(tables))
+                with span("write:parquet", rows_in=merged, session_key=int(session_key)):
+                    if writer is None:
+                        table = pa.Table.from_pandas(merged, preserve_index=False)
+                        writer = pq.ParquetWriter(out_path, table.schema)
+                    else:
+                        table = pa.Table.from_pandas(merged, schema=writer.schema, preserve_index=False)
+                    writer.write_table(table)
+                rows += len(merged)
+                print(f"Merged session {session_key}: {len(merged)} laps.")
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
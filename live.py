@@ -0,0 +1,247 @@
+import argparse
+import io
+import os
+import time
+
+import pandas as pd
+
+from data_loader import DATA_DIR, TABLE_FILES, clean_frame
+from ingest import BASE_URL, ENDPOINTS, make_session
+from schemas import SCHEMAS
+
+# Live, incremental race aggregates.
+#
+# Feeds return only the rows that appeared since the previous poll: CsvTail
+# follows a growing CSV file by byte offset, and HttpFeed asks the OpenF1 API
+# for rows newer than the last timestamp it has seen (for laps, from the start
+# of the oldest lap still waiting for its time). LiveRaceState folds each
+# batch into per-driver running sums and counts, the latest known positions and
+# the latest weather sample, so an update costs O(new rows) and snapshot()
+# never rescans the session.
+
+LIVE_TABLES = ["laps", "pit", "ranking", "weather"]
+
+
+class CsvTail:
+    """Follow a CSV file that is being appended to."""
+
+    def __init__(self, path, table):
+        self.path = path
+        self.schema = SCHEMAS.get(table)
+        self.offset = 0
+        self.header = None
+
+    def read_new(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "rb") as file:
+            file.seek(self.offset)
+            data = file.read()
+        # Only consume complete lines; a partially written row waits for the next poll
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return None
+        self.offset += end
+        text = data[:end].decode()
+        if self.header is None:
+            self.header, _, text = text.partition("\n")
+        if not text.strip():
+            return None
+        raw = pd.read_csv(io.StringIO(self.header + "\n" + text), dtype=str, keep_default_na=False)
+        return clean_frame(raw, self.schema)
+
+
+class HttpFeed:
+    """Poll an OpenF1 endpoint for rows newer than the last one received."""
+
+    def __init__(self, http, table, session_key, base_url=BASE_URL, timeout=10):
+        self.http = http
+        self.table = table
+        self.session_key = session_key
+        self.url = f"{base_url}/{ENDPOINTS[table]}"
+        self.time_column = "date_start" if table == "laps" else "date"
+        self.timeout = timeout
+        self.last_time = None
+        self.open_laps = {}  # (driver_number, lap_number) -> date_start of laps still without a time
+        self.done_laps = set()  # laps already returned with their time
+        self.latest_lap = {}  # driver_number -> highest lap_number seen
+
+    def _cursor(self):
+        # Laps are fetched again from the start of the oldest lap still open
+        if self.open_laps:
+            return min(self.open_laps.values()), ">="
+        return self.last_time, ">"
+
+    def _track_laps(self, rows):
+        """Drop laps already returned with their time and move the cursor to the oldest open lap."""
+        keys = list(zip(rows['driver_number'].tolist(), rows['lap_number'].tolist()))
+        fresh = [key not in self.done_laps for key in keys]
+        rows = rows[fresh]
+        # A lap sent both open and with its time in one batch keeps the timed row
+        rows = rows.sort_values('lap_duration', na_position='first', kind='stable').drop_duplicates(
+            ['driver_number', 'lap_number'], keep='last').sort_index()
+        done = rows['lap_duration'].notna()
+        for key, start, finished in zip(zip(rows['driver_number'].tolist(), rows['lap_number'].tolist()),
+                                        rows['date_start'], done):
+            driver, lap = key
+            self.latest_lap[driver] = max(self.latest_lap.get(driver, lap), lap)
+            if finished:
+                self.done_laps.add(key)
+                self.open_laps.pop(key, None)
+            elif not pd.isna(start):
+                self.open_laps[key] = start
+
+        # A lap whose driver is two laps further on will not get a time any more
+        self.open_laps = {(driver, lap): start for (driver, lap), start in self.open_laps.items()
+                          if lap > self.latest_lap[driver] - 2}
+
+        times = rows.loc[done, 'date_start'].dropna()
+        if not times.empty:
+            self.last_time = max(times.max(), self.last_time) if self.last_time is not None else times.max()
+        return rows
+
+    def read_new(self):
+        params = {"session_key": self.session_key, "csv": "true"}
+        cursor, op = self._cursor()
+        if cursor is not None:
+            params[f"{self.time_column}{op}"] = cursor.isoformat()
+        response = self.http.get(self.url, params=params, timeout=self.timeout)
+        if response.status_code != 200 or not response.text.strip():
+            return None
+        raw = pd.read_csv(io.StringIO(response.text), dtype=str, keep_default_na=False)
+        rows = clean_frame(raw, SCHEMAS.get(self.table))
+        if self.table == "laps":
+            # A lap row is published when the lap starts and updated once its
+            # time is known, which can be after later laps of other drivers
+            # have completed. Open laps hold the cursor back until they do.
+            return self._track_laps(rows.dropna(subset=['driver_number', 'lap_number']))
+        times = rows[self.time_column].dropna()
+        if not times.empty:
+            self.last_time = times.max()
+        return rows
+
+
+class LiveRaceState:
+    def __init__(self):
+        self.lap_totals = pd.DataFrame(columns=['lap_time_sum', 'laps_completed'], dtype='float64')
+        self.pit_totals = pd.DataFrame(columns=['pit_duration_sum', 'pit_stops'], dtype='float64')
+        self.positions = pd.DataFrame(columns=['starting_position', 'position', 'date'])
+        self.weather = None
+        self.seen_laps = set()
+        self.seen_pits = set()
+
+    @staticmethod
+    def _add(totals, increments):
+        return totals.add(increments, fill_value=0)
+
+    def _new_keys(self, rows, columns, seen):
+        # Rows can be re-sent (e.g. a lap row is updated once its time is known); count each key once
+        keys = list(zip(*(rows[col].tolist() for col in columns)))
+        fresh = [key not in seen for key in keys]
+        seen.update(keys)
+        return rows[fresh]
+
+    def update_laps(self, rows):
+        rows = rows.dropna(subset=['driver_number', 'lap_number', 'lap_duration'])
+        rows = self._new_keys(rows, ['driver_number', 'lap_number'], self.seen_laps)
+        increments = rows.groupby('driver_number').agg(lap_time_sum=('lap_duration', 'sum'),
+                                                       laps_completed=('lap_duration', 'size'))
+        self.lap_totals = self._add(self.lap_totals, increments.astype('float64'))
+
+    def update_pit(self, rows):
+        rows = rows.dropna(subset=['driver_number', 'lap_number'])
+        rows = self._new_keys(rows, ['driver_number', 'lap_number'], self.seen_pits)
+        increments = rows.groupby('driver_number').agg(pit_duration_sum=('pit_duration', 'sum'),
+                                                       pit_stops=('pit_duration', 'size'))
+        self.pit_totals = self._add(self.pit_totals, increments.astype('float64'))
+
+    def update_ranking(self, rows):
+        rows = rows.dropna(subset=['driver_number', 'position', 'date']).sort_values('date')
+        grouped = rows.groupby('driver_number')
+        latest = pd.DataFrame({'starting_position': grouped['position'].first(),
+                               'position': grouped['position'].last(),
+                               'date': grouped['date'].last()})
+        if self.positions.empty:
+            self.positions = latest
+            return
+        # Keep the first position ever seen, and the newest position by time
+        combined = pd.concat([self.positions, latest]).sort_values('date')
+        grouped = combined.groupby(level=0)
+        self.positions = pd.DataFrame({'starting_position': grouped['starting_position'].first(),
+                                       'position': grouped['position'].last(),
+                                       'date': grouped['date'].last()})
+
+    def update_weather(self, rows):
+        rows = rows.dropna(subset=['date'])
+        if rows.empty:
+            return
+        newest = rows.loc[rows['date'].idxmax()]
+        if self.weather is None or newest['date'] >= self.weather['date']:
+            self.weather = newest
+
+    def update(self, table, rows):
+        if rows is None or rows.empty:
+            return
+        getattr(self, f"update_{table}")(rows)
+
+    def snapshot(self):
+        """Return the current per-driver table and the latest weather sample."""
+        drivers = self.lap_totals.join(self.pit_totals, how='outer').join(
+            self.positions[['starting_position', 'position']], how='outer')
+        for col in ['lap_time_sum', 'laps_completed', 'pit_duration_sum', 'pit_stops']:
+            if col not in drivers:
+                drivers[col] = 0.0
+        drivers['avg_lap_duration'] = drivers['lap_time_sum'] / drivers['laps_completed']
+        drivers['avg_pit_duration'] = drivers['pit_duration_sum'] / drivers['pit_stops']
+        drivers['position_change'] = drivers['starting_position'] - drivers['position']
+        drivers = drivers.drop(columns=['lap_time_sum', 'pit_duration_sum'])
+        drivers.index.name = 'driver_number'
+        return {"drivers": drivers.sort_values('position').reset_index(), "weather": self.weather}
+
+
+def run(feeds, state=None, poll_interval=5.0, iterations=None, on_snapshot=None):
+    """Poll every feed, fold the new rows into state and report a snapshot, until stopped."""
+    state = state or LiveRaceState()
+    count = 0
+    while iterations is None or count < iterations:
+        for table, feed in feeds.items():
+            state.update(table, feed.read_new())
+        if on_snapshot is not None:
+            on_snapshot(state.snapshot())
+        count += 1
+        if iterations is None or count < iterations:
+            time.sleep(poll_interval)
+    return state
+
+
+def print_snapshot(snapshot):
+    print(snapshot["drivers"].to_string(index=False))
+    if snapshot["weather"] is not None:
+        weather = snapshot["weather"]
+        print(f"Weather at {weather['date']}: air {weather['air_temperature']} °C, "
+              f"track {weather['track_temperature']} °C, humidity {weather['humidity']} %")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep race aggregates up to date from a live feed.")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="follow the growing CSV files in this directory")
+    parser.add_argument("--session-key", type=int, help="poll the API for this session instead of files")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between polls")
+    parser.add_argument("--iterations", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.session_key is not None:
+        http = make_session()
+        feeds = {table: HttpFeed(http, table, args.session_key, args.base_url) for table in LIVE_TABLES}
+    else:
+        feeds = {table: CsvTail(os.path.join(args.data_dir, TABLE_FILES[table]), table) for table in LIVE_TABLES}
+
+    try:
+        run(feeds, poll_interval=args.interval, iterations=args.iterations, on_snapshot=print_snapshot)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,92 +1,52 @@
-import pandas as pd
+import argparse
 
-# I am not using it for the analysis
-
-print("Starting the data processing script...")
-
-
-print("Loading datasets...")
-drivers_df = pd.read_csv("driver_data.csv")
-intervals_df = pd.read_csv("interval_data.csv")
-laps_df = pd.read_csv("lap_data.csv")
-pit_df = pd.read_csv("pit_stop_data.csv")
-race_control_df = pd.read_csv("race_control_data.csv")
-stints_df = pd.read_csv("stints_data.csv")
-weather_df = pd.read_csv("weather_data.csv")
-print("Datasets loaded successfully.")
-
-
-dataset_names = ["Drivers", "Intervals", "Laps", "Pit", "Race Control", "Stints", "Weather"]
-
-# Remove duplicates
-print("Removing duplicates...")
-datasets = [drivers_df, intervals_df, laps_df, pit_df, race_control_df, stints_df, weather_df]
-for df, name in zip(datasets, dataset_names):
-    initial_count = len(df)
-    df.drop_duplicates(inplace=True)
-    print(f"Removed {initial_count - len(df)} duplicates from {name}.")
-print("Duplicates removed.")
+from data_loader import DATA_DIR, memory_report
+from instrument import add_arguments, configure_from_args, span
+from lap_merge import session_dirs, write_merged
 
-# Handle missing values (example: fill with mean for numerical columns)
-print("Handling missing values...")
-for df, name in zip(datasets, dataset_names):
-    numeric_cols = df.select_dtypes(include=[float, int]).columns
-    for col in numeric_cols:
-        missing_count = df[col].isna().sum()
-        df[col] = df[col].fillna(df[col].mean())
-        print(f"Filled {missing_count} missing values in {col} of {name}.")
-print("Missing values handled.")
-
-# Convert date columns to datetime
-print("Converting date columns to datetime...")
-for df, name in zip(datasets, dataset_names):
-    if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
-        print(f"Converted date column in {name}.")
-print("Date columns converted.")
-
-# Convert relevant columns to integers
-print("Converting relevant columns to integers...")
-int_cols = ['driver_number', 'session_key', 'meeting_key', 'lap_number']
-for df, name in zip(datasets, dataset_names):
-    for col in int_cols:
-        if col in df.columns:
-            df[col] = df[col].apply(lambda x: int(x) if pd.notnull(x) and x.is_integer() else pd.NA)
-            df[col] = df[col].astype(pd.Int64Dtype())
-            print(f"Converted {col} to integers in {name}.")
-print("Relevant columns converted to integers.")
-
-# Print info to check data types and missing values
-print("Checking data types and missing values...")
-for df, name in zip(datasets, dataset_names):
-    print(f"{name} DataFrame Info:\n", df.info(), "\n")
-print("Data types and missing values checked.")
-
-# Merge datasets using common keys
-print("Merging datasets...")
-merged_df = laps_df.merge(drivers_df, on=['driver_number', 'session_key', 'meeting_key'], how='left')
-print("Merged laps and drivers data.")
-merged_df = merged_df.merge(intervals_df, on=['driver_number', 'session_key', 'meeting_key'], how='left')
-print("Merged intervals data.")
-merged_df = merged_df.merge(pit_df, on=['driver_number', 'session_key', 'meeting_key', 'lap_number'], how='left')
-print("Merged pit stop data.")
-merged_df = merged_df.merge(race_control_df, on=['driver_number', 'session_key', 'meeting_key', 'lap_number'], how='left')
-print("Merged race control data.")
-merged_df = merged_df.merge(stints_df, on=['driver_number', 'session_key', 'meeting_key'], how='left')
-print("Merged stints data.")
-merged_df = merged_df.merge(weather_df, on=['session_key', 'meeting_key', 'date'], how='left')
-print("Merged weather data.")
-
-# Check the merged DataFrame
-print("Checking merged DataFrame...")
-print("Merged DataFrame Info:\n", merged_df.info(), "\n")
-print("Merged DataFrame Head:\n", merged_df.head(), "\n")
-print("Merged DataFrame checked.")
-
-# Save the cleaned and merged DataFrame to a CSV file
-print("Saving merged DataFrame to CSV...")
-merged_df.to_csv("merged_data.csv", index=False)
-print("Merged DataFrame saved to merged_data.csv.")
+# I am not using it for the analysis
 
 
-print("Script completed successfully.")
+def clean_tables(tables):
+    # Remove duplicates
+    for name, df in tables.items():
+        initial_count = len(df)
+        df = df.drop_duplicates()
+        print(f"Removed {initial_count - len(df)} duplicates from {name}.")
+
+        # Handle missing values (example: fill with mean for measured columns).
+        # Keys and counters are nullable integers from the schema and are left alone.
+        float_cols = df.select_dtypes(include='floating').columns
+        for col in float_cols:
+            missing_count = df[col].isna().sum()
+            if missing_count:
+                df[col] = df[col].fillna(df[col].mean())
+                print(f"Filled {missing_count} missing values in {col} of {name}.")
+
+        tables[name] = df
+    return tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge all tables into one row per lap.")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="a data directory or a directory of session directories")
+    parser.add_argument("--out", default="merged_data.parquet")
+    parser.add_argument("--stream-intervals", action="store_true",
+                        help="aggregate interval_data per lap in chunks instead of loading it whole")
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args)
+
+    def report(tables):
+        with span("report:memory"):
+            print(memory_report(tables).to_string(index=False))
+
+    # Merge datasets one session at a time and stream them to disk
+    with span("merge:all") as s:
+        rows = s.output(write_merged(session_dirs(args.data_dir), args.out, prepare=clean_tables,
+                                     stream_intervals=args.stream_intervals, loaded=report))
+    print(f"Merged DataFrame saved to {args.out} ({rows} laps).")
+
+
+if __name__ == "__main__":
+    main()
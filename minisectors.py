@@ -0,0 +1,105 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Mini-sector segments from lap_data.csv.
+#
+# segments_sector_1/2/3 hold stringified lists of segment status codes, e.g.
+# "[2049, 2051, None, 2049]". They are parsed once, column by column, into a
+# single (laps x segments) int16 array. Each sector gets a fixed block of
+# columns as wide as its longest list; shorter lists are padded with PAD, and
+# "None" entries become 0 (OpenF1's "not available" code). Rows are sorted by
+# (driver_number, lap_number) so lookups are a searchsorted on a packed key.
+
+SECTOR_COLUMNS = ['segments_sector_1', 'segments_sector_2', 'segments_sector_3']
+PAD = -1
+
+SEGMENT_CODES = {
+    0: "unavailable",
+    2048: "yellow",
+    2049: "green",
+    2051: "purple",
+    2064: "pitlane",
+}
+
+
+def _lap_key(driver_number, lap_number):
+    return np.asarray(driver_number, dtype=np.int64) * 1000 + np.asarray(lap_number, dtype=np.int64)
+
+
+def parse_segments(values):
+    """Parse a column of stringified segment lists into a padded int16 array."""
+    parts = values.fillna('').str.strip('[] ').str.split(',', expand=True)
+    parts = parts.apply(lambda col: col.str.strip())
+    codes = parts.replace({'None': '0', '': None})
+    return codes.apply(pd.to_numeric).fillna(PAD).to_numpy(dtype=np.int16)
+
+
+class MiniSectors:
+    def __init__(self, segments, driver_number, lap_number, sector_widths):
+        self.segments = segments
+        self.driver_number = driver_number
+        self.lap_number = lap_number
+        self.sector_widths = list(sector_widths)
+        self._keys = _lap_key(driver_number, lap_number)
+
+    @classmethod
+    def from_laps(cls, laps_df):
+        laps = laps_df.dropna(subset=['driver_number', 'lap_number'])
+        laps = laps.sort_values(['driver_number', 'lap_number'])
+        blocks = [parse_segments(laps[col]) for col in SECTOR_COLUMNS]
+        segments = np.hstack(blocks) if blocks else np.empty((len(laps), 0), dtype=np.int16)
+        return cls(segments,
+                   laps['driver_number'].to_numpy(dtype=np.int16),
+                   laps['lap_number'].to_numpy(dtype=np.int16),
+                   [block.shape[1] for block in blocks])
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "segments.npy"), self.segments)
+        np.save(os.path.join(path, "driver_number.npy"), self.driver_number)
+        np.save(os.path.join(path, "lap_number.npy"), self.lap_number)
+        with open(os.path.join(path, "meta.json"), "w") as file:
+            json.dump({"sector_widths": self.sector_widths}, file)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        mmap_mode = 'r' if mmap else None
+        with open(os.path.join(path, "meta.json")) as file:
+            meta = json.load(file)
+        return cls(np.load(os.path.join(path, "segments.npy"), mmap_mode=mmap_mode),
+                   np.load(os.path.join(path, "driver_number.npy")),
+                   np.load(os.path.join(path, "lap_number.npy")),
+                   meta["sector_widths"])
+
+    def sector(self, number):
+        """Return the column block of one sector (1, 2 or 3)."""
+        start = sum(self.sector_widths[:number - 1])
+        return self.segments[:, start:start + self.sector_widths[number - 1]]
+
+    def rows(self, driver_number, lap_number):
+        """Row indices for arrays of (driver_number, lap_number); -1 where the lap is unknown."""
+        keys = _lap_key(driver_number, lap_number)
+        idx = np.searchsorted(self._keys, keys)
+        idx = np.clip(idx, 0, len(self._keys) - 1)
+        return np.where(self._keys[idx] == keys, idx, -1)
+
+    def segment_counts(self):
+        """Count segments of every status per driver (purple, green, yellow, ...)."""
+        codes = np.array(sorted(SEGMENT_CODES))
+        drivers, driver_idx = np.unique(self.driver_number, return_inverse=True)
+        code_idx = np.searchsorted(codes, self.segments)
+        known = (code_idx < len(codes)) & (codes[np.minimum(code_idx, len(codes) - 1)] == self.segments)
+
+        rows = np.broadcast_to(driver_idx[:, None], self.segments.shape)[known]
+        counts = np.bincount(rows * len(codes) + code_idx[known], minlength=len(drivers) * len(codes))
+        counts = counts.reshape(len(drivers), len(codes))
+        return pd.DataFrame(counts, index=pd.Index(drivers, name='driver_number'),
+                            columns=[SEGMENT_CODES[code] for code in codes])
+
+    def lap_heatmap(self, driver_number):
+        """Return one driver's laps x segments codes, indexed by lap_number."""
+        start, end = np.searchsorted(self.driver_number, [driver_number, driver_number + 1])
+        return pd.DataFrame(self.segments[start:end], index=pd.Index(self.lap_number[start:end], name='lap_number'))
@@ -0,0 +1,246 @@
+import pandas as pd
+
+from alignment import TimeSeries, attach_weather
+from data_loader import DATA_DIR, TABLE_FILES, load_table, table_digest
+from degradation import degradation_laps, degradation_residuals, fit_degradation
+from instrument import span
+from incident_windows import incident_laps, incident_windows, time_lost_by_driver, time_lost_by_window
+from pit_strategy import pit_losses, undercuts
+from position_timeline import PositionTimeline
+from race_control_events import parse_race_control
+from race_time import race_starts, reconstruct_race_time, validate_gaps
+from stats import downsample, summarize
+from stint_laps import assign_stints
+from table_cache import DerivedCache, frame_digest, table_key
+
+# Source and derived tables shared by all analyses.
+#
+# Every table is a node with the names of the tables it is built from and a
+# builder that takes those tables as arguments. A TableStore builds each node
+# at most once per data directory, so analyses that run together share their
+# inputs instead of reloading and re-deriving them. Derived tables are also
+# kept on disk between runs (see table_cache.py): a table is only built again
+# when one of the CSVs, parameters or builders upstream of it changed, and a
+# table read back from disk does not need its inputs at all. Nothing here
+# imports the plotting stack.
+#
+# Per-driver tables are keyed on (session_key, driver_number), so a data
+# directory may hold any number of sessions and no merge pairs a driver's rows
+# from different sessions.
+
+DRIVER_KEYS = ['session_key', 'driver_number']
+
+
+def build_driver_names(drivers):
+    return drivers[DRIVER_KEYS + ['full_name', 'team_name']].drop_duplicates(subset=DRIVER_KEYS)
+
+
+def build_laps_with_names(laps, driver_names):
+    # Merge laps data with drivers data to get driver names
+    return laps.merge(driver_names[DRIVER_KEYS + ['full_name']], on=DRIVER_KEYS, how='left')
+
+
+def build_avg_lap_times(laps):
+    # Calculate average lap time for each driver
+    avg_lap_times = laps.groupby(DRIVER_KEYS, observed=True)['lap_duration'].mean().reset_index()
+    avg_lap_times.columns = DRIVER_KEYS + ['avg_lap_duration']
+    return avg_lap_times
+
+
+def build_driver_performance(avg_lap_times, final_positions, driver_names):
+    # Merging average lap times with final race positions and driver names
+    final_positions = final_positions.merge(driver_names[DRIVER_KEYS + ['full_name']], on=DRIVER_KEYS)
+    return avg_lap_times.merge(final_positions[DRIVER_KEYS + ['final_position', 'full_name']], on=DRIVER_KEYS)
+
+
+def build_performance_comparison(final_positions, starting_positions, driver_names):
+    final_positions = final_positions.merge(driver_names[DRIVER_KEYS + ['full_name']], on=DRIVER_KEYS)
+
+    # Merge qualifying data with final positions
+    performance_comparison = final_positions.merge(starting_positions[DRIVER_KEYS + ['starting_position']], on=DRIVER_KEYS)
+
+    # Calculate position changes
+    performance_comparison['position_change'] = performance_comparison['starting_position'] - performance_comparison['final_position']
+    return performance_comparison
+
+
+def build_pit_stop_analysis(pit, final_positions, driver_names):
+    # Calculate the number of pit stops and the average pit stop duration per driver
+    pit_stops_per_driver = pit.groupby(DRIVER_KEYS, observed=True).size().reset_index(name='num_pit_stops')
+    avg_pit_duration_per_driver = pit.groupby(DRIVER_KEYS, observed=True)['pit_duration'].mean().reset_index(name='avg_pit_duration')
+
+    # Merge pit stop data with final positions and driver names
+    pit_stop_analysis = final_positions.merge(pit_stops_per_driver, on=DRIVER_KEYS).merge(avg_pit_duration_per_driver, on=DRIVER_KEYS)
+    return pit_stop_analysis.merge(driver_names, on=DRIVER_KEYS)
+
+
+def build_laps_with_pit_stops(laps, pit):
+    # Merge laps data with pit stop data
+    merged_laps_pits = laps.merge(pit[DRIVER_KEYS + ['lap_number', 'pit_duration']], on=DRIVER_KEYS + ['lap_number'], how='left')
+    merged_laps_pits['pit_stop'] = ~merged_laps_pits['pit_duration'].isna()
+    return merged_laps_pits
+
+
+def build_stints_with_names(stints, driver_names):
+    # Merge stints data with drivers data to get driver names
+    return stints.merge(driver_names[DRIVER_KEYS + ['full_name']], on=DRIVER_KEYS)
+
+
+def build_detailed_laps(laps, stints, driver_names):
+    # Merge stints data with laps data to analyze performance drop-off
+    detailed_laps = assign_stints(laps, stints).dropna(subset=['compound'])
+    return detailed_laps.merge(driver_names[DRIVER_KEYS + ['full_name']], on=DRIVER_KEYS)
+
+
+def build_laps_with_weather(laps, weather_series):
+    laps = laps.dropna(subset=['date_start'])  # Drop rows with null date_start
+
+    # Weather of the lap's own session at the start of the lap
+    return attach_weather(laps, 'date_start', weather_series)
+
+
+def build_incidents_with_weather(race_control, weather_series):
+    # Match each race control message with the weather of its session at that time
+    return attach_weather(race_control, 'date', weather_series)
+
+
+def build_lap_time_by_driver(laps_with_names):
+    return summarize(laps_with_names, ['full_name', 'lap_number'], 'lap_duration')
+
+
+def build_lap_time_by_pit_stop(laps_with_pit_stops):
+    return summarize(laps_with_pit_stops, ['pit_stop', 'lap_number'], 'lap_duration')
+
+
+def build_lap_time_by_compound(detailed_laps):
+    return summarize(detailed_laps, ['compound', 'full_name', 'lap_number'], 'lap_duration')
+
+
+def build_weather_trace(laps_with_weather):
+    # A few hundred representative points per weather channel, in long format
+    traces = []
+    for channel in ['track_temperature', 'air_temperature', 'humidity', 'wind_speed']:
+        points = downsample(laps_with_weather, 'date_start', channel)
+        traces.append(points[['date_start', channel]].rename(columns={channel: 'value'}).assign(channel=channel))
+    return pd.concat(traces, ignore_index=True)
+
+
+# name -> (input tables, builder)
+NODES = {
+    "position_timeline": (["ranking"], PositionTimeline),
+    "weather_series": (["weather"], TimeSeries),
+    "final_positions": (["position_timeline"], lambda timeline: timeline.final_positions()),
+    "starting_positions": (["position_timeline"], lambda timeline: timeline.starting_positions()),
+    "driver_names": (["drivers"], build_driver_names),
+    "laps_with_names": (["laps", "driver_names"], build_laps_with_names),
+    "avg_lap_times": (["laps"], build_avg_lap_times),
+    "driver_performance": (["avg_lap_times", "final_positions", "driver_names"], build_driver_performance),
+    "performance_comparison": (["final_positions", "starting_positions", "driver_names"], build_performance_comparison),
+    "pit_stop_analysis": (["pit", "final_positions", "driver_names"], build_pit_stop_analysis),
+    "laps_with_pit_stops": (["laps", "pit"], build_laps_with_pit_stops),
+    "stints_with_names": (["stints", "driver_names"], build_stints_with_names),
+    "detailed_laps": (["laps", "stints", "driver_names"], build_detailed_laps),
+    "laps_with_weather": (["laps", "weather_series"], build_laps_with_weather),
+    "incidents_with_weather": (["race_control", "weather_series"], build_incidents_with_weather),
+    "lap_time_by_driver": (["laps_with_names"], build_lap_time_by_driver),
+    "lap_time_by_pit_stop": (["laps_with_pit_stops"], build_lap_time_by_pit_stop),
+    "lap_time_by_compound": (["detailed_laps"], build_lap_time_by_compound),
+    "weather_trace": (["laps_with_weather"], build_weather_trace),
+    "degradation_laps": (["laps", "stints", "pit"], degradation_laps),
+    "degradation_fits": (["degradation_laps"], fit_degradation),
+    "degradation_residuals": (["degradation_laps", "degradation_fits"], degradation_residuals),
+    "race_control_events": (["race_control"], parse_race_control),
+    "incident_windows": (["race_control_events"], incident_windows),
+    "incident_laps": (["laps", "incident_windows", "pit"], incident_laps),
+    "time_lost_by_window": (["incident_windows", "incident_laps"], time_lost_by_window),
+    "time_lost_by_driver": (["incident_laps"], time_lost_by_driver),
+    "pit_losses": (["laps", "pit", "degradation_laps", "incident_windows"], pit_losses),
+    "undercuts": (["pit_losses", "race_times", "intervals"], undercuts),
+    "race_starts": (["laps", "race_control"], race_starts),
+    "race_times": (["laps", "race_starts"], reconstruct_race_time),
+    "gap_check": (["race_times", "intervals"], validate_gaps),
+}
+for _table in TABLE_FILES:
+    NODES[_table] = ([], None)
+
+
+def plan(names):
+    """Return every node needed for names, each after the nodes it depends on."""
+    order = []
+    visiting = set()
+
+    def visit(name):
+        if name in order:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle at table {name!r}")
+        visiting.add(name)
+        for dep in NODES[name][0]:
+            visit(dep)
+        visiting.discard(name)
+        order.append(name)
+
+    for name in names:
+        visit(name)
+    return order
+
+
+class TableStore:
+    """Builds source and derived tables for one data directory, each at most once.
+
+    tables can hold source tables that are already loaded (e.g. one session
+    of a larger directory); they are used instead of reading data_dir.
+    params maps table names to keyword arguments for their builders, e.g.
+    {"degradation_laps": {"fuel_effect": 0.05}}. cache is a DerivedCache,
+    True for the one in data_dir, or False to build everything in memory.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, tables=None, params=None, cache=True):
+        self.data_dir = data_dir
+        self.tables = dict(tables or {})
+        self.params = params or {}
+        self.cache = DerivedCache.for_data_dir(data_dir) if cache is True else cache or None
+        self._keys = {name: frame_digest(table) for name, table in self.tables.items()}
+
+    def key(self, name):
+        """Return the cache key of a table: a hash of everything it is built from."""
+        if name not in self._keys:
+            deps, builder = NODES[name]
+            if builder is None:
+                self._keys[name] = table_digest(name, self.data_dir)
+            else:
+                self._keys[name] = table_key(name, self.params.get(name, {}), [self.key(dep) for dep in deps],
+                                             builder)
+        return self._keys[name]
+
+    def _build(self, name):
+        deps, builder = NODES[name]
+        if builder is None:
+            # load_table has its own span
+            return load_table(name, self.data_dir)
+        key = self.key(name) if self.cache is not None else None
+        if key is not None:
+            cached = self.cache.get(name, key)
+            if cached is not None:
+                return cached
+        inputs = [self._get(dep) for dep in deps]
+        with span(f"build:{name}", rows_in=inputs) as s:
+            table = s.output(builder(*inputs, **self.params.get(name, {})))
+        if key is not None:
+            self.cache.put(name, key, table)
+        return table
+
+    def _get(self, name):
+        if name not in self.tables:
+            self.tables[name] = self._build(name)
+        return self.tables[name]
+
+    def build(self, names):
+        plan(names)  # fails early on a dependency cycle
+        return [self._get(name) for name in names]
+
+    def get(self, name):
+        return self.build([name])[0]
+
+    def __getitem__(self, name):
+        return self.get(name)
@@ -0,0 +1,214 @@
+import numpy as np
+import pandas as pd
+
+from alignment import TimeSeries
+from incident_windows import IncidentWindows
+from instrument import span
+from race_time import GAP_TOLERANCE
+
+# Time lost in the pits, and undercut / overcut attempts between adjacent cars.
+#
+# A stop's loss is its in-lap plus its out-lap minus twice the driver's pace
+# around the stop: the median of their REFERENCE_LAPS nearest green-flag laps
+# on each side (see degradation.degradation_laps). Those laps are found for
+# every stop at once with searchsorted on (driver, lap) codes, as in
+# alignment.TimeSeries. Stops made while a safety car, VSC or red flag window
+# was open are marked (neutralised). The whole field is slow then, so their
+# in- and out-lap are measured against the median lap of the cars that did
+# not stop on those laps instead, and their loss is missing without them.
+#
+# Every stop is paired with the car directly ahead and the car directly
+# behind at the lap line before it, when that car stopped on a later lap, at
+# most MAX_LAPS_APART laps afterwards (cars stopping on the same lap are
+# queueing in the pit lane, not attacking each other). The car behind is the
+# attacker: stopping first is an undercut attempt, stopping second an overcut
+# attempt, and only pairs within MAX_GAP seconds before the first stop count.
+# Attempts where either stop was made under a safety car, VSC or red flag
+# are flagged (neutralised), as the rest of the field was slowed too. Their
+# gap from interval_data (difference of the gaps to the leader) is compared
+# at the attacker's lap line before the first stop and after the second
+# stop's out-lap (the reconstructed gap at the line when the feed has no
+# sample), and the attempt worked if the attacker came out ahead on the
+# reconstructed race time.
+
+REFERENCE_LAPS = 3
+MAX_LAPS_APART = 5
+MAX_GAP = 5.0  # seconds between the cars before the first stop, beyond which no attempt is possible
+NEUTRALISED = ['safety_car', 'virtual_safety_car', 'red_flag']
+
+
+def _stops(pit):
+    stops = pit.dropna(subset=['session_key', 'driver_number', 'lap_number', 'date']).copy()
+    for col in ('session_key', 'driver_number', 'lap_number'):
+        stops[col] = stops[col].astype('int64')
+    return stops.sort_values(['session_key', 'date'], kind='stable', ignore_index=True)
+
+
+def _reference_pace(stops, green, n=REFERENCE_LAPS):
+    """Median lap time of the n green laps before each stop's in-lap and the n after its out-lap."""
+    by = ['session_key', 'driver_number']
+    green = green.dropna(subset=['lap_duration']).sort_values(by + ['lap_number'], kind='stable')
+    keys = pd.MultiIndex.from_frame(green[by].astype('int64'))
+    groups = keys.unique()
+    group_ids = groups.get_indexer(keys)
+    laps = green['lap_number'].to_numpy(dtype='int64')
+    stride = int(laps.max(initial=0)) + 3
+    codes = group_ids * stride + laps
+
+    stop_groups = groups.get_indexer(pd.MultiIndex.from_frame(stops[by]))
+    base = np.where(stop_groups >= 0, stop_groups, 0) * stride
+    before = np.searchsorted(codes, base + stops['lap_number'].to_numpy(), 'left')
+    after = np.searchsorted(codes, base + stops['lap_number'].to_numpy() + 2, 'left')
+
+    # n candidates on each side, kept if they belong to the same driver
+    offsets = np.concatenate([np.arange(-n, 0), np.arange(n)])
+    positions = np.concatenate([before[:, None] + offsets[:n], after[:, None] + offsets[n:]], axis=1)
+    stop_idx = np.repeat(np.arange(len(stops)), 2 * n)
+    positions = positions.ravel()
+    inside = (positions >= 0) & (positions < len(codes))
+    positions = np.where(inside, positions, 0)
+    keep = inside & (group_ids[positions] == stop_groups[stop_idx]) & (stop_groups[stop_idx] >= 0)
+
+    durations = pd.Series(green['lap_duration'].to_numpy(dtype='float64')[positions[keep]])
+    pace = durations.groupby(stop_idx[keep]).median()
+    return pace.reindex(np.arange(len(stops))).to_numpy()
+
+
+def _field_pace(lap_times, stops, laps):
+    """Median lap time of the cars that neither came in nor went out on each (session, lap) of laps."""
+    pitting = pd.MultiIndex.from_arrays([
+        np.concatenate([stops['session_key'], stops['session_key']]),
+        np.concatenate([stops['driver_number'], stops['driver_number']]),
+        np.concatenate([stops['lap_number'], stops['lap_number'] + 1])])
+    running = lap_times[~lap_times.index.isin(pitting)]
+    field = running.groupby(level=['session_key', 'lap_number']).median()
+    return field.reindex(laps).to_numpy(dtype='float64')
+
+
+def pit_losses(laps, pit, green_laps, windows=None):
+    """Return every stop with its in- and out-lap, reference pace and the time it lost.
+
+    green_laps are the laps the pace is taken from (degradation_laps);
+    windows, if given, the incident windows used to flag stops made under a
+    safety car, VSC or red flag (neutralised). A neutralised stop's pit_loss
+    is taken against field_in_lap and field_out_lap, the median laps of the
+    cars that did not stop, rather than against its reference_pace.
+    """
+    with span("build:pit_losses", rows_in=pit) as s:
+        stops = _stops(pit)
+        lap_times = laps.dropna(subset=['lap_duration']).astype({'session_key': 'int64', 'driver_number': 'int64',
+                                                                 'lap_number': 'int64'})
+        lap_times = lap_times.set_index(['session_key', 'driver_number', 'lap_number'])['lap_duration']
+        lap_times = lap_times[~lap_times.index.duplicated()]
+        in_laps = pd.MultiIndex.from_frame(stops[['session_key', 'driver_number', 'lap_number']])
+        out_laps = pd.MultiIndex.from_arrays([stops['session_key'], stops['driver_number'], stops['lap_number'] + 1])
+
+        stops['in_lap'] = lap_times.reindex(in_laps).to_numpy(dtype='float64')
+        stops['out_lap'] = lap_times.reindex(out_laps).to_numpy(dtype='float64')
+        stops['reference_pace'] = _reference_pace(stops, green_laps)
+
+        stops['neutralised'] = pd.Series(pd.NA, index=stops.index, dtype=object)
+        if windows is not None and len(windows):
+            index = IncidentWindows(windows[windows['kind'].isin(NEUTRALISED)])
+            lane = stops.assign(_end=stops['date'] + pd.to_timedelta(stops['pit_duration'].astype('float64')
+                                                                     .fillna(0.0), unit='s'))
+            pairs = index.overlaps(lane, 'date', '_end').drop_duplicates('span')
+            stops.loc[pairs['span'].to_numpy(), 'neutralised'] = (
+                index.windows['kind'].astype(object).to_numpy()[pairs['window'].to_numpy()])
+        stops['neutralised'] = stops['neutralised'].astype(pd.CategoricalDtype(NEUTRALISED))
+
+        stops['field_in_lap'] = _field_pace(lap_times, stops, pd.MultiIndex.from_arrays(
+            [stops['session_key'], stops['lap_number']]))
+        stops['field_out_lap'] = _field_pace(lap_times, stops, pd.MultiIndex.from_arrays(
+            [stops['session_key'], stops['lap_number'] + 1]))
+        green_loss = stops['in_lap'] + stops['out_lap'] - 2 * stops['reference_pace']
+        field_loss = stops['in_lap'] - stops['field_in_lap'] + stops['out_lap'] - stops['field_out_lap']
+        stops['pit_loss'] = green_loss.where(stops['neutralised'].isna(), field_loss)
+        return s.output(stops)
+
+
+def _at_line(race_times, session_keys, drivers, laps, columns):
+    keys = pd.MultiIndex.from_arrays([session_keys, drivers, laps])
+    table = race_times.astype({'session_key': 'int64', 'driver_number': 'int64', 'lap_number': 'int64'})
+    table = table.set_index(['session_key', 'driver_number', 'lap_number'])[columns]
+    return table.reindex(keys).reset_index(drop=True)
+
+
+def undercuts(pit, race_times, intervals, max_laps_apart=MAX_LAPS_APART, max_gap=MAX_GAP,
+              tolerance=GAP_TOLERANCE):
+    """Return the undercut and overcut attempts between adjacent cars.
+
+    An attempt is a pair of cars at most max_gap seconds apart that stopped
+    on different laps, at most max_laps_apart laps apart. pit is the pit table or, to flag stops made under a safety car, VSC or
+    red flag, pit_losses. One row per pair with the attacker (the car behind
+    before the stops), the defender, both in-laps, kind ('undercut' if the
+    attacker stopped first, otherwise 'overcut'), gap_before and gap_after
+    (seconds the attacker was behind, from interval_data or else from race
+    time), gained (gap_before - gap_after), success (attacker ahead on race
+    time after both stops) and neutralised (either stop was neutralised).
+    """
+    with span("build:undercuts", rows_in=[pit, race_times]) as s:
+        stops = _stops(pit)
+        stops['neutralised'] = stops['neutralised'].notna() if 'neutralised' in stops else False
+        stops = stops[['session_key', 'driver_number', 'lap_number', 'date', 'neutralised']]
+        stops['position'] = _at_line(race_times, stops['session_key'], stops['driver_number'],
+                                     stops['lap_number'] - 1, ['position'])['position'].to_numpy(dtype='float64')
+        stops = stops.dropna(subset=['position'])
+
+        # The cars directly ahead of and behind each stopping car at the line before its stop
+        order = race_times.dropna(subset=['position']).astype(
+            {'session_key': 'int64', 'lap_number': 'int64', 'driver_number': 'int64', 'position': 'int64'})
+        order = order[['session_key', 'lap_number', 'position', 'driver_number']]
+        neighbours = []
+        for offset in (-1, 1):
+            near = stops.assign(lap_number=stops['lap_number'] - 1,
+                                position=stops['position'].astype('int64') + offset)
+            near = near.merge(order.rename(columns={'driver_number': 'rival'}),
+                              on=['session_key', 'lap_number', 'position'])
+            neighbours.append(near.assign(lap_number=near['lap_number'] + 1, rival_behind=offset == 1))
+        pairs = pd.concat(neighbours, ignore_index=True)
+
+        # The rival's next stop after this one, if close enough
+        rival_stops = stops.rename(columns={'driver_number': 'rival', 'lap_number': 'rival_lap',
+                                            'date': 'rival_date', 'neutralised': 'rival_neutralised'})
+        pairs = pairs.merge(rival_stops, on=['session_key', 'rival'])
+        pairs = pairs[(pairs['rival_lap'] > pairs['lap_number'])
+                      & (pairs['rival_lap'] - pairs['lap_number'] <= max_laps_apart)]
+        pairs = pairs.sort_values('rival_date', kind='stable').drop_duplicates(
+            ['session_key', 'driver_number', 'lap_number', 'rival'])
+
+        first_is_attacker = ~pairs['rival_behind']  # the rival was ahead
+        result = pd.DataFrame({
+            'session_key': pairs['session_key'].to_numpy(),
+            'attacker': np.where(first_is_attacker, pairs['driver_number'], pairs['rival']),
+            'defender': np.where(first_is_attacker, pairs['rival'], pairs['driver_number']),
+            'attacker_lap': np.where(first_is_attacker, pairs['lap_number'], pairs['rival_lap']),
+            'defender_lap': np.where(first_is_attacker, pairs['rival_lap'], pairs['lap_number']),
+            'kind': np.where(first_is_attacker, 'undercut', 'overcut'),
+            'neutralised': (pairs['neutralised'] | pairs['rival_neutralised']).to_numpy(dtype=bool),
+        })
+        result['kind'] = pd.Categorical(result['kind'], categories=['undercut', 'overcut'])
+        first_lap = np.minimum(result['attacker_lap'], result['defender_lap'])
+        last_lap = np.maximum(result['attacker_lap'], result['defender_lap'])
+
+        # Gaps at the attacker's lap lines before the first stop and after the last out-lap
+        feed = TimeSeries(intervals[['session_key', 'driver_number', 'date', 'gap_to_leader']], 'date',
+                          ['session_key', 'driver_number'])
+        for name, lap in (('before', first_lap - 1), ('after', last_lap + 1)):
+            line = _at_line(race_times, result['session_key'], result['attacker'], lap, ['line_time', 'race_time'])
+            defender = _at_line(race_times, result['session_key'], result['defender'], lap, ['race_time'])
+            gaps = []
+            for driver in ('attacker', 'defender'):
+                query = pd.DataFrame({'session_key': result['session_key'], 'driver_number': result[driver],
+                                      'line_time': line['line_time']})
+                gap = feed.asof(query, 'line_time', ['gap_to_leader'], direction='nearest', tolerance=tolerance)
+                gaps.append(gap['gap_to_leader'].astype('float64').to_numpy())
+            # Without feed samples (e.g. for the leader) fall back to the gap at the line
+            line_gap = (line['race_time'] - defender['race_time']).to_numpy(dtype='float64')
+            result[f'gap_{name}'] = np.where(np.isnan(gaps[0] - gaps[1]), line_gap, gaps[0] - gaps[1])
+            if name == 'after':
+                result['success'] = pd.Series(line_gap < 0).where(~np.isnan(line_gap))
+        result['gained'] = result['gap_before'] - result['gap_after']
+        result['success'] = result['success'].astype('boolean')
+        result = result[result['gap_before'] <= max_gap]
+        return s.output(result.sort_values(['session_key', 'attacker_lap'], kind='stable', ignore_index=True))
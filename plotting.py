@@ -0,0 +1,92 @@
+import matplotlib.dates as mdates
+import numpy as np
+import pandas as pd
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+
+# Batched drawing helpers shared by the analysis scripts.
+#
+# A table is sorted by its group column once and cut at the group
+# boundaries, instead of being filtered once per driver. All groups are then
+# drawn as one collection (a LineCollection for lines, a single scatter
+# PathCollection for markers) with a color per group, and legend entries are
+# lightweight proxy artists. Point labels are placed from plain arrays in one
+# call instead of going through iterrows().
+
+
+def split_groups(df, by, order=None):
+    """Return [(key, rows)] for every value of by, from a single stable sort.
+
+    order, if given, is an extra column to sort by within each group (e.g. x).
+    """
+    columns = [by] + ([order] if order else [])
+    df = df.sort_values(columns, kind='stable')
+    keys = df[by].to_numpy()
+    if not len(keys):
+        return []
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    ends = np.append(starts[1:], len(df))
+    return [(keys[start], df.iloc[start:end]) for start, end in zip(starts, ends)]
+
+
+def group_colors(keys, cmap='tab20'):
+    """Map each key to a color of cmap, in the order given."""
+    import matplotlib.pyplot as plt
+    keys = list(dict.fromkeys(keys))
+    colors = plt.get_cmap(cmap, max(len(keys), 1))(np.arange(len(keys)))
+    return dict(zip(keys, colors))
+
+
+def _numeric(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return mdates.date2num(pd.DatetimeIndex(values).tz_localize(None)), True
+    return np.asarray(values, dtype='float64'), False
+
+
+def draw_groups(ax, df, x, y, by, colors=None, kind='line', label=True, **kwargs):
+    """Draw y over x for every group of by as one collection and return the legend proxies.
+
+    kind is 'line' (a LineCollection, one polyline per group) or 'scatter'
+    (one scatter call, one color per group). colors maps group keys to
+    colors; by default the groups get tab20 colors in sorted order.
+    """
+    df = df.dropna(subset=[x, y])
+    groups = split_groups(df, by, order=x if kind == 'line' else None)
+    if colors is None:
+        colors = group_colors([key for key, _ in groups])
+
+    is_date = False
+    if kind == 'line':
+        segments = []
+        for _, rows in groups:
+            xs, is_date = _numeric(rows[x])
+            segments.append(np.column_stack([xs, rows[y].to_numpy(dtype='float64')]))
+        collection = LineCollection(segments, colors=[colors[key] for key, _ in groups], **kwargs)
+        ax.add_collection(collection)
+        ax.autoscale_view()
+        proxy = {key: Line2D([], [], color=colors[key], **kwargs) for key, _ in groups}
+    elif kind == 'scatter':
+        sorted_rows = pd.concat([rows for _, rows in groups]) if groups else df
+        xs, is_date = _numeric(sorted_rows[x])
+        point_colors = np.concatenate([np.tile(colors[key], (len(rows), 1)) for key, rows in groups]) if groups else None
+        ax.scatter(xs, sorted_rows[y].to_numpy(dtype='float64'), c=point_colors, **kwargs)
+        proxy = {key: Line2D([], [], color=colors[key], linestyle='', marker=kwargs.get('marker', 'o'),
+                             alpha=kwargs.get('alpha')) for key, _ in groups}
+    else:
+        raise ValueError(f"Unknown kind {kind!r}")
+
+    if is_date:
+        ax.xaxis_date()
+    if label:
+        for key, handle in proxy.items():
+            handle.set_label(str(key))
+    return proxy
+
+
+def annotate_points(ax, x, y, labels, **kwargs):
+    """Label every (x, y) point with its text; returns the Text artists."""
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    labels = np.asarray(labels, dtype=str)
+    keep = ~(np.isnan(x) | np.isnan(y))
+    return [ax.text(px, py, text, **kwargs) for px, py, text in zip(x[keep], y[keep], labels[keep])]
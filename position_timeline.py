@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+# Indexed view of ranking_data.csv (OpenF1 /position).
+#
+# The position samples are sorted once by (session_key, driver_number, date)
+# and kept as flat date/position arrays plus the offset of each driver's run,
+# so every query is a binary search inside one driver's slice. Queries take
+# arrays of drivers and times and are answered one driver at a time, with a
+# single searchsorted per driver.
+
+
+class PositionTimeline:
+    def __init__(self, ranking_df):
+        if 'session_key' not in ranking_df.columns:
+            ranking_df = ranking_df.assign(session_key=0)
+        df = ranking_df.dropna(subset=['session_key', 'driver_number', 'date', 'position'])
+        df = df.sort_values(['session_key', 'driver_number', 'date'])
+
+        self.dates = df['date'].to_numpy(dtype='datetime64[ns]').view('int64')
+        self.positions = df['position'].to_numpy(dtype=np.int16)
+
+        groups = df[['session_key', 'driver_number']].drop_duplicates()
+        self.groups = pd.MultiIndex.from_frame(groups.astype('int64'))
+        counts = df.groupby(['session_key', 'driver_number'], sort=True).size().to_numpy()
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    @property
+    def session_keys(self):
+        return self.groups.get_level_values('session_key').unique()
+
+    def _session(self, session_key):
+        if session_key is not None:
+            return session_key
+        if len(self.session_keys) != 1:
+            raise ValueError("session_key is required when the timeline holds several sessions")
+        return self.session_keys[0]
+
+    def _group_index(self, session_key, driver_numbers):
+        keys = pd.MultiIndex.from_arrays([np.full(len(driver_numbers), session_key, dtype='int64'),
+                                          np.asarray(driver_numbers, dtype='int64')])
+        return self.groups.get_indexer(keys)
+
+    def position_at(self, driver_numbers, times, session_key=None):
+        """Position of each driver at the matching time (NaN before a driver's first sample)."""
+        session_key = self._session(session_key)
+        driver_numbers = np.atleast_1d(driver_numbers)
+        times = pd.to_datetime(np.atleast_1d(times), utc=True)
+        times = np.broadcast_to(times.to_numpy(dtype='datetime64[ns]').view('int64'), driver_numbers.shape)
+
+        group_idx = self._group_index(session_key, driver_numbers)
+        result = np.full(len(driver_numbers), np.nan)
+        for g in np.unique(group_idx[group_idx >= 0]):
+            rows = np.flatnonzero(group_idx == g)
+            start, end = self.offsets[g], self.offsets[g + 1]
+            idx = np.searchsorted(self.dates[start:end], times[rows], side='right') - 1
+            found = idx >= 0
+            result[rows[found]] = self.positions[start + idx[found]]
+        return result
+
+    def _edge_positions(self, last, name, session_key=None):
+        ends = self.offsets[1:] - 1 if last else self.offsets[:-1]
+        df = self.groups.to_frame(index=False)
+        df[name] = self.positions[ends]
+        if session_key is not None:
+            df = df[df['session_key'] == session_key]
+        return df.reset_index(drop=True)
+
+    def starting_positions(self, session_key=None):
+        return self._edge_positions(False, 'starting_position', session_key)
+
+    def final_positions(self, session_key=None):
+        return self._edge_positions(True, 'final_position', session_key)
+
+    def snapshot(self, time, session_key=None):
+        """Positions of every driver of a session at one point in time."""
+        session_key = self._session(session_key)
+        drivers = self.groups[self.groups.get_level_values('session_key') == session_key].get_level_values('driver_number')
+        positions = self.position_at(np.asarray(drivers), time, session_key)
+        return pd.DataFrame({'driver_number': drivers, 'position': positions}).sort_values('position', ignore_index=True)
+
+    def positions_at_lap(self, laps_df, lap_number, session_key=None):
+        """Each driver's position when they started lap_number.
+
+        Lap 1 has no start time in OpenF1, so it falls back to the starting grid.
+        Sorted by position, which is Int64 (missing before a driver's first sample).
+        """
+        session_key = self._session(session_key)
+        laps = laps_df[laps_df['lap_number'] == lap_number]
+        if 'session_key' in laps.columns:
+            laps = laps[laps['session_key'] == session_key]
+        laps = laps.dropna(subset=['date_start'])
+        if laps.empty:
+            starts = self.starting_positions(session_key)
+            result = starts[['driver_number', 'starting_position']].rename(columns={'starting_position': 'position'})
+        else:
+            drivers = laps['driver_number'].to_numpy(dtype='int64')
+            result = pd.DataFrame({'driver_number': drivers,
+                                   'position': self.position_at(drivers, laps['date_start'], session_key)})
+        result['position'] = result['position'].astype('Int64')
+        return result.sort_values('position', ignore_index=True)
+
+    def position_changes(self, t0, t1, session_key=None):
+        """Positions gained (positive) or lost between two times, per driver."""
+        before = self.snapshot(t0, session_key).rename(columns={'position': 'position_before'})
+        after = self.snapshot(t1, session_key).rename(columns={'position': 'position_after'})
+        changes = before.merge(after, on='driver_number')
+        changes['positions_gained'] = changes['position_before'] - changes['position_after']
+        return changes
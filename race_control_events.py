@@ -0,0 +1,132 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from instrument import span
+
+# Structured events from the free-text race control messages.
+#
+# Every message is matched against an ordered list of precompiled patterns,
+# one vectorized str.match / str.extract pass per pattern over the messages
+# no earlier pattern claimed. Messages are deduplicated first (DRS, flag and
+# track status messages repeat across laps and sessions), so the patterns
+# only ever see each distinct text once. Messages naming several cars
+# ("INCIDENT INVOLVING CARS 55 (SAI), 77 (BOT) AND 3 (RIC)") become one event
+# per car.
+
+_CAR = r"CAR (?P<driver_number>\d+) \((?P<acronym>[A-Z]{3})\)"
+_CARS = r"CARS? (?P<cars>\d+ \([A-Z]{3}\)(?:(?:, | AND )\d+ \([A-Z]{3}\))*)"
+_CLOCK = r"(?P<clock>\d{2}:\d{2}:\d{2})"
+_REASON = r"(?: - (?P<reason>.+))?"
+_DECISION = (r"(?P<decision>REVIEWED NO FURTHER INVESTIGATION|NO FURTHER ACTION|NO INVESTIGATION NECESSARY"
+             r"|UNDER INVESTIGATION|WILL BE INVESTIGATED AFTER THE RACE|NOTED)")
+
+# (event_type, pattern), tried in order; the first match wins
+PATTERNS = [
+    ("lap_deleted", rf"{_CAR} (?:TIME (?P<lap_time>\d+:\d+\.\d+)|LAP) DELETED - (?P<reason>.+?) AT "
+                    rf"(?:TURN (?P<turn>\d+)|(?P<location>[A-Z ]+?)) LAP (?P<lap>\d+) {_CLOCK}(?P<pit> \(PIT\))?"),
+    ("penalty", rf"FIA STEWARDS: (?P<decision>(?:(?P<penalty_seconds>\d+) SECOND (?:TIME|STOP/GO) |DRIVE THROUGH "
+                rf"|\d+ PLACE GRID )PENALTY) (?:SERVED )?FOR {_CAR}{_REASON}"),
+    ("stewards", rf"FIA STEWARDS: (?:TURN (?P<turn>\d+) )?INCIDENT INVOLVING {_CARS} {_DECISION}{_REASON}"),
+    ("incident", rf"(?:TURN (?P<turn>\d+) )?INCIDENT INVOLVING {_CARS} {_DECISION}{_REASON}"),
+    ("blue_flag", rf"WAVED BLUE FLAG FOR {_CAR} TIMED AT {_CLOCK}"),
+    ("black_and_white_flag", rf"BLACK AND WHITE FLAG FOR {_CAR}{_REASON}"),
+    ("sector_flag", r"(?P<decision>DOUBLE YELLOW|YELLOW|CLEAR) IN TRACK SECTOR (?P<sector>\d+)"),
+    ("track_condition", r"(?P<decision>TRACK SURFACE SLIPPERY|LOW GRIP CONDITIONS|NORMAL GRIP CONDITIONS)"
+                        r"(?: IN TRACK SECTOR (?P<sector>\d+))?"),
+    ("virtual_safety_car", r"(?:VIRTUAL SAFETY CAR|VSC) (?P<decision>DEPLOYED|ENDING)"),
+    ("safety_car", r"SAFETY CAR (?P<decision>DEPLOYED|IN THIS LAP|ENDING)"),
+    ("lapped_cars", r"LAPPED CARS? MAY NOW OVERTAKE THE SAFETY CAR:? (?P<cars>[\d, ]+)"),
+    ("recovery_vehicle", r"RECOVERY VEHICLE ON TRACK(?: AT TURN (?P<turn>\d+))?"),
+    ("red_flag", r"(?P<decision>RED FLAG)"),
+    ("drs", r"DRS (?P<decision>ENABLED|DISABLED)(?: IN ZONE (?P<zone>\d+))?"),
+    ("track_status", r"(?P<decision>TRACK CLEAR|CHEQUERED FLAG|GREEN LIGHT - PIT EXIT OPEN|PIT EXIT CLOSED)"),
+]
+COMPILED = [(event_type, re.compile(pattern)) for event_type, pattern in PATTERNS]
+EVENT_TYPES = [event_type for event_type, _ in PATTERNS] + ["other"]
+
+_CAR_IN_LIST = re.compile(r"(?P<driver_number>\d+)(?: \((?P<acronym>[A-Z]{3})\))?")
+
+COLUMNS = {
+    "driver_number": "Int8",
+    "acronym": "category",
+    "turn": "Int16",
+    "sector": "Int16",
+    "lap": "Int16",
+    "lap_time": "float32",
+    "penalty_seconds": "Int16",
+    "decision": "category",
+    "reason": "category",
+}
+
+
+def _lap_seconds(text):
+    parts = text.str.extract(r"(?P<minutes>\d+):(?P<seconds>\d+\.\d+)").astype('float64')
+    return parts['minutes'] * 60 + parts['seconds']
+
+
+def parse_messages(messages):
+    """Parse distinct message texts; returns one row per message and car, indexed by the message's position.
+
+    Messages that match no pattern get event_type 'other'.
+    """
+    messages = pd.Series(messages, dtype=object).reset_index(drop=True).str.strip()
+    event_type = pd.Series('other', index=messages.index, dtype=object)
+    fields = []
+    remaining = messages.dropna()
+    for name, pattern in COMPILED:
+        if not len(remaining):
+            break
+        matched = remaining.str.match(pattern)
+        hits = remaining[matched.fillna(False).astype(bool)]
+        if not len(hits):
+            continue
+        event_type[hits.index] = name
+        fields.append(hits.str.extract(pattern))
+        remaining = remaining[~remaining.index.isin(hits.index)]
+
+    parsed = pd.concat(fields) if fields else pd.DataFrame(index=pd.Index([], dtype='int64'))
+    parsed = parsed.reindex(messages.index)
+    parsed.insert(0, 'event_type', event_type)
+    if 'lap_time' in parsed:
+        parsed['lap_time'] = _lap_seconds(parsed['lap_time'].astype(object).fillna(''))
+
+    # One event per car for messages naming several cars
+    if 'cars' in parsed and parsed['cars'].notna().any():
+        cars = parsed['cars'].dropna().str.extractall(_CAR_IN_LIST).droplevel('match')
+        single = parsed.drop(index=cars.index.unique())
+        multi = parsed.loc[cars.index.unique()].drop(columns=['driver_number', 'acronym'], errors='ignore')
+        multi = multi.join(cars, how='inner')
+        parsed = pd.concat([single, multi]).sort_index(kind='stable')
+
+    for column, dtype in COLUMNS.items():
+        if column not in parsed:
+            parsed[column] = np.nan
+        parsed[column] = parsed[column].astype('float64' if dtype.startswith('Int') else object).astype(dtype)
+    parsed['event_type'] = pd.Categorical(parsed['event_type'], categories=EVENT_TYPES)
+    return parsed[['event_type'] + list(COLUMNS)]
+
+
+def parse_race_control(race_control):
+    """Return the typed events of every race control message.
+
+    One row per event with the message's session_key, date and message, plus
+    event_type, driver_number, acronym, turn, sector, lap, lap_time (seconds,
+    for deleted lap times), penalty_seconds, decision (the steward decision,
+    flag, or state announced) and reason. lap is the lap named in the message,
+    or the feed's lap_number when the message names none.
+    """
+    with span("parse:race_control", rows_in=race_control) as s:
+        codes, distinct = pd.factorize(race_control['message'].astype(object).str.strip())
+        parsed = parse_messages(pd.Series(distinct, dtype=object)).rename_axis('_text').reset_index()
+
+        # Expand the per-text parse back to every message
+        context = race_control[['session_key', 'date', 'message', 'lap_number', 'driver_number']]
+        context = context.assign(_text=codes)[codes >= 0]
+        events = context.merge(parsed, on='_text', how='left', suffixes=('_feed', ''))
+        events['lap'] = events['lap'].fillna(events['lap_number'].astype('Int16'))
+        events['driver_number'] = events['driver_number'].fillna(events['driver_number_feed'])
+        events = events.drop(columns=['_text', 'lap_number', 'driver_number_feed']).reset_index(drop=True)
+        return s.output(events)
+
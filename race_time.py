@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+
+from alignment import TimeSeries
+from instrument import span
+
+# Cumulative race time per driver and lap, and the gaps at each lap line.
+#
+# Laps are sorted once by (session, driver, lap) and every lap gets a
+# duration from the first source that has one: lap_duration, the sum of its
+# three sectors, the difference between its date_start and the next lap's,
+# and for lap 1 (which OpenF1 leaves without a duration or start time) the
+# next lap's date_start minus the race start. A grouped cumsum of those
+# durations is the race time at each lap line. Gap to the leader and the
+# interval to the car ahead come from one sort by (session, lap, race time).
+#
+# The gaps can be checked against interval_data: the sample of each driver
+# nearest to the moment they crossed the line is attached with an as-of join
+# and the differences are reported per session.
+
+KEYS = ['session_key', 'driver_number']
+START_MESSAGE = "GREEN LIGHT - PIT EXIT OPEN"  # sent as the race starts
+START_WINDOW = pd.Timedelta(minutes=10)  # the start message must be this close to the first lap 2
+GAP_TOLERANCE = '5s'  # interval_data is sampled every few seconds
+
+
+def _seconds(delta):
+    return delta.dt.total_seconds()
+
+
+def race_starts(laps, race_control=None):
+    """Return the start time of each session's race, indexed by session_key.
+
+    Uses the earliest lap 1 date_start when OpenF1 has one, otherwise the
+    last start message in race control within START_WINDOW before the first
+    car starts lap 2, otherwise the first lap 2 start minus the fastest lap 2
+    (which ignores the slower standing start).
+    """
+    first = laps.dropna(subset=['date_start'])
+    lap_two = first[first['lap_number'] == 2]
+    lap_two_start = lap_two.groupby('session_key', observed=True)['date_start'].min()
+
+    fallback = lap_two_start - pd.to_timedelta(
+        lap_two.groupby('session_key', observed=True)['lap_duration'].min(), unit='s')
+    starts = first[first['lap_number'] == 1].groupby('session_key', observed=True)['date_start'].min()
+    starts = starts.reindex(fallback.index.union(starts.index))
+
+    if race_control is not None and len(race_control):
+        messages = race_control[race_control['message'].astype(str).str.strip() == START_MESSAGE]
+        messages = messages.assign(_first=messages['session_key'].map(lap_two_start))
+        messages = messages[(messages['date'] <= messages['_first'])
+                            & (messages['date'] >= messages['_first'] - START_WINDOW)]
+        starts = starts.fillna(messages.groupby('session_key', observed=True)['date'].max())
+    starts = starts.fillna(fallback)
+    starts.name = 'race_start'
+    return starts
+
+
+def reconstruct_race_time(laps, starts):
+    """Return race time, position, gap to the leader and interval of every driver at every lap line.
+
+    starts is a race start time per session_key (see race_starts). A driver's
+    race time stops at their first lap that has no duration from any source.
+    lap_source tells where each lap's duration came from.
+    """
+    with span("reconstruct:race_time", rows_in=laps) as s:
+        laps = laps.sort_values(KEYS + ['lap_number'], kind='stable').reset_index(drop=True)
+        same_driver = laps.groupby(KEYS, observed=True)
+        next_start = same_driver['date_start'].shift(-1)
+        next_lap = same_driver['lap_number'].shift(-1)
+        next_start = next_start.where(next_lap == laps['lap_number'] + 1)
+        race_start = laps['session_key'].map(starts)
+
+        sources = [
+            ('lap_duration', laps['lap_duration'].astype('float64')),
+            ('sectors', laps[['duration_sector_1', 'duration_sector_2', 'duration_sector_3']]
+             .astype('float64').sum(axis=1, min_count=3)),
+            ('date_start', _seconds(next_start - laps['date_start'])),
+            ('race_start', _seconds(next_start - race_start).where(laps['lap_number'] == 1)),
+        ]
+        lap_time = pd.Series(np.nan, index=laps.index)
+        lap_source = pd.Series(pd.NA, index=laps.index, dtype='string')
+        for name, values in sources:
+            fill = lap_time.isna() & values.notna()
+            lap_time = lap_time.where(~fill, values)
+            lap_source = lap_source.where(~fill, name)
+
+        # A missing lap, or a lap without a duration, breaks the sum for the rest of the race
+        previous = same_driver['lap_number'].shift(1).fillna(0)
+        broken = (lap_time.isna() | (laps['lap_number'] != previous + 1)).groupby(
+            [laps[key] for key in KEYS], observed=True).cummax()
+        race_time = lap_time.groupby([laps[key] for key in KEYS], observed=True).cumsum().where(~broken)
+
+        result = laps[KEYS + ['lap_number']].assign(lap_time=lap_time, lap_source=lap_source,
+                                                   race_time=race_time)
+        result['line_time'] = race_start + pd.to_timedelta(race_time, unit='s')
+
+        # Order at every lap line, from one sort
+        timed = result.dropna(subset=['race_time']).sort_values(['session_key', 'lap_number', 'race_time'],
+                                                                kind='stable')
+        at_line = timed.groupby(['session_key', 'lap_number'], observed=True)['race_time']
+        result['position'] = (at_line.cumcount() + 1).reindex(result.index).astype('Int16')
+        result['gap_to_leader'] = (timed['race_time'] - at_line.transform('min')).reindex(result.index)
+        result['interval'] = at_line.diff().fillna(0.0).reindex(result.index)
+        return s.output(result)
+
+
+def validate_gaps(race_times, intervals, tolerance=GAP_TOLERANCE):
+    """Attach the interval_data sample nearest to each lap line and the differences to it.
+
+    Adds gap_to_leader_feed, interval_feed, gap_error and interval_error
+    (reconstructed minus feed). Laps without a sample within tolerance, or
+    where the feed has no numeric gap (lapped cars), get missing errors.
+    """
+    with span("validate:gaps", rows_in=[race_times, intervals]) as s:
+        feed = TimeSeries(intervals[KEYS + ['date', 'gap_to_leader', 'interval']], 'date', KEYS)
+        checked = feed.asof(race_times, 'line_time', columns=['gap_to_leader', 'interval'],
+                            direction='nearest', tolerance=tolerance, suffix='_feed')
+        checked['gap_error'] = checked['gap_to_leader'] - checked['gap_to_leader_feed'].astype('float64')
+        checked['interval_error'] = checked['interval'] - checked['interval_feed'].astype('float64')
+        return s.output(checked)
+
+
+def gap_errors(checked):
+    """Summarize validate_gaps per session: laps compared and the size of the differences."""
+    compared = checked.dropna(subset=['gap_error'])
+    abs_error = compared['gap_error'].abs()
+    grouped = abs_error.groupby(compared['session_key'], observed=True)
+    return pd.DataFrame({
+        'laps_compared': grouped.size(),
+        'median_abs_error': grouped.median(),
+        'p95_abs_error': grouped.quantile(0.95),
+        'within_1s': (abs_error <= 1.0).groupby(compared['session_key'], observed=True).mean(),
+    }).reset_index()
@@ -0,0 +1,202 @@
+import argparse
+import html
+import json
+import os
+from importlib import import_module
+
+from data_loader import DATA_DIR
+from figures import FIGURES, RESULTS_DIR, render_figure, unknown_figures
+from instrument import add_arguments, configure_from_args, span
+from pipeline import TableStore
+from table_cache import code_digest, value_digest
+
+# Incremental post-race report.
+#
+# Every figure of figures.FIGURES is recorded in <out_dir>/report.json with
+# the tables its plot function asked the TableStore for and a fingerprint: a
+# hash of those tables' cache keys (which cover the CSVs, parameters and
+# builder code upstream of them, see table_cache.py), the source of the
+# analysis module and the output settings. On the next build a figure whose
+# fingerprint is unchanged and whose files are still there is skipped, and
+# computing the fingerprint builds nothing. After a one-table correction only
+# the figures downstream of that table are rendered again.
+#
+# The report itself is <out_dir>/index.html: every figure with the function
+# and tables it came from, followed by summary tables. The summaries are
+# cheap, since their tables are read back from the derived table cache, and
+# are written on every build.
+
+REPORT_FILE = "report.json"
+INDEX_FILE = "index.html"
+
+
+class RecordingStore(TableStore):
+    """A TableStore that remembers the tables asked for since requested was last cleared."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requested = []
+
+    def build(self, names):
+        self.requested.extend(name for name in names if name not in self.requested)
+        return super().build(names)
+
+
+def figure_fingerprint(tables, module, function, inputs, formats, dpi):
+    """Return the hash of everything a figure depends on, without building any table."""
+    return value_digest({
+        "module": module, "function": function, "code": code_digest(import_module(module)),
+        "inputs": {name: tables.key(name) for name in inputs}, "formats": list(formats), "dpi": dpi,
+    })
+
+
+def _read_report(out_dir):
+    try:
+        with open(os.path.join(out_dir, REPORT_FILE)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as file:
+        file.write(text)
+    os.replace(tmp_path, path)
+
+
+def lap_time_vs_position(tables):
+    driver_performance = tables["driver_performance"].sort_values('final_position')
+    correlation = driver_performance['avg_lap_duration'].corr(driver_performance['final_position'])
+    note = f"Correlation between average lap time and final position: {correlation:.3f}"
+    return driver_performance[['final_position', 'full_name', 'avg_lap_duration']], note
+
+
+def position_changes(tables):
+    columns = ['full_name', 'starting_position', 'final_position', 'position_change']
+    return tables["performance_comparison"][columns].sort_values('position_change', ascending=False), None
+
+
+def pit_stop_summary(tables):
+    columns = ['final_position', 'full_name', 'team_name', 'num_pit_stops', 'avg_pit_duration']
+    return tables["pit_stop_analysis"][columns].sort_values('final_position'), None
+
+
+def degradation_by_compound(tables):
+    fits = tables["degradation_fits"].dropna(subset=['slope'])
+    summary = fits.groupby('compound', observed=True)['slope'].agg(['count', 'mean', 'median'])
+    return summary.reset_index(), "Seconds per lap of tyre age, fuel corrected."
+
+
+# (title, summary function returning a table and an optional note)
+SUMMARIES = [
+    ("Lap time and finishing position", lap_time_vs_position),
+    ("Position changes", position_changes),
+    ("Pit stops", pit_stop_summary),
+    ("Tyre degradation per compound", degradation_by_compound),
+]
+
+
+def _title(function):
+    return function.removeprefix("plot_").replace("_", " ").capitalize()
+
+
+def write_index(report, tables, out_dir):
+    """Write out_dir/index.html with every figure in report and the summary tables."""
+    parts = ["<!DOCTYPE html>", "<html><head><meta charset='utf-8'><title>F1 race report</title>",
+             "<style>body{font-family:sans-serif;margin:2em} img{max-width:100%} "
+             "table{border-collapse:collapse} td,th{padding:2px 8px;border-bottom:1px solid #ddd}"
+             " .source{color:#666;font-size:small}</style></head><body>",
+             "<h1>F1 race report</h1>", "<h2>Figures</h2>"]
+    for name, module, function in FIGURES:
+        entry = report.get(name)
+        if entry is None:
+            continue
+        parts.append(f"<h3 id='{name}'>{html.escape(name)}: {html.escape(_title(function))}</h3>")
+        parts.append(f"<img src='{html.escape(entry['files'][0])}' alt='{html.escape(name)}'>")
+        parts.append(f"<p class='source'>{html.escape(module)}.{html.escape(function)} from "
+                     f"{html.escape(', '.join(entry['inputs']))}</p>")
+
+    parts.append("<h2>Summary tables</h2>")
+    for title, summary in SUMMARIES:
+        with span(f"report:summary:{summary.__name__}"):
+            table, note = summary(tables)
+        parts.append(f"<h3>{html.escape(title)}</h3>")
+        if note:
+            parts.append(f"<p>{html.escape(note)}</p>")
+        parts.append(table.to_html(index=False, float_format=lambda value: f"{value:.3f}"))
+    parts.append("</body></html>")
+
+    path = os.path.join(out_dir, INDEX_FILE)
+    _write_atomic(path, "\n".join(parts))
+    return path
+
+
+def build_report(data_dir=DATA_DIR, out_dir=RESULTS_DIR, formats=("png",), dpi=100, names=None, force=False):
+    """Render the figures (all by default) whose inputs changed, then write the HTML index.
+
+    force renders every selected figure regardless. Returns the names of the
+    figures that were rendered.
+    """
+    import matplotlib
+    matplotlib.use("Agg")  # before any analysis module pulls in pyplot
+
+    unknown = unknown_figures(names or [])
+    if unknown:
+        raise ValueError(f"Unknown figures: {', '.join(unknown)}")
+    os.makedirs(out_dir, exist_ok=True)
+    report = _read_report(out_dir)
+    tables = RecordingStore(data_dir)
+    rendered = []
+    for name, module, function in FIGURES:
+        if names is not None and name not in names:
+            continue
+        entry = report.get(name)
+        if not force and entry is not None and entry.get("module") == module and entry.get("function") == function:
+            files = [os.path.join(out_dir, file) for file in entry["files"]]
+            with span(f"report:check:{name}"):
+                current = figure_fingerprint(tables, module, function, entry["inputs"], formats, dpi)
+            if current == entry["fingerprint"] and all(os.path.exists(path) for path in files):
+                print(f"Up to date {name}")
+                continue
+
+        tables.requested = []
+        paths = render_figure(name, module, function, data_dir, out_dir, formats, dpi, tables=tables)
+        inputs = list(tables.requested)
+        report[name] = {
+            "module": module, "function": function, "inputs": inputs,
+            "fingerprint": figure_fingerprint(tables, module, function, inputs, formats, dpi),
+            "files": [os.path.basename(path) for path in paths],
+        }
+        # Saved after every figure, so an interrupted build keeps what it rendered
+        _write_atomic(os.path.join(out_dir, REPORT_FILE), json.dumps(report, indent=2))
+        print(f"Saved {name}: {', '.join(paths)}")
+        rendered.append(name)
+
+    with span("report:index"):
+        path = write_index(report, tables, out_dir)
+    print(f"Rendered {len(rendered)} figures; report written to {path}")
+    return rendered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the HTML race report, rendering only figures whose "
+                                                 "inputs changed.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--out-dir", default=RESULTS_DIR)
+    parser.add_argument("--format", dest="formats", nargs="+", default=["png"], choices=["png", "svg", "pdf"])
+    parser.add_argument("--dpi", type=int, default=100)
+    parser.add_argument("--force", action="store_true", help="render every figure even if it is up to date")
+    parser.add_argument("figures", nargs="*", help="figure names to consider, e.g. Figure_3 (default: all)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args, echo=False)
+    unknown = unknown_figures(args.figures)
+    if unknown:
+        parser.error(f"unknown figures: {', '.join(unknown)}")
+
+    build_report(args.data_dir, args.out_dir, tuple(args.formats), args.dpi, args.figures or None, args.force)
+
+
+if __name__ == "__main__":
+    main()
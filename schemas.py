@@ -0,0 +1,114 @@
+import pandas as pd
+
+# Declared column types for every OpenF1 table.
+#
+# Keys and counters use the smallest nullable integer type that fits, so
+# missing entries stay missing instead of turning the column into float64.
+# Durations, speeds and weather channels are float32, low-cardinality text
+# columns are categoricals and timestamps are tz-aware UTC. Columns that are
+# not listed here fall back to the loader's type inference.
+
+DATE = "datetime64[ns, UTC]"
+
+DRIVER_NUMBER = "Int8"
+LAP_NUMBER = "Int16"
+SESSION_KEY = "Int32"
+MEETING_KEY = "Int32"
+
+KEYS = {
+    "driver_number": DRIVER_NUMBER,
+    "meeting_key": MEETING_KEY,
+    "session_key": SESSION_KEY,
+}
+
+SCHEMAS = {
+    "drivers": {
+        **KEYS,
+        "broadcast_name": "str",
+        "country_code": "category",
+        "first_name": "str",
+        "full_name": "str",
+        "headshot_url": "str",
+        "last_name": "str",
+        "name_acronym": "category",
+        "team_colour": "category",
+        "team_name": "category",
+    },
+    "intervals": {
+        **KEYS,
+        "date": DATE,
+        "gap_to_leader": "float32",
+        "interval": "float32",
+    },
+    "laps": {
+        **KEYS,
+        "date_start": DATE,
+        "duration_sector_1": "float32",
+        "duration_sector_2": "float32",
+        "duration_sector_3": "float32",
+        "i1_speed": "float32",
+        "i2_speed": "float32",
+        "is_pit_out_lap": "boolean",
+        "lap_duration": "float32",
+        "lap_number": LAP_NUMBER,
+        "segments_sector_1": "str",
+        "segments_sector_2": "str",
+        "segments_sector_3": "str",
+        "st_speed": "float32",
+    },
+    "pit": {
+        **KEYS,
+        "date": DATE,
+        "lap_number": LAP_NUMBER,
+        "pit_duration": "float32",
+    },
+    "race_control": {
+        **KEYS,
+        "category": "category",
+        "date": DATE,
+        "flag": "category",
+        "lap_number": LAP_NUMBER,
+        "message": "str",
+        "scope": "category",
+        "sector": "Int8",
+    },
+    "ranking": {
+        **KEYS,
+        "date": DATE,
+        "position": "Int8",
+    },
+    "stints": {
+        **KEYS,
+        "compound": "category",
+        "lap_end": LAP_NUMBER,
+        "lap_start": LAP_NUMBER,
+        "stint_number": "Int8",
+        "tyre_age_at_start": "Int16",
+    },
+    "weather": {
+        "air_temperature": "float32",
+        "date": DATE,
+        "humidity": "float32",
+        "meeting_key": MEETING_KEY,
+        "pressure": "float32",
+        "rainfall": "Int8",
+        "session_key": SESSION_KEY,
+        "track_temperature": "float32",
+        "wind_direction": "Int16",
+        "wind_speed": "float32",
+    },
+}
+
+
+def cast_column(values, dtype):
+    """Cast a stripped string column (missing entries as NaN) to a declared dtype."""
+    if dtype == DATE:
+        return pd.to_datetime(values, errors='coerce', format='ISO8601', utc=True).astype(DATE)
+    if dtype == "boolean":
+        return values.map({'True': True, 'False': False}).astype("boolean")
+    if dtype == "category":
+        return values.astype("category")
+    if dtype == "str":
+        return values
+    # Numeric columns: anything that does not parse (e.g. "1 L" laps down) becomes missing
+    return pd.to_numeric(values, errors='coerce').astype(dtype)
@@ -0,0 +1,342 @@
+import argparse
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DATA_DIR, load_table, warm_cache
+from instrument import TRACER, add_arguments, configure_from_args, init_worker, span
+from lap_merge import iter_sessions, session_dirs
+from pipeline import DRIVER_KEYS, NODES, TableStore, plan
+
+# Season runner: the per-session analyses over many sessions in a process pool.
+#
+# Sessions are given as session directories (one race each, as written by
+# synthetic.py --split) or as session_keys of a directory that holds many
+# sessions. They are split into a few tasks per worker. A worker loads its
+# directory's tables from the columnar cache (memory-mapped, so the workers
+# share those pages), keeps the rows of its sessions, cuts them per session in
+# one pass (lap_merge.iter_sessions) and builds each session's tables with its
+# own TableStore. Keeping only some of a directory's sessions copies their
+# rows; a task that covers the whole directory uses the mapped tables as they
+# are.
+#
+# The driver table is a lookup every session needs. The parent loads it once
+# for all directories and places it in shared memory (SharedTable); workers
+# attach to that block when they start instead of receiving a pickled copy
+# with every task. Tasks return only small per-session summaries, which the
+# parent concatenates into season tables and reduces to one row per driver.
+
+SHARED_TABLES = ["drivers"]
+TASKS_PER_WORKER = 2
+
+
+class SharedTable:
+    """A DataFrame whose column buffers live in one shared memory block.
+
+    The parent creates it with from_frame and hands spec (a small, picklable
+    description of the block) to the workers, which rebuild the frame with
+    attach. Numeric and nullable columns come back as views of the block;
+    text columns are stored as codes and their dictionaries travel in spec.
+    """
+
+    def __init__(self, shm, spec, owner=False):
+        self.shm = shm
+        self.spec = spec
+        self.owner = owner
+
+    @classmethod
+    def from_frame(cls, df):
+        columns = []
+        parts = []
+        for name in df.columns:
+            values = df[name]
+            dtype = values.dtype
+            if isinstance(dtype, pd.CategoricalDtype):
+                kind, arrays = "category", [values.cat.codes.to_numpy()]
+                extra = (list(dtype.categories), dtype.ordered)
+            elif isinstance(dtype, pd.DatetimeTZDtype):
+                kind, arrays = "datetime", [values.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy()]
+                extra = str(dtype.tz)
+            elif isinstance(values.array, pd.api.extensions.ExtensionArray) and hasattr(values.array, "_mask"):
+                # Nullable Int/Float/boolean columns: values and mask
+                kind = "masked"
+                arrays = [values.to_numpy(dtype=dtype.numpy_dtype, na_value=0), values.isna().to_numpy()]
+                extra = str(dtype)
+            elif dtype.kind in "biufmM":
+                kind, arrays, extra = "numpy", [values.to_numpy()], None
+            else:
+                codes, uniques = pd.factorize(values)
+                kind, arrays, extra = "text", [codes.astype("int32")], (list(uniques), str(dtype))
+            columns.append((name, kind, extra, len(arrays)))
+            parts.extend(np.ascontiguousarray(array) for array in arrays)
+
+        # Each column buffer starts on an 8-byte boundary of the block
+        offsets = []
+        size = 0
+        for array in parts:
+            offsets.append((size, array.dtype.str))
+            size += -(-array.nbytes // 8) * 8
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 8))
+        for array, (offset, _) in zip(parts, offsets):
+            np.ndarray(array.shape, array.dtype, shm.buf, offset)[:] = array
+        spec = {"name": shm.name, "rows": len(df), "columns": columns, "parts": offsets}
+        return cls(shm, spec, owner=True)
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(shared_memory.SharedMemory(name=spec["name"]), spec)
+
+    def frame(self):
+        """Return the table as a DataFrame backed by the shared block.
+
+        The frame is only valid while this SharedTable stays open.
+        """
+        rows = self.spec["rows"]
+        parts = iter(self.spec["parts"])
+        data = {}
+        for name, kind, extra, n_parts in self.spec["columns"]:
+            arrays = []
+            for offset, dtype in (next(parts) for _ in range(n_parts)):
+                array = np.ndarray((rows,), np.dtype(dtype), self.shm.buf, offset)
+                array.flags.writeable = False
+                arrays.append(array)
+            if kind == "category":
+                categories, ordered = extra
+                data[name] = pd.Categorical.from_codes(arrays[0], categories=categories, ordered=ordered)
+            elif kind == "datetime":
+                data[name] = pd.Series(arrays[0]).dt.tz_localize("UTC").dt.tz_convert(extra)
+            elif kind == "masked":
+                data[name] = pd.api.types.pandas_dtype(extra).construct_array_type()(arrays[0], arrays[1])
+            elif kind == "numpy":
+                data[name] = arrays[0]
+            else:
+                uniques, dtype = extra
+                text = np.asarray(uniques + [None], dtype=object)[arrays[0]]  # code -1 takes the None
+                data[name] = pd.Series(text).astype(dtype)
+        return pd.DataFrame(data, copy=False)
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def session_results(tables):
+    performance = tables["performance_comparison"].merge(tables["avg_lap_times"], on=DRIVER_KEYS, how='left')
+    return performance.merge(tables["driver_names"][DRIVER_KEYS + ['team_name']], on=DRIVER_KEYS, how='left')
+
+
+def session_pit_stops(tables):
+    return tables["pit_stop_analysis"]
+
+
+def session_stints(tables):
+    # One row per stint with the laps it covered and its pace
+    laps = tables["detailed_laps"]
+    return laps.groupby(['driver_number', 'full_name', 'stint_number', 'compound'], observed=True).agg(
+        first_lap=('lap_number', 'min'), last_lap=('lap_number', 'max'), laps=('lap_number', 'size'),
+        mean_lap_duration=('lap_duration', 'mean'), best_lap_duration=('lap_duration', 'min'),
+    ).reset_index()
+
+
+def session_weather(tables):
+    # The conditions over the session's laps, and how lap time followed the track temperature
+    laps = tables["laps_with_weather"]
+    return pd.DataFrame({
+        'laps': [len(laps)],
+        'air_temperature': [laps['air_temperature'].mean()],
+        'track_temperature': [laps['track_temperature'].mean()],
+        'humidity': [laps['humidity'].mean()],
+        'rain_laps': [int((laps['rainfall'].fillna(0) > 0).sum())],
+        'mean_lap_duration': [laps['lap_duration'].mean()],
+        'lap_time_vs_track_temperature': [laps['lap_duration'].astype('float64').corr(
+            laps['track_temperature'].astype('float64'))],
+    })
+
+
+# season table -> (tables it needs, summary of one session)
+SESSION_SUMMARIES = {
+    "results": (["performance_comparison", "avg_lap_times", "driver_names"], session_results),
+    "pit_stops": (["pit_stop_analysis"], session_pit_stops),
+    "stints": (["detailed_laps"], session_stints),
+    "weather": (["laps_with_weather"], session_weather),
+}
+
+_shared = {}
+
+
+def _init_worker(trace, specs):
+    init_worker(trace)
+    for name, spec in specs.items():
+        _shared[name] = SharedTable.attach(spec)
+
+
+def source_tables(names):
+    """Return the source tables the summaries of names are built from."""
+    needed = [table for name in names for table in SESSION_SUMMARIES[name][0]]
+    return [name for name in plan(needed) if NODES[name][1] is None]
+
+
+def summarize_sessions(data_dir, session_keys, names, shared):
+    """Build the summaries of names for each of session_keys in data_dir.
+
+    shared maps table names to tables that are already loaded for every
+    session (e.g. from shared memory). Returns {name: summaries of all the
+    sessions, with their session_key}.
+    """
+    keys = pd.Index(session_keys)
+    tables = {}
+    for name in source_tables(names):
+        table = shared[name] if name in shared else load_table(name, data_dir, mmap=True)
+        mine = table['session_key'].isin(keys)
+        tables[name] = table if mine.all() else table[mine]
+
+    summaries = {name: [] for name in names}
+    for session_key, session in iter_sessions(tables):
+        with span("season:session", rows_in=session["laps"], session_key=int(session_key)):
+            store = TableStore(data_dir, session)
+            for name in names:
+                needed, summary = SESSION_SUMMARIES[name]
+                built = dict(zip(needed, store.build(needed)))
+                frame = summary(built)
+                if 'session_key' not in frame.columns:
+                    frame = frame.assign(session_key=session_key)[['session_key'] + list(frame.columns)]
+                summaries[name].append(frame)
+    return {name: pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+            for name, frames in summaries.items()}
+
+
+def _summarize_job(data_dir, session_keys, names):
+    shared = {name: table.frame() for name, table in _shared.items()}
+    return summarize_sessions(data_dir, session_keys, names, shared), TRACER.drain()
+
+
+def find_sessions(sources=(), data_dir=DATA_DIR):
+    """Return (data directory, session_keys) pairs for the given directories and session_keys.
+
+    Session keys select sessions from the given directories, or from data_dir
+    and its session subdirectories when no directory is given. Without
+    session keys, every session is used.
+    """
+    keys = {int(source) for source in sources if not os.path.isdir(source)}
+    found = []
+    for path in [source for source in sources if os.path.isdir(source)] or [data_dir]:
+        for directory in session_dirs(path):
+            laps = load_table("laps", directory, mmap=True)
+            sessions = sorted(int(key) for key in laps['session_key'].dropna().unique())
+            sessions = [key for key in sessions if not keys or key in keys]
+            if sessions:
+                found.append((directory, sessions))
+    missing = keys - {key for _, sessions in found for key in sessions}
+    if missing:
+        print(f"No lap data for sessions {', '.join(map(str, sorted(missing)))}.")
+    return found
+
+
+def _tasks(found, jobs):
+    # Enough tasks to keep every worker busy, never one per session of a big directory
+    sessions = sum(len(keys) for _, keys in found)
+    size = max(1, math.ceil(sessions / (jobs * TASKS_PER_WORKER)))
+    return [(directory, keys[start:start + size]) for directory, keys in found
+            for start in range(0, len(keys), size)]
+
+
+def season_drivers(results, pit_stops):
+    """Reduce the per-session results and pit stops to one row per driver."""
+    results = results.assign(win=results['final_position'] == 1, podium=results['final_position'] <= 3)
+    drivers = results.groupby(['driver_number', 'full_name'], observed=True).agg(
+        team_name=('team_name', 'last'), sessions=('session_key', 'nunique'), wins=('win', 'sum'),
+        podiums=('podium', 'sum'), avg_final_position=('final_position', 'mean'),
+        best_final_position=('final_position', 'min'), positions_gained=('position_change', 'sum'),
+        avg_lap_duration=('avg_lap_duration', 'mean'),
+    )
+    if len(pit_stops):
+        pit_stops = pit_stops.assign(_total=pit_stops['num_pit_stops'] * pit_stops['avg_pit_duration'])
+        stops = pit_stops.groupby(['driver_number', 'full_name'], observed=True)[['num_pit_stops', '_total']].sum()
+        drivers = drivers.join(stops)
+        drivers['avg_pit_duration'] = drivers.pop('_total') / drivers['num_pit_stops']
+    return drivers.reset_index().sort_values(['wins', 'avg_final_position'], ascending=[False, True],
+                                             ignore_index=True)
+
+
+def run_season(sources=(), data_dir=DATA_DIR, jobs=None, names=None):
+    """Run the per-session summaries (all by default) for every session across a process pool.
+
+    Returns {season table: rows of every session}, plus "drivers" (see
+    season_drivers) when results are among them.
+    """
+    names = list(names or SESSION_SUMMARIES)
+    jobs = jobs or os.cpu_count() or 1
+    found = find_sessions(sources, data_dir)
+    tasks = _tasks(found, jobs)
+    print(f"{sum(len(keys) for _, keys in found)} sessions in {len(found)} directories, {len(tasks)} tasks.")
+    if not found:
+        return {}
+
+    warm_cache([table for table in source_tables(names) if table not in SHARED_TABLES],
+               [directory for directory, _ in found])
+
+    with span("season:share", tables=SHARED_TABLES):
+        shared = [SharedTable.from_frame(pd.concat([load_table(name, directory, mmap=True)
+                                                    for directory, _ in found], ignore_index=True))
+                  for name in SHARED_TABLES]
+    parts = {name: [] for name in names}
+    try:
+        specs = {name: table.spec for name, table in zip(SHARED_TABLES, shared)}
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(TRACER.enabled, specs)) as pool:
+            futures = [pool.submit(_summarize_job, directory, keys, names) for directory, keys in tasks]
+            for (directory, keys), future in zip(tasks, futures):
+                summaries, records = future.result()
+                for record in records:
+                    TRACER.emit(record)
+                for name, summary in summaries.items():
+                    parts[name].append(summary)
+                print(f"Analysed {len(keys)} sessions in {directory}.")
+    finally:
+        for table in shared:
+            table.close()
+
+    with span("season:reduce"):
+        season = {name: pd.concat(frames, ignore_index=True) for name, frames in parts.items()}
+        if "results" in season:
+            season["drivers"] = season_drivers(season["results"], season.get("pit_stops", pd.DataFrame()))
+    return season
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the per-session analyses over many sessions in parallel.")
+    parser.add_argument("sources", nargs="*",
+                        help="session directories or session_keys (default: every session under --data-dir)")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="where session_keys are looked up")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--tables", nargs="+", choices=list(SESSION_SUMMARIES), default=None,
+                        help="season tables to build (default: all)")
+    parser.add_argument("--out-dir", default=None, help="write each season table to <out-dir>/<table>.parquet")
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args, echo=False)
+
+    season = run_season(args.sources, args.data_dir, args.jobs, args.tables)
+    if "drivers" in season:
+        print(season["drivers"].head(10).to_string(index=False))
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+        for name, table in season.items():
+            path = os.path.join(args.out_dir, f"{name}.parquet")
+            table.to_parquet(path, index=False)
+            print(f"Saved {name}: {path} ({len(table)} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+# Compact summaries for the figures.
+#
+# Plots draw from these instead of handing raw rows to seaborn, which would
+# bootstrap a confidence interval for every x value and draw every sample.
+# summarize() reduces a table to one row per group with the mean, quantiles
+# and a normal-approximation confidence interval from a single groupby, and
+# lttb_indices() / downsample() pick a fixed number of representative points
+# of a long time series (Largest-Triangle-Three-Buckets), so figure cost
+# depends on the size of the summaries rather than on the number of laps.
+
+QUANTILES = (0.25, 0.5, 0.75)
+MAX_POINTS = 1000
+
+
+def summarize(df, by, value, quantiles=QUANTILES, ci=0.95):
+    """Return count, mean, std, a ci confidence interval and quantiles of value per group."""
+    grouped = df.groupby(by, observed=True, sort=True)[value]
+    summary = grouped.agg(['count', 'mean', 'std'])
+    z = NormalDist().inv_cdf(0.5 + ci / 2)
+    half_width = z * summary['std'] / np.sqrt(summary['count'])
+    summary['ci_low'] = summary['mean'] - half_width
+    summary['ci_high'] = summary['mean'] + half_width
+    if quantiles:
+        q = grouped.quantile(list(quantiles)).unstack()
+        q.columns = [f"q{round(level * 100)}" for level in q.columns]
+        summary = summary.join(q)
+    return summary.reset_index()
+
+
+def lttb_indices(x, y, n_out=MAX_POINTS):
+    """Return the positions of n_out points of (x, y) chosen by Largest-Triangle-Three-Buckets.
+
+    x must be sorted. The first and last points are always kept.
+    """
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Buckets of the points between the first and the last one
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Average point of every bucket, used as the third vertex for the bucket before it
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    avg_x = np.append(avg_x, x[-1])
+    avg_y = np.append(avg_y, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # Twice the area of the triangle (point a, candidate, next bucket's average)
+        area = np.abs((x[a] - avg_x[b + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[b + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[b + 1] = a
+    return selected
+
+
+def downsample(df, x, y, n_out=MAX_POINTS, by=None):
+    """Return at most n_out rows of df per group that keep the shape of y over x.
+
+    x may be numeric or datetime; rows with missing x or y are dropped.
+    """
+    df = df.dropna(subset=[x, y]).sort_values((by or []) + [x], kind='stable')
+    if by is None:
+        groups = [df]
+    else:
+        groups = [group for _, group in df.groupby(by, observed=True, sort=False)]
+    parts = []
+    for group in groups:
+        xs = group[x]
+        xs = pd.DatetimeIndex(xs).asi8 if pd.api.types.is_datetime64_any_dtype(xs) else xs.to_numpy()
+        parts.append(group.iloc[lttb_indices(xs, group[y].to_numpy(dtype='float64', na_value=np.nan), n_out)])
+    return pd.concat(parts) if parts else df
@@ -0,0 +1,49 @@
+import pandas as pd
+
+from instrument import span
+
+# Interval join of stints onto laps.
+#
+# A stint covers the laps lap_start..lap_end of one driver. Instead of masking
+# the whole laps table once per stint, both tables are sorted once and every
+# lap is matched to the last stint that started on or before it with an as-of
+# join per driver. Laps past the end of that stint are left unmatched.
+
+STINT_COLUMNS = ['compound', 'stint_number', 'lap_start', 'lap_end', 'tyre_age_at_start']
+
+
+def assign_stints(laps_df, stints_df):
+    """Return laps_df with compound, stint_number and tyre_age columns added.
+
+    Laps that are not covered by any stint keep missing values in the new
+    columns, so callers can decide whether to drop them.
+    """
+    with span("merge:stints", rows_in=[laps_df, stints_df]) as s:
+        return s.output(_assign_stints(laps_df, stints_df))
+
+
+def _assign_stints(laps_df, stints_df):
+    by = [col for col in ('session_key', 'driver_number') if col in laps_df.columns and col in stints_df.columns]
+
+    stints = stints_df.dropna(subset=by + ['lap_start', 'lap_end'])
+    stints = stints[by + STINT_COLUMNS].copy()
+    for col in by:
+        stints[col] = stints[col].astype(laps_df[col].dtype)
+    stints['lap_start'] = stints['lap_start'].astype('int64')
+    stints['lap_end'] = stints['lap_end'].astype('int64')
+
+    laps = laps_df.reset_index(drop=True)
+    laps['_row'] = laps.index
+    laps['_lap'] = laps['lap_number'].astype('int64')
+
+    joined = pd.merge_asof(laps.sort_values('_lap'), stints.sort_values('lap_start'),
+                           left_on='_lap', right_on='lap_start', by=by, direction='backward')
+    joined = joined.sort_values('_row').set_index(laps_df.index)
+
+    # The as-of join only checks lap_start; drop matches past the stint's end
+    inside = joined['_lap'] <= joined['lap_end']
+    for col in STINT_COLUMNS:
+        joined[col] = joined[col].where(inside)
+
+    joined['tyre_age'] = joined['tyre_age_at_start'] + (joined['_lap'] - joined['lap_start'])
+    return joined.drop(columns=['_row', '_lap', 'lap_start', 'lap_end', 'tyre_age_at_start'])
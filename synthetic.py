@@ -0,0 +1,343 @@
+import argparse
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DATA_DIR, TABLE_FILES, load_table, table_path
+
+# Synthetic race sessions with the same files and columns as the OpenF1 data.
+#
+# Each session reuses the driver roster of the template data directory and
+# simulates a race from a simple lap time model: base pace, driver pace, tyre
+# compound offset and degradation, fuel burn, pit stop losses and an optional
+# safety car period. Laps, stints, pit stops, positions, intervals, weather
+# and race control messages are all derived from the same simulated timeline,
+# so joins between the tables behave like on real data.
+
+SESSION_KEY_START = 100_000
+MEETING_KEY_START = 10_000
+FIRST_RACE = pd.Timestamp("2024-03-02 15:00", tz="UTC")
+
+COMPOUNDS = {
+    # compound: (pace offset in s, degradation in s per lap of tyre age)
+    "SOFT": (0.0, 0.09),
+    "MEDIUM": (0.4, 0.05),
+    "HARD": (0.8, 0.03),
+}
+SEGMENTS_PER_SECTOR = (7, 8, 9)
+SEGMENT_VALUES = np.array([2048, 2049, 2051], dtype=np.int16)
+SEGMENT_WEIGHTS = [0.35, 0.55, 0.10]
+SECTOR_SHARES = np.array([0.31, 0.37, 0.32])
+FUEL_EFFECT = 0.06  # s per lap of fuel burnt
+SAFETY_CAR_LOSS = 25.0
+MARKER = ".synthetic"  # written into every directory write_dataset creates, which it may then replace
+
+
+def template_columns(data_dir=DATA_DIR):
+    """Return the column order of every CSV in the template data directory."""
+    return {name: list(pd.read_csv(table_path(name, data_dir), nrows=0).columns.str.strip())
+            for name in TABLE_FILES}
+
+
+def _lap_model(rng, n_drivers, n_laps):
+    # Lap durations without pit or safety car losses, plus the tyre plan that produced them
+    base = rng.uniform(72, 95)
+    pace = rng.normal(0, 0.6, n_drivers)
+    laps = np.arange(1, n_laps + 1)
+
+    durations = np.empty((n_drivers, n_laps))
+    stints = []
+    pit_laps = []
+    for d in range(n_drivers):
+        stops = rng.choice([1, 2, 3], p=[0.55, 0.35, 0.10])
+        pits = np.sort(rng.choice(np.arange(8, n_laps - 5), size=stops, replace=False))
+        starts = np.concatenate([[1], pits + 1])
+        ends = np.concatenate([pits, [n_laps]])
+        compounds = rng.choice(list(COMPOUNDS), size=len(starts))
+        if len(set(compounds)) == 1:
+            # The rules require two different dry compounds
+            compounds[-1] = "HARD" if compounds[0] != "HARD" else "MEDIUM"
+        for number, (start, end, compound) in enumerate(zip(starts, ends, compounds), start=1):
+            age = int(rng.choice([0, 0, 0, 3]))
+            offset, degradation = COMPOUNDS[compound]
+            stint_laps = np.arange(start, end + 1)
+            durations[d, start - 1:end] = offset + degradation * (age + stint_laps - start)
+            stints.append((d, start, end, compound, number, age))
+        pit_laps.append(pits)
+
+    durations += base + pace[:, None] - FUEL_EFFECT * laps + rng.normal(0, 0.35, (n_drivers, n_laps))
+    return durations, stints, pit_laps
+
+
+def _segments(rng, n, width):
+    codes = rng.choice(SEGMENT_VALUES, size=(n, width), p=SEGMENT_WEIGHTS).astype(str)
+    return ["[" + ", ".join(row) + "]" for row in codes]
+
+
+def _race_control_rows(rng, lap_start, lead_end, drivers, n_laps, safety_car):
+    rows = []
+
+    def add(time, category, message, lap=None, flag=None, scope=None, sector=None, driver=None):
+        rows.append({"category": category, "date": time, "driver_number": driver, "flag": flag,
+                     "lap_number": lap, "message": message, "scope": scope, "sector": sector})
+
+    start = lap_start[0]
+    add(start - pd.Timedelta(minutes=45), "Other", "RISK OF RAIN FOR F1 RACE IS 10%")
+    add(start - pd.Timedelta(minutes=40), "Flag", "GREEN LIGHT - PIT EXIT OPEN", 1, "GREEN", "Track")
+    add(start - pd.Timedelta(minutes=10), "Other", "PIT EXIT CLOSED")
+    add(start, "Flag", "GREEN LIGHT - PIT EXIT OPEN", 1, "GREEN", "Track")
+    add(lead_end[1], "Drs", "DRS ENABLED", 3)
+
+    def lap_time(lap):
+        # A moment during the leader's lap
+        return lap_start[lap - 1] + (lead_end[lap - 1] - lap_start[lap - 1]) * rng.uniform()
+
+    acronyms = dict(zip(drivers['driver_number'], drivers['name_acronym']))
+    numbers = drivers['driver_number'].to_numpy()
+
+    for _ in range(rng.poisson(3)):
+        lap = int(rng.integers(2, n_laps))
+        sector = int(rng.integers(1, 21))
+        time = lap_time(lap)
+        flag = rng.choice(["YELLOW", "DOUBLE YELLOW"], p=[0.8, 0.2])
+        add(time, "Flag", f"{flag} IN TRACK SECTOR {sector}", lap, flag, "Sector", sector)
+        add(time + pd.Timedelta(seconds=rng.uniform(20, 120)), "Flag", f"CLEAR IN TRACK SECTOR {sector}",
+            lap, "CLEAR", "Sector", sector)
+
+    for _ in range(rng.poisson(12)):
+        lap = int(rng.integers(10, n_laps))
+        driver = int(rng.choice(numbers))
+        time = lap_time(lap)
+        add(time, "Flag", f"WAVED BLUE FLAG FOR CAR {driver} ({acronyms[driver]}) TIMED AT {time:%H:%M:%S}",
+            lap, "BLUE", "Driver", driver=driver)
+
+    for _ in range(rng.poisson(15)):
+        lap = int(rng.integers(2, n_laps))
+        driver = int(rng.choice(numbers))
+        time = lap_time(lap)
+        lap_seconds = rng.uniform(72, 100)
+        add(time, "Other",
+            f"CAR {driver} ({acronyms[driver]}) TIME {int(lap_seconds // 60)}:{lap_seconds % 60:06.3f} DELETED - "
+            f"TRACK LIMITS AT TURN {int(rng.integers(1, 15))} LAP {lap} {time:%H:%M:%S}", lap)
+
+    for _ in range(rng.poisson(3)):
+        lap = int(rng.integers(2, n_laps))
+        a, b = rng.choice(numbers, size=2, replace=False)
+        add(lap_time(lap), "Other",
+            f"FIA STEWARDS: TURN {int(rng.integers(1, 15))} INCIDENT INVOLVING CARS {a} ({acronyms[a]}) AND "
+            f"{b} ({acronyms[b]}) UNDER INVESTIGATION - CAUSING A COLLISION", lap)
+
+    if safety_car:
+        first, last = safety_car
+        add(lap_time(first), "SafetyCar", "SAFETY CAR DEPLOYED", first)
+        add(lap_time(first), "Drs", "DRS DISABLED", first)
+        add(lap_time(last), "SafetyCar", "SAFETY CAR IN THIS LAP", last)
+        add(lead_end[last - 1], "Flag", "TRACK CLEAR", last + 1, "CLEAR", "Track")
+        add(lead_end[last], "Drs", "DRS ENABLED", last + 2)
+
+    add(lead_end[-1], "Flag", "CHEQUERED FLAG", n_laps, "CHEQUERED", "Track")
+    rows = pd.DataFrame(rows).astype({"driver_number": "Int64", "lap_number": "Int64", "sector": "Int64"})
+    return rows.sort_values('date', kind='stable')
+
+
+def generate_session(index, drivers, seed=0, n_laps=70, interval_step=4.0):
+    """Simulate one race and return its tables keyed by table name."""
+    rng = np.random.default_rng([seed, index])
+    session_key = SESSION_KEY_START + index
+    meeting_key = MEETING_KEY_START + index
+    start = FIRST_RACE + pd.Timedelta(days=7 * index)
+    keys = {"meeting_key": meeting_key, "session_key": session_key}
+
+    drivers = drivers.drop_duplicates(subset=['driver_number']).assign(**keys)
+    numbers = drivers['driver_number'].to_numpy(dtype=np.int64)
+    n_drivers = len(numbers)
+
+    durations, stints, pit_laps = _lap_model(rng, n_drivers, n_laps)
+    grid = rng.permutation(n_drivers)
+    durations[:, 0] += 6.0 + 0.25 * grid  # standing start from the grid slot
+
+    pit_rows = []
+    for d, pits in enumerate(pit_laps):
+        for lap in pits:
+            pit_duration = rng.normal(23.5, 1.5)
+            durations[d, lap - 1] += 3.0
+            durations[d, lap] += pit_duration - 8.0
+            pit_rows.append((d, lap, pit_duration))
+
+    safety_car = None
+    if rng.uniform() < 0.4:
+        first = int(rng.integers(5, n_laps - 10))
+        safety_car = (first, first + int(rng.integers(2, 6)))
+        durations[:, first - 1:safety_car[1]] += SAFETY_CAR_LOSS
+
+    durations = durations.round(3)
+    ends = start.value + np.cumsum(durations * 1e9, axis=1).astype(np.int64)
+    starts = np.concatenate([np.full((n_drivers, 1), start.value), ends[:, :-1]], axis=1)
+
+    lap_numbers = np.tile(np.arange(1, n_laps + 1), n_drivers)
+    n_rows = n_drivers * n_laps
+    flat = durations.ravel()
+    is_out_lap = np.zeros((n_drivers, n_laps), dtype=bool)
+    for d, pits in enumerate(pit_laps):
+        is_out_lap[d, pits] = True
+    sectors = flat[:, None] * SECTOR_SHARES + rng.normal(0, 0.1, (n_rows, 3))
+    sectors[:, 2] = flat - sectors[:, 0] - sectors[:, 1]
+    first_lap = lap_numbers == 1
+
+    laps = pd.DataFrame({
+        "date_start": pd.to_datetime(starts.ravel(), utc=True).where(~first_lap),
+        "driver_number": np.repeat(numbers, n_laps),
+        # Like the live feed, lap 1 has no start time, lap time or first sector
+        "duration_sector_1": np.where(first_lap, np.nan, sectors[:, 0].round(3)),
+        "duration_sector_2": sectors[:, 1].round(3),
+        "duration_sector_3": sectors[:, 2].round(3),
+        "i1_speed": rng.normal(250, 12, n_rows).round().astype(int),
+        "i2_speed": rng.normal(220, 15, n_rows).round().astype(int),
+        "is_pit_out_lap": is_out_lap.ravel(),
+        "lap_duration": np.where(first_lap, np.nan, flat),
+        "lap_number": lap_numbers,
+        "segments_sector_1": _segments(rng, n_rows, SEGMENTS_PER_SECTOR[0]),
+        "segments_sector_2": _segments(rng, n_rows, SEGMENTS_PER_SECTOR[1]),
+        "segments_sector_3": _segments(rng, n_rows, SEGMENTS_PER_SECTOR[2]),
+        "st_speed": rng.normal(300, 10, n_rows).round().astype(int),
+        **keys,
+    })
+
+    stints = pd.DataFrame(stints, columns=['d', 'lap_start', 'lap_end', 'compound', 'stint_number',
+                                           'tyre_age_at_start'])
+    stints['driver_number'] = numbers[stints.pop('d')]
+    stints = stints.assign(**keys)
+
+    pit = pd.DataFrame(pit_rows, columns=['d', 'lap_number', 'pit_duration'])
+    pit['date'] = pd.to_datetime(ends[pit['d'], pit['lap_number'] - 1], utc=True)
+    pit['driver_number'] = numbers[pit.pop('d')]
+    pit['pit_duration'] = pit['pit_duration'].round(1)
+    pit = pit.sort_values('date').assign(**keys)
+
+    # Race progress (laps completed, fractional) of every driver on a common time grid
+    race_end = ends.max()
+    step = int(interval_step * 1e9)
+    times = np.arange(start.value + step, race_end + step, step)
+    progress = np.empty((n_drivers, len(times)))
+    lap_marks = np.arange(n_laps + 1)
+    for d in range(n_drivers):
+        progress[d] = np.interp(times, np.concatenate([[start.value], ends[d]]), lap_marks)
+
+    # Gap to leader: how long ago the leader reached the driver's current progress
+    lead_reached = np.min([np.interp(progress, lap_marks, np.concatenate([[start.value], ends[d]]))
+                           for d in range(n_drivers)], axis=0)
+    gaps = (times - lead_reached) / 1e9
+    order = np.argsort(-progress, axis=0, kind='stable')
+    positions = np.empty_like(order)
+    np.put_along_axis(positions, order, np.arange(1, n_drivers + 1)[:, None], axis=0)
+    sorted_gaps = np.take_along_axis(gaps, order, axis=0)
+    intervals = np.empty_like(gaps)
+    np.put_along_axis(intervals, order, np.diff(sorted_gaps, axis=0, prepend=0.0), axis=0)
+
+    # Drivers who have finished stop sending samples
+    running = times[None, :] <= ends[:, -1:]
+    jitter = rng.uniform(0, step, (n_drivers, len(times))).astype(np.int64)
+    d_idx, t_idx = np.nonzero(running)
+    interval_df = pd.DataFrame({
+        "date": pd.to_datetime(times[t_idx] + jitter[d_idx, t_idx], unit='ns', utc=True).round('ms'),
+        "driver_number": numbers[d_idx],
+        "gap_to_leader": gaps[d_idx, t_idx].round(3),
+        "interval": intervals[d_idx, t_idx].round(3),
+        **keys,
+    }).sort_values('date', kind='stable')
+
+    # Positions: the grid before the start, then every change
+    changed = np.concatenate([np.ones((n_drivers, 1), dtype=bool), positions[:, 1:] != positions[:, :-1]], axis=1)
+    changed &= running
+    d_idx, t_idx = np.nonzero(changed)
+    ranking = pd.DataFrame({
+        "date": np.concatenate([np.full(n_drivers, start.value - 60 * 10**9), times[t_idx]]),
+        "driver_number": np.concatenate([numbers, numbers[d_idx]]),
+        "position": np.concatenate([grid + 1, positions[d_idx, t_idx]]),
+    })
+    ranking['date'] = pd.to_datetime(ranking['date'], utc=True)
+    ranking = ranking.sort_values('date', kind='stable').assign(**keys)
+
+    weather_times = pd.date_range(start - pd.Timedelta(minutes=15), pd.Timestamp(race_end, tz="UTC"), freq="60s")
+    n_weather = len(weather_times)
+    air = rng.uniform(12, 32) + np.cumsum(rng.normal(0, 0.05, n_weather))
+    weather = pd.DataFrame({
+        "air_temperature": air.round(1),
+        "date": weather_times + pd.to_timedelta(rng.uniform(0, 1, n_weather).round(3), unit='s'),
+        "humidity": np.clip(rng.uniform(30, 80) + np.cumsum(rng.normal(0, 0.3, n_weather)), 5, 100).round(1),
+        "pressure": (rng.uniform(990, 1020) + np.cumsum(rng.normal(0, 0.05, n_weather))).round(1),
+        "rainfall": np.full(n_weather, int(rng.uniform() < 0.15)),
+        "track_temperature": (air + rng.uniform(5, 20) + np.cumsum(rng.normal(0, 0.1, n_weather))).round(1),
+        "wind_direction": rng.integers(0, 360, n_weather),
+        "wind_speed": np.abs(rng.normal(1.5, 0.8, n_weather)).round(1),
+        **keys,
+    })
+
+    lead_end = pd.to_datetime(ends.min(axis=0), utc=True)
+    lap_start = pd.to_datetime(np.concatenate([[start.value], ends.min(axis=0)[:-1]]), utc=True)
+    race_control = _race_control_rows(rng, lap_start, lead_end, drivers, n_laps, safety_car).assign(**keys)
+
+    return {"drivers": drivers, "laps": laps, "stints": stints, "pit": pit, "intervals": interval_df,
+            "ranking": ranking, "race_control": race_control, "weather": weather}
+
+
+def _append(df, path, columns, header):
+    df = df[columns]
+    df.to_csv(path, mode='w' if header else 'a', header=header, index=False)
+    return len(df)
+
+
+def write_dataset(out_dir, n_sessions, template_dir=DATA_DIR, seed=0, n_laps=70, interval_step=4.0, split=False):
+    """Write n_sessions synthetic races to out_dir and return the row count per table.
+
+    By default all sessions go into one set of CSV files; with split each
+    session gets its own subdirectory named after its session key, like the
+    directories written by ingest.py. An existing out_dir is replaced only
+    if write_dataset created it (or it is empty); otherwise FileExistsError
+    is raised.
+    """
+    if os.path.isdir(out_dir) and os.listdir(out_dir):
+        if not os.path.exists(os.path.join(out_dir, MARKER)):
+            raise FileExistsError(f"{out_dir} exists and was not written by synthetic.py; not replacing it")
+        shutil.rmtree(out_dir)
+    columns = template_columns(template_dir)
+    drivers = load_table("drivers", template_dir, use_cache=False)
+    os.makedirs(out_dir, exist_ok=True)
+    open(os.path.join(out_dir, MARKER), "w").close()
+
+    rows = dict.fromkeys(TABLE_FILES, 0)
+    for index in range(n_sessions):
+        tables = generate_session(index, drivers, seed, n_laps, interval_step)
+        session_dir = os.path.join(out_dir, str(SESSION_KEY_START + index)) if split else out_dir
+        os.makedirs(session_dir, exist_ok=True)
+        header = split or index == 0
+        for name, df in tables.items():
+            rows[name] += _append(df, table_path(name, session_dir), columns[name], header)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic race sessions in the OpenF1 CSV layout.")
+    parser.add_argument("sessions", type=int, help="number of race sessions to generate")
+    parser.add_argument("--out-dir", default=os.path.join("data", "synthetic"))
+    parser.add_argument("--template-dir", default=DATA_DIR, help="data directory to copy columns and drivers from")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--laps", type=int, default=70)
+    parser.add_argument("--interval-step", type=float, default=4.0, help="seconds between interval samples")
+    parser.add_argument("--split", action="store_true", help="one subdirectory per session")
+    args = parser.parse_args()
+
+    try:
+        rows = write_dataset(args.out_dir, args.sessions, args.template_dir, args.seed, args.laps,
+                             args.interval_step, args.split)
+    except FileExistsError as e:
+        parser.error(str(e))
+    for name, count in rows.items():
+        print(f"{name}: {count} rows")
+    print(f"Wrote {args.sessions} sessions to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import sys
+import types
+
+import pandas as pd
+
+from data_loader import CACHE_DIR, DATA_DIR
+from instrument import span
+
+# On-disk memoization of derived tables.
+#
+# A derived table is stored under a key that hashes everything it was built
+# from: its name, the parameters passed to its builder, the source code of the
+# builder's module and of the local modules that module uses, and the keys of
+# its input tables. A source table's key is the hash of its CSV's contents
+# (data_loader.table_digest), or of the frame itself when it was passed in
+# already loaded. A corrected CSV, a new parameter or an edited builder
+# therefore changes the keys of exactly the tables downstream of it, and
+# everything else is read back instead of rebuilt.
+#
+# Entries are Parquet files in <data_dir>/.cache/derived. Reading an entry
+# touches it, and after every write the least recently used entries are
+# deleted until the directory fits in the disk budget. Results that are not
+# DataFrames (e.g. PositionTimeline) are never stored; they are cheap to build
+# and their keys still let the tables built from them be cached.
+
+DERIVED_DIR = "derived"
+DERIVED_BUDGET = 512 * 1024 ** 2  # bytes
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+_code_digests = {}
+
+
+def value_digest(value):
+    """Return a hash of a JSON-like value (dict keys in any order)."""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=repr).encode()).hexdigest()
+
+
+def _local_module(value):
+    name = value.__name__ if isinstance(value, types.ModuleType) else getattr(value, '__module__', None)
+    module = sys.modules.get(name) if isinstance(name, str) else None
+    path = getattr(module, '__file__', None)
+    return module if path and os.path.dirname(os.path.abspath(path)) == _ROOT else None
+
+
+def code_digest(obj):
+    """Return a hash of the source of obj's module and of the local modules it uses, in turn."""
+    module = _local_module(obj)
+    if module is None:
+        return None
+    if module.__name__ not in _code_digests:
+        seen = {}
+        pending = [module]
+        while pending:
+            current = pending.pop()
+            if current.__name__ in seen:
+                continue
+            with open(current.__file__, 'rb') as file:
+                seen[current.__name__] = hashlib.sha256(file.read()).hexdigest()
+            pending.extend(dep for dep in map(_local_module, vars(current).values()) if dep is not None)
+        _code_digests[module.__name__] = value_digest(seen)
+    return _code_digests[module.__name__]
+
+
+def frame_digest(df):
+    """Return a hash of a DataFrame's columns, dtypes and values, or None for anything else."""
+    if not isinstance(df, pd.DataFrame):
+        return None
+    try:
+        values = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    except TypeError:
+        return None
+    digest = hashlib.sha256(values.tobytes())
+    digest.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode())
+    return digest.hexdigest()
+
+
+def table_key(name, params, input_keys, builder):
+    """Return the cache key of a derived table, or None if one of its inputs has none."""
+    if any(key is None for key in input_keys):
+        return None
+    return value_digest({"table": name, "params": params, "inputs": list(input_keys), "code": code_digest(builder)})
+
+
+class DerivedCache:
+    """Derived tables in a directory of Parquet files, evicted least recently used first."""
+
+    def __init__(self, cache_dir, budget=DERIVED_BUDGET):
+        self.cache_dir = cache_dir
+        self.budget = budget
+
+    @classmethod
+    def for_data_dir(cls, data_dir=DATA_DIR, budget=DERIVED_BUDGET):
+        return cls(os.path.join(data_dir, CACHE_DIR, DERIVED_DIR), budget)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def get(self, name, key):
+        """Return the table stored under key, or None."""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with span(f"memo:read:{name}") as s:
+                df = s.output(pd.read_parquet(path))
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)  # most recently used
+        except OSError:
+            pass
+        return df
+
+    def put(self, name, key, df):
+        """Store df under key and evict old entries. Returns False if df cannot be stored."""
+        if not isinstance(df, pd.DataFrame):
+            return False
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with span(f"memo:write:{name}", rows_in=df):
+                os.makedirs(self.cache_dir, exist_ok=True)
+                df.to_parquet(tmp_path)
+                os.replace(tmp_path, path)
+        except Exception as e:  # pyarrow raises its own errors for columns it cannot store
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            print(f"Could not cache {name}: {e}")
+            return False
+        self.evict()
+        return True
+
+    def entries(self):
+        """Return the cached files with their size and last use, oldest first."""
+        try:
+            names = [name for name in os.listdir(self.cache_dir) if name.endswith(".parquet")]
+        except OSError:
+            return pd.DataFrame(columns=['path', 'bytes', 'used'])
+        rows = []
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # removed by another process
+            rows.append((path, stat.st_size, stat.st_mtime_ns))
+        entries = pd.DataFrame(rows, columns=['path', 'bytes', 'used'])
+        return entries.sort_values('used', kind='stable', ignore_index=True)
+
+    def evict(self, budget=None):
+        """Delete the least recently used entries until the rest fit in budget bytes."""
+        budget = self.budget if budget is None else budget
+        entries = self.entries()
+        over = entries['bytes'][::-1].cumsum()[::-1] > budget  # bytes of this entry and every newer one
+        for path in entries.loc[over, 'path']:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return int(over.sum())
+
+    def clear(self):
+        return self.evict(0)
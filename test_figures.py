@@ -0,0 +1,17 @@
+import os
+
+from figures import FIGURES, render_figure
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def test_svg_render_is_reproducible(tmp_path):
+    name, module, function = FIGURES[0]
+    renders = []
+    for run in ("first", "second"):
+        out_dir = tmp_path / run
+        out_dir.mkdir()
+        path, = render_figure(name, module, function, DATA_DIR, str(out_dir), formats=("svg",))
+        with open(path, "rb") as file:
+            renders.append(file.read())
+    assert renders[0] == renders[1]
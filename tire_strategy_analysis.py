@@ -1,77 +1,58 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-print("Starting the Tire Strategy Analysis...")
+from instrument import configure_from_env, span
+from pipeline import TableStore
+from plotting import draw_groups, group_colors
 
-# Define the data directory
-data_dir = "data"
 
-# Load the stints data
-print("Loading stints data...")
-stints_df = pd.read_csv(f"{data_dir}/stints_data.csv")
-stints_df.columns = stints_df.columns.str.strip()  # Clean column names
-print("Stints data loaded successfully.")
+# Plotting tire compounds used by each driver
+def plot_tire_compounds(tables=None):
+    tables = tables or TableStore()
+    stints_df = tables["stints_with_names"]
 
-# Load the laps data
-print("Loading laps data...")
-laps_df = pd.read_csv(f"{data_dir}/lap_data.csv")
-laps_df.columns = laps_df.columns.str.strip()  # Clean column names
-print("Laps data loaded successfully.")
+    fig, ax = plt.subplots(figsize=(14, 7))
+    sns.countplot(data=stints_df, x='full_name', hue='compound', ax=ax)
+    ax.set_title('Tire Compounds Used by Each Driver')
+    ax.set_xlabel('Driver')
+    ax.set_ylabel('Number of Stints')
+    ax.tick_params(axis='x', rotation=90)
+    ax.legend(title='Tire Compound')
+    return fig
 
-# Load the drivers data
-print("Loading drivers data...")
-drivers_df = pd.read_csv(f"{data_dir}/driver_data.csv")
-drivers_df.columns = drivers_df.columns.str.strip()  # Clean column names
-print("Drivers data loaded successfully.")
 
-# Clean the driver_number column to ensure it's numeric
-stints_df['driver_number'] = pd.to_numeric(stints_df['driver_number'], errors='coerce').astype('Int64')
-laps_df['driver_number'] = pd.to_numeric(laps_df['driver_number'], errors='coerce').astype('Int64')
-drivers_df['driver_number'] = pd.to_numeric(drivers_df['driver_number'], errors='coerce').astype('Int64')
+# Plotting performance drop-off as tires age with Facet Grid
+def plot_tire_degradation(tables=None):
+    tables = tables or TableStore()
+    lap_times = tables["lap_time_by_compound"]  # mean lap time per compound, driver and lap
 
-# Merge stints data with drivers data to get driver names
-stints_df = stints_df.merge(drivers_df[['driver_number', 'full_name']], on='driver_number')
+    # Same color for a driver in every facet; each facet's lines are one collection
+    colors = group_colors(sorted(lap_times['full_name'].unique()))
+    handles = {}
 
-# Plotting tire compounds used by each driver
-print("Plotting tire compounds used by each driver...")
-plt.figure(figsize=(14, 7))
-sns.countplot(data=stints_df, x='full_name', hue='compound')
-plt.title('Tire Compounds Used by Each Driver')
-plt.xlabel('Driver')
-plt.ylabel('Number of Stints')
-plt.xticks(rotation=90)
-plt.legend(title='Tire Compound')
-plt.show()
+    def draw(data, **kwargs):
+        handles.update(draw_groups(plt.gca(), data, 'lap_number', 'mean', 'full_name', colors, alpha=0.6))
 
-# Merge stints data with laps data to analyze performance drop-off
-print("Merging stints data with laps data...")
-laps_df['lap_number'] = laps_df['lap_number'].astype(int)
-stints_df['lap_start'] = stints_df['lap_start'].astype(int)
-stints_df['lap_end'] = stints_df['lap_end'].astype(int)
+    g = sns.FacetGrid(lap_times, col="compound", col_wrap=2, height=5, aspect=1.5)
+    g.map_dataframe(draw)
+    g.add_legend(legend_data={driver: handles[driver] for driver in colors if driver in handles}, title='full_name')
+    g.set_titles("{col_name} Compound")
+    g.set_axis_labels("Lap Number", "Lap Duration (seconds)")
+    return g.figure
 
-# Initialize a list to store detailed lap data with tire compounds
-detailed_lap_data = []
 
-# Loop through each stint and associate laps with the compound used
-for _, stint in stints_df.iterrows():
-    driver_laps = laps_df[(laps_df['driver_number'] == stint['driver_number']) &
-                          (laps_df['lap_number'] >= stint['lap_start']) &
-                          (laps_df['lap_number'] <= stint['lap_end'])]
-    driver_laps['compound'] = stint['compound']
-    driver_laps['full_name'] = stint['full_name']
-    detailed_lap_data.append(driver_laps)
+def main():
+    configure_from_env()
+    tables = TableStore()
 
-# Concatenate all the detailed lap data
-detailed_laps_df = pd.concat(detailed_lap_data)
+    with span("plot:plot_tire_compounds"):
+        plot_tire_compounds(tables)
+    plt.show()
+
+    with span("plot:plot_tire_degradation"):
+        plot_tire_degradation(tables)
+    plt.show()
 
-# Plotting performance drop-off as tires age with Facet Grid
-print("Plotting performance drop-off as tires age with Facet Grid...")
-g = sns.FacetGrid(detailed_laps_df, col="compound", col_wrap=2, height=5, aspect=1.5)
-g.map(sns.lineplot, "lap_number", "lap_duration", "full_name", alpha=0.6)
-g.add_legend()
-g.set_titles("{col_name} Compound")
-g.set_axis_labels("Lap Number", "Lap Duration (seconds)")
-plt.show()
 
-print("Tire Strategy Analysis completed successfully.")
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,92 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-print("Starting the Weather Impact Analysis...")
-
-# Define the data directory
-data_dir = "data"
-
-# Load the weather data
-print("Loading weather data...")
-weather_df = pd.read_csv(f"{data_dir}/weather_data.csv")
-weather_df.columns = weather_df.columns.str.strip()  # Clean column names
-weather_df['date'] = pd.to_datetime(weather_df['date'], errors='coerce')
-print("Weather data loaded successfully.")
-
-# Load the laps data
-print("Loading laps data...")
-laps_df = pd.read_csv(f"{data_dir}/lap_data.csv")
-laps_df.columns = laps_df.columns.str.strip()  # Clean column names
-laps_df['date_start'] = pd.to_datetime(laps_df['date_start'], errors='coerce')
-laps_df = laps_df.dropna(subset=['date_start'])  # Drop rows with null date_start
-print("Laps data loaded successfully.")
-
-# Load the race control data
-print("Loading race control data...")
-race_control_df = pd.read_csv(f"{data_dir}/race_control_data.csv")
-race_control_df.columns = race_control_df.columns.str.strip()  # Clean column names
-race_control_df['date'] = pd.to_datetime(race_control_df['date'], errors='coerce')
-print("Race control data loaded successfully.")
-
-# Merge laps data with weather data based on the closest timestamp
-print("Merging laps data with weather data...")
-merged_laps_weather = pd.merge_asof(laps_df.sort_values('date_start'), 
-                                    weather_df.sort_values('date'), 
-                                    left_on='date_start', right_on='date')
+from instrument import configure_from_env, span
+from pipeline import TableStore
+
 
 # Plotting the combined weather conditions against lap times
-print("Plotting combined weather conditions against lap times...")
-plt.figure(figsize=(14, 7))
-
-# Plot Track Temperature
-sns.lineplot(data=merged_laps_weather, x='date_start', y='track_temperature', label='Track Temperature (°C)', color='red')
-
-# Plot Air Temperature on secondary y-axis
-ax2 = plt.twinx()
-sns.lineplot(data=merged_laps_weather, x='date_start', y='air_temperature', label='Air Temperature (°C)', color='blue', ax=ax2)
-ax2.set_ylabel('Air Temperature (°C)')
-
-# Plot Humidity on the same secondary y-axis
-sns.lineplot(data=merged_laps_weather, x='date_start', y='humidity', label='Humidity (%)', color='green', ax=ax2)
-
-# Plot Wind Speed on another secondary y-axis
-ax3 = plt.twinx()
-ax3.spines['right'].set_position(('outward', 60))
-sns.lineplot(data=merged_laps_weather, x='date_start', y='wind_speed', label='Wind Speed (m/s)', color='purple', ax=ax3)
-ax3.set_ylabel('Wind Speed (m/s)')
-
-plt.title('Combined Weather Conditions Against Lap Times')
-plt.xlabel('Time')
-plt.legend(loc='upper left')
-plt.show()
-
-# Analyze incidents recorded in race control data to see if they coincide with weather changes
-print("Analyzing incidents in race control data and their correlation with weather changes...")
-merged_incidents_weather = pd.merge_asof(race_control_df.sort_values('date'), 
-                                         weather_df.sort_values('date'), 
-                                         on='date')
-
-plt.figure(figsize=(14, 7))
-sns.scatterplot(data=merged_incidents_weather, x='date', y='track_temperature', hue='category', style='category', palette='tab10', s=100)
-plt.title('Incidents vs Track Temperature')
-plt.xlabel('Time')
-plt.ylabel('Track Temperature (°C)')
-plt.legend(title='Incident Type', bbox_to_anchor=(1.05, 1), loc='upper left')
-plt.show()
-
-plt.figure(figsize=(14, 7))
-sns.scatterplot(data=merged_incidents_weather, x='date', y='air_temperature', hue='category', style='category', palette='tab10', s=100)
-plt.title('Incidents vs Air Temperature')
-plt.xlabel('Time')
-plt.ylabel('Air Temperature (°C)')
-plt.legend(title='Incident Type', bbox_to_anchor=(1.05, 1), loc='upper left')
-plt.show()
-
-plt.figure(figsize=(14, 7))
-sns.scatterplot(data=merged_incidents_weather, x='date', y='humidity', hue='category', style='category', palette='tab10', s=100)
-plt.title('Incidents vs Humidity')
-plt.xlabel('Time')
-plt.ylabel('Humidity (%)')
-plt.legend(title='Incident Type', bbox_to_anchor=(1.05, 1), loc='upper left')
-plt.show()
-
-print("Weather Impact Analysis completed successfully.")
+def plot_weather_conditions(tables=None):
+    tables = tables or TableStore()
+    weather_trace = tables["weather_trace"]  # downsampled weather at lap starts, one row per point
+
+    def channel(name):
+        points = weather_trace[weather_trace['channel'] == name]
+        return points['date_start'], points['value']
+
+    fig, ax = plt.subplots(figsize=(14, 7))
+
+    # Plot Track Temperature
+    ax.plot(*channel('track_temperature'), label='Track Temperature (°C)', color='red')
+
+    # Plot Air Temperature on secondary y-axis
+    ax2 = ax.twinx()
+    ax2.plot(*channel('air_temperature'), label='Air Temperature (°C)', color='blue')
+    ax2.set_ylabel('Air Temperature (°C)')
+
+    # Plot Humidity on the same secondary y-axis
+    ax2.plot(*channel('humidity'), label='Humidity (%)', color='green')
+
+    # Plot Wind Speed on another secondary y-axis
+    ax3 = ax.twinx()
+    ax3.spines['right'].set_position(('outward', 60))
+    ax3.plot(*channel('wind_speed'), label='Wind Speed (m/s)', color='purple')
+    ax3.set_ylabel('Wind Speed (m/s)')
+
+    ax.set_title('Combined Weather Conditions Against Lap Times')
+    ax.set_xlabel('Time')
+    ax.set_ylabel('Track Temperature (°C)')
+
+    # One legend for the lines of all three axes
+    handles, labels = zip(*(pair for axis in (ax, ax2, ax3) for pair in zip(*axis.get_legend_handles_labels())))
+    ax3.legend(handles, labels, loc='upper left')
+    return fig
+
+
+def _plot_incidents_vs(channel, label, tables):
+    merged_incidents_weather = tables["incidents_with_weather"]
+
+    fig, ax = plt.subplots(figsize=(14, 7))
+    sns.scatterplot(data=merged_incidents_weather, x='date', y=channel, hue='category', style='category', palette='tab10', s=100, ax=ax)
+    ax.set_title(f'Incidents vs {label.split(" (")[0]}')
+    ax.set_xlabel('Time')
+    ax.set_ylabel(label)
+    ax.legend(title='Incident Type', bbox_to_anchor=(1.05, 1), loc='upper left')
+    return fig
+
+
+def plot_incidents_vs_track_temperature(tables=None):
+    return _plot_incidents_vs('track_temperature', 'Track Temperature (°C)', tables or TableStore())
+
+
+def plot_incidents_vs_air_temperature(tables=None):
+    return _plot_incidents_vs('air_temperature', 'Air Temperature (°C)', tables or TableStore())
+
+
+def plot_incidents_vs_humidity(tables=None):
+    return _plot_incidents_vs('humidity', 'Humidity (%)', tables or TableStore())
+
+
+def main():
+    configure_from_env()
+    tables = TableStore()
+
+    with span("plot:plot_weather_conditions"):
+        plot_weather_conditions(tables)
+    plt.show()
+
+    with span("plot:plot_incidents_vs_track_temperature"):
+        plot_incidents_vs_track_temperature(tables)
+    plt.show()
+
+    with span("plot:plot_incidents_vs_air_temperature"):
+        plot_incidents_vs_air_temperature(tables)
+    plt.show()
+
+    with span("plot:plot_incidents_vs_humidity"):
+        plot_incidents_vs_humidity(tables)
+    plt.show()
+
 
+if __name__ == "__main__":
+    main()